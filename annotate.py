@@ -0,0 +1,99 @@
+import time
+
+import cv2
+
+# Most annotated frames rendered per second, frames in between are not drawn at all
+DISPLAY_FPS = 15
+
+WINDOW_NAME = "Tech Titans Realtime License Plate Recognition"
+
+
+def draw_annotations(img, vehicles, plates, conversion=None):
+    """
+    Draw vehicle and plate overlays on a copy of a frame.
+
+    Args:
+        img (numpy.ndarray): Frame, left untouched.
+        vehicles (list): (track_id, x1, y1, x2, y2, score, class_name) of every vehicle.
+        plates (list): (x1, y1, x2, y2, text, score) of every plate, text None for plates
+            without an accepted read; those only get a box.
+        conversion (int): cv2.COLOR_BGR2RGB or cv2.COLOR_RGB2BGR to swap the channels of the
+            annotated copy, None to keep them.
+
+    Returns:
+        numpy.ndarray: The annotated copy.
+    """
+    red, green, black = (0, 0, 255), (0, 255, 0), (0, 0, 0)
+    if conversion is None:
+        canvas = img.copy()
+    else:
+        # The conversion makes the copy, overlays are drawn in the swapped channel order
+        canvas = cv2.cvtColor(img, conversion)
+        red = red[::-1]
+    for track_id, x1, y1, x2, y2, vehicle_score, class_name in vehicles:
+        label = f"{class_name}-{int(track_id)} Score:{round(vehicle_score, 2)}"
+        cv2.rectangle(canvas, (int(x1), int(y1)), (int(x2), int(y2)), red, 3)
+        cv2.putText(canvas, label, (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, green, 2)
+
+    for x1, y1, x2, y2, text, text_score in plates:
+        cv2.rectangle(canvas, (int(x1), int(y1)), (int(x2), int(y2)), green, 3)
+        if text is None:
+            continue
+        cv2.rectangle(canvas, (int(x1), int(y1) - 40), (int(x2) + 20, int(y1)), black, cv2.FILLED)
+        cv2.putText(canvas, str(text), (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 1, green, 3)
+        cv2.putText(canvas, f"LP Score: {round(text_score, 2)}", (int(x1), int(y1) - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, red, 2)
+    return canvas
+
+
+class Viewer:
+    """
+    Rate-limited display of annotated frames.
+
+    The viewer consumes the structured detections the pipeline already
+    produces and draws them on a copy of the frame, at most ``max_fps`` times
+    a second; frames that arrive in between are skipped without drawing. It
+    runs in the thread that calls ``show``, after the pipeline's drop-oldest
+    output queue, so detection never waits for drawing or the window.
+
+    Args:
+        window (str): Window title.
+        max_fps (float): Most frames rendered per second.
+        conversion (int): cv2 color conversion from the pipeline's frames to BGR for display, None for none.
+    """
+
+    def __init__(self, window=WINDOW_NAME, max_fps=DISPLAY_FPS, conversion=None):
+        self.window = window
+        self.interval = 1.0 / max_fps
+        self.conversion = conversion
+        self.last_render = 0.0
+        self.rendered = 0
+        self.skipped = 0
+
+    def show(self, frame):
+        """
+        Draw and show a frame if the last one was shown long enough ago.
+
+        Args:
+            frame (dict): Frame state with 'img', 'vehicles' and 'plates'.
+
+        Returns:
+            bool: Whether the frame was shown.
+        """
+        now = time.monotonic()
+        if now - self.last_render < self.interval:
+            self.skipped += 1
+            return False
+        self.last_render = now
+        cv2.imshow(self.window, draw_annotations(frame['img'], frame['vehicles'], frame['plates'], self.conversion))
+        self.rendered += 1
+        return True
+
+    def poll(self):
+        """Let the window process events, returns the key pressed or -1."""
+        return cv2.waitKey(1) & 0xFF if self.rendered else -1
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+    def stats(self):
+        return {'rendered': self.rendered, 'skipped': self.skipped}
@@ -1,239 +1,864 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
-import easyocr
-from util import write_csv, char2int, int2char
-import os, time, re
-import torch
+from plate_format import plate_grammar
+from ocr import read_license_plates
+from ocr_cache import OCRCache
+from tracking import active_track_ids, age_tracker, make_tracker, model_tracker, update_tracker, tracker_track_ids
+from association import tracked_boxes, associate_plates
+from roi import ROI_SIZE, detect_plates_in_rois, source_crop
+from pipeline import Pipeline, QueueClosed
+from image_sink import ImageSink, track_image_names
+from results_sink import ResultsSink, CSVBackend
+from results_store import SQLiteBackend
+from motion import MotionGate
+from scheduler import AdaptiveScheduler
+from registry import ModelRegistry
+from buffers import FramePool, release_frame, retain_frame
+from ocr_pool import OCRPool
+from quality import CropSelector
+from consensus import ConsensusReader
+from watchlist import Watchlist
+from metrics import Metrics
+from annotate import Viewer, draw_annotations
+from preview import MJPEGServer, Recorder
+import os, sys, time
 
 # Initialize necessary variables and models
 lp_folder_path = "./licenses_plates_imgs_detected/"
 vehicle_folder_path = "./vehicles/"
 LICENSE_MODEL_DETECTION_DIR = './models/best.pt'
 COCO_MODEL_DIR = "./models/yolov8s.pt"
+JPEG_QUALITY = 90  # quality of the saved plate and vehicle crops
+RESULTS_BACKEND = "csv"  # "csv" for LPR_results.csv, "sqlite" for the indexed, searchable LPR_results.db
+CAMERA_NAME = "camera-2"  # stored with every sighting in the SQLite store
 
-reader = easyocr.Reader(['en'], gpu=True)
-vehicles = {2: "Car", 3: "MC", 5: "Bus", 6: "Truck"}
+INFERENCE_BACKEND = "auto"  # "cuda", "openvino", "onnx" or "torch", "auto" picks the fastest one installed
+INT8 = False  # INT8 models on the onnx/openvino backends, calibrated on the frames in ./models/calibration
 
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-coco_model = YOLO(COCO_MODEL_DIR)
-license_plate_detector = YOLO(LICENSE_MODEL_DETECTION_DIR)
-coco_model = YOLO(COCO_MODEL_DIR).to(torch.device(0))
-license_plate_detector = YOLO(LICENSE_MODEL_DETECTION_DIR).to(torch.device(0))
+vehicles = {2: "Car", 3: "MC", 5: "Bus", 6: "Truck"}
 
 threshold = 0.15
 
-class VideoProcessor:
-    def recv(self, img):
-        return img
-
-def read_license_plate(license_plate_crop, img):
-    scores = 0
-    detections = reader.readtext(license_plate_crop, allowlist= '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-
-    width = img.shape[1]
-    height = img.shape[0]
-    
-    if detections == [] :
-        return None, None
-
-    rectangle_size = license_plate_crop.shape[0]*license_plate_crop.shape[1]
-
-    plate = [] 
-
-    for result in detections:
-        length = np.sum(np.subtract(result[0][1], result[0][0]))
-        height = np.sum(np.subtract(result[0][2], result[0][1]))
-        
-        if length*height / rectangle_size > 0.17:
-            bbox, text, score = result
-            text = result[1]
-            text = text.upper()
-            scores += score
-            plate.append(text)
-    
-    if len(plate) != 0 : 
-        return " ".join(plate), scores/len(plate)
-    else :
-        return " ".join(plate), 0
+# Detection and tracking run on a working frame of this size
+WORKING_SIZE = (1280, 720)
+# Crop plates from the full-resolution camera frame instead of the working frame, for more real detail for OCR
+CROP_FROM_SOURCE = True
 
-def model_prediction(img, frame_number):
+# Run the plate detector on a batch of padded vehicle crops instead of the full frame
+PLATE_ROI_MODE = True
+
+# Only run the detectors on frames with motion in the lanes, other frames just advance the trackers
+MOTION_GATE = True
+# Lane polygons as (x, y) points in 0-1 frame coordinates, None to watch the whole frame
+LANE_REGIONS = None
+# Fraction of the lane area that has to move, lower is more sensitive
+MOTION_SENSITIVITY = 0.002
+
+# Trade detection stride, detector input size and OCR frequency for end-to-end latency
+TARGET_LATENCY = 0.25  # seconds
+
+# Run without a window: nothing is drawn or shown, results are only saved. Also on Linux without a display
+HEADLESS = False
+# Most annotated frames drawn and shown per second when not headless
+DISPLAY_FPS = 15
+# Stream the annotated frames as MJPEG to browsers on http://<host>:<port>/, also when headless. None to disable
+PREVIEW_PORT = None
+# Record the annotated frames to this MP4 file, also when headless. None to disable
+RECORDING_PATH = None  # e.g. "./recordings/annotated.mp4"
+RECORDING_FPS = 15
+
+# Seconds between pipeline queue/drop stats printouts
+STATS_INTERVAL = 10
+
+# Serve per-stage timings, counters and queue depths on http://127.0.0.1:<port>/metrics (Prometheus) and /metrics.json,
+# e.g. 9108 (9100 is node_exporter's), None to disable
+METRICS_PORT = None
+# Also write a JSON snapshot of the metrics to this file every STATS_INTERVAL seconds, None to disable
+METRICS_JSON = None
+
+# OCR in this many worker processes instead of the OCR stage thread, for CPU-only machines. 0 for inline OCR
+OCR_WORKERS = 0
+# Started by main() when OCR_WORKERS is set
+ocr_pool = None
+
+# Score plate crops on size, sharpness, exposure and aspect ratio and only OCR the best few of each track
+CROP_SELECTION = True
+# Overrides of quality.THRESHOLDS, e.g. {'min_width': 60}
+CROP_THRESHOLDS = None
+
+# Vote each plate track's reads into one plate, stop OCR'ing it once the vote is clear and record it once per vehicle
+CONSENSUS_READING = True
+
+# Watch lists every recorded plate is matched against, e.g. {'stolen': './lists/stolen.txt'}, None for no matching
+WATCHLIST_LISTS = None
+watchlist = None  # loaded by main(), and reloaded whenever a list file changes
+# Plate last alerted on per plate track, so a vehicle raises one alert and not one per read
+watchlist_alerted = {}
+
+# With consensus reading every record is a different vehicle, so reads of the same plate are not deduplicated
+max_tracked_plates = None if CONSENSUS_READING else 10000
+
+# Made by setup(), so importing this module loads, starts and opens nothing: the spawned OCR workers import it again
+models = plate_tracker = motion_gate = scheduler = metrics = None
+ocr_cache = crop_selector = consensus = image_sink = results_sink = None
+
+
+def setup(registry=None, results_backend=None):
+    """
+    Make the models, trackers, gates, caches and sinks the stages use, from the settings above.
+
+    Called by main(), and by anything else that runs the stage functions, before the first frame.
+
+    Args:
+        registry (ModelRegistry): Models to use instead of the configured ones, e.g. a benchmark's.
+        results_backend (ResultsBackend): Where the results go instead of the configured CSV file or SQLite store.
+    """
+    global models, plate_tracker, motion_gate, scheduler, metrics, ocr_cache, crop_selector, consensus, image_sink, results_sink
+    if registry is None:
+        # Every model is loaded once, on first use, or by main() in the background while the camera opens
+        registry = ModelRegistry(INFERENCE_BACKEND, int8=INT8)
+        registry.register_reader('reader')
+        registry.register_yolo('coco_model', COCO_MODEL_DIR)
+        registry.register_yolo('license_plate_detector', LICENSE_MODEL_DETECTION_DIR, warmup_sizes=((ROI_SIZE, 4), (640, 1)))
+    models = registry
+
+    # The plate detector sees a different batch of crops every frame, so ROI mode tracks plates itself
+    plate_tracker = make_tracker()
+    motion_gate = MotionGate(LANE_REGIONS, min_area=MOTION_SENSITIVITY) if MOTION_GATE else None
+    scheduler = AdaptiveScheduler(TARGET_LATENCY)
+    metrics = Metrics(enabled=METRICS_PORT is not None or METRICS_JSON is not None, labels={'camera': CAMERA_NAME})
+    # Skips OCR for plate tracks that already have a stable high-confidence read
+    ocr_cache = OCRCache()
+    crop_selector = CropSelector(thresholds=CROP_THRESHOLDS) if CROP_SELECTION else None
+    consensus = ConsensusReader() if CONSENSUS_READING else None
+
+    # Writes plate and vehicle crops off the hot path, keeping the best-scoring read per vehicle
+    image_sink = ImageSink(jpeg_quality=JPEG_QUALITY)
+    # Appends accepted reads in batches, to a rotating CSV file or the SQLite store
+    if results_backend is None:
+        if RESULTS_BACKEND == "sqlite":
+            results_backend = SQLiteBackend("./results/LPR_results.db", camera=CAMERA_NAME)
+        else:
+            results_backend = CSVBackend("./results/LPR_results.csv")
+    results_sink = ResultsSink(results_backend, max_tracked_plates=max_tracked_plates)
+
+def detect_vehicles_and_plates(img, imgsz=640, run_ocr=True, source=None, source_conversion=None):
+    """
+    Detection stage: track vehicles and plates in a BGR frame and crop the plates that lie inside a vehicle.
+
+    Args:
+        img (numpy.ndarray): BGR frame.
+        imgsz (int): Detector input size, boxes are still in frame coordinates.
+        run_ocr (bool): Whether the OCR stage may read plates that have no cached read.
+        source (numpy.ndarray): Full-resolution frame img was resized from, plates are
+            cropped from it. None to crop them from img.
+        source_conversion (int): cv2 color conversion that brings source crops to img's channel order.
+
+    Returns:
+        dict: Frame state passed on to the OCR stage. Its 'plate_candidates' are (plate, vehicle,
+        plate crop, vehicle crop) tuples; the vehicle crop is None for candidates of this frame and
+        a copy for reads of earlier crops that later stages add.
+    """
+    start_time = time.time()
+    detect_start = time.perf_counter()
+    plate_candidates = []
+    coco_model, license_plate_detector = models.get('coco_model'), models.get('license_plate_detector')
+
+    with metrics.timer('vehicle_detection'):
+        object_detections = coco_model.track(img, persist=True, tracker="bytetrack.yaml", imgsz=imgsz)[0]
+
+    # Tracked vehicle boxes as one array: x1, y1, x2, y2, track_id, score, class_id
+    vehicle_data = tracked_boxes(object_detections.boxes)
+    if len(object_detections.boxes) == 0 and model_tracker(coco_model) is not None:
+        # model.track skips the tracker on empty frames, vehicles that left would never be removed
+        age_tracker(model_tracker(coco_model), img)
+    vehicle_data = vehicle_data[np.isin(vehicle_data[:, 6].astype(int), list(vehicles))]
+    metrics.inc('vehicles', len(vehicle_data))
+    vehicle_bboxes = []
+
+    for xvehicle1, yvehicle1, xvehicle2, yvehicle2, track_id, vehicle_score, class_id in vehicle_data.tolist():
+        class_name = vehicles[int(class_id)]
+        vehicle_bboxes.append([track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2, vehicle_score, class_name])  # store class name instead of class id
+
+    if len(vehicle_bboxes) != 0:
+        with metrics.timer('plate_detection'):
+            if PLATE_ROI_MODE:
+                plate_detections, _ = detect_plates_in_rois(license_plate_detector, img, vehicle_data[:, :4])
+                plate_data = update_tracker(plate_tracker, plate_detections, img)
+            else:
+                license_detections = license_plate_detector.track(img, persist=True, imgsz=imgsz)[0]
+                plate_data = tracked_boxes(license_detections.boxes)
+                if len(license_detections.boxes) == 0 and model_tracker(license_plate_detector) is not None:
+                    age_tracker(model_tracker(license_plate_detector), img)
+        metrics.inc('plates', len(plate_data))
+
+        # Assign every plate to the one vehicle box it lies in, -1 if it is outside all of them
+        vehicle_indices = associate_plates(plate_data[:, :4], vehicle_data[:, :4])
+
+        # Collect every plate crop that lies inside a vehicle first, so the whole frame is OCR'd in one batch
+        for license_plate, vehicle_index in zip(plate_data.tolist(), vehicle_indices.tolist()):
+            if vehicle_index < 0:
+                continue
+            x1, y1, x2, y2, lp_track_id, lp_score, lp_class_id = license_plate
+            # Views, nothing draws on the frames any more; the image sink copies the crops it keeps
+            if source is not None:
+                license_plate_crop = source_crop(source, license_plate, img.shape, source_conversion)
+            else:
+                license_plate_crop = img[int(y1):int(y2), int(x1): int(x2), :]
+            if license_plate_crop.size != 0:
+                # No vehicle crop, it is cut from this frame when the read is saved
+                plate_candidates.append((license_plate, vehicle_bboxes[vehicle_index], license_plate_crop, None))
+    else:
+        # No vehicles, so no plate detection: the plate tracker still sees the frame, plates that left expire
+        license_plate_tracker = plate_tracker if PLATE_ROI_MODE else model_tracker(license_plate_detector)
+        if license_plate_tracker is not None:
+            age_tracker(license_plate_tracker, img)
+
+    detect_time = time.perf_counter() - detect_start
+    metrics.observe('detect_stage', detect_time)
+    return {
+        'img': img,
+        'start_time': start_time,
+        'timings': {'detect': detect_time},
+        'vehicles': vehicle_bboxes,
+        'plate_candidates': plate_candidates,
+        'run_ocr': run_ocr,
+        # Read here, in the thread that updates the tracker, so the OCR stage never touches tracker state
+        'vehicle_track_ids': active_track_ids(coco_model),
+        'plate_track_ids': tracker_track_ids(plate_tracker) if PLATE_ROI_MODE else active_track_ids(license_plate_detector),
+    }
+
+
+def vehicle_crop(img, veh_bbox):
+    """Cut a vehicle, given as a 'vehicles' entry of the frame state, out of the frame."""
+    track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2 = veh_bbox[:5]
+    return img[int(yvehicle1):int(yvehicle2), int(xvehicle1):int(xvehicle2), :]
+
+
+def track_only(img):
+    """
+    Detection stage for frames the motion gate or the scheduler skipped: advance the trackers without running the detectors.
+
+    Lost tracks keep expiring on schedule, so the OCR cache and the image sink
+    still see vehicles and plates leave.
+
+    Args:
+        img (numpy.ndarray): BGR frame.
+
+    Returns:
+        dict: Frame state without plate candidates, passed on to the OCR stage.
+    """
+    start_time = time.time()
+    detect_start = time.perf_counter()
+    coco_model, license_plate_detector = models.get('coco_model'), models.get('license_plate_detector')
+    vehicle_tracker = model_tracker(coco_model)
+    if vehicle_tracker is not None:
+        age_tracker(vehicle_tracker, img)
+    license_plate_tracker = plate_tracker if PLATE_ROI_MODE else model_tracker(license_plate_detector)
+    if license_plate_tracker is not None:
+        age_tracker(license_plate_tracker, img)
+
+    detect_time = time.perf_counter() - detect_start
+    metrics.observe('track_only_stage', detect_time)
+    return {
+        'img': img,
+        'start_time': start_time,
+        'timings': {'detect': detect_time},
+        'vehicles': [],
+        'plate_candidates': [],
+        'run_ocr': False,
+        'vehicle_track_ids': active_track_ids(coco_model),
+        'plate_track_ids': tracker_track_ids(plate_tracker) if PLATE_ROI_MODE else active_track_ids(license_plate_detector),
+    }
+
+
+def read_plates(frame):
+    """
+    OCR stage: read all plate crops of a frame in one batch, skipping tracks with a stable cached read.
+
+    On frames the scheduler runs without OCR only cached reads are used.
+
+    With consensus reading, the fresh reads vote on their track's plate and
+    every candidate shows its track's consensus so far; tracks whose plate
+    became final or that ended are added as 'plate_records'.
+
+    Args:
+        frame (dict): Frame state from the detection stage.
+
+    Returns:
+        dict: The frame state with the (text, score) of every plate candidate added.
+    """
+    ocr_start = time.perf_counter()
+    plate_candidates = frame['plate_candidates']
+    if ocr_pool is not None:
+        frame['plate_reads'], ocr_indices = read_plates_in_pool(frame)
+    elif frame['run_ocr']:
+        frame['plate_reads'], ocr_indices = read_selected_plates(frame)
+    else:
+        frame['plate_reads'], ocr_indices = [cached_read(candidate[0][4], candidate[2]) or (None, None) for candidate in plate_candidates], []
+    if consensus is not None:
+        frame['plate_reads'], frame['plate_records'] = vote_reads(frame, ocr_indices)
+
+    # Forget the reads of plate tracks ByteTrack has dropped
+    ocr_cache.evict(frame['plate_track_ids'])
+    frame['timings']['ocr'] = time.perf_counter() - ocr_start
+    if plate_candidates:
+        metrics.observe('ocr_stage', frame['timings']['ocr'])
+        metrics.inc('plate_candidates', len(plate_candidates))
+    return frame
+
+
+def cached_read(lp_track_id, license_plate_crop):
+    """Final consensus plate of a track, else its stable cached read, None if the crop has to be OCR'd."""
+    plate_read = consensus.lookup(lp_track_id) if consensus is not None else None
+    return plate_read or ocr_cache.lookup(lp_track_id, license_plate_crop)
+
+
+def read_selected_plates(frame):
+    """
+    Read a frame's plates inline, in one batch, skipping tracks with a cached or final read.
+
+    With crop selection, uncached crops are offered to the selector and only
+    the ones it picks are read: a track's best recent crop, shown at the
+    plate's current position. Tracks that ended before their best crop was
+    read get a last read, added as extra candidates so it is still saved.
+
+    Args:
+        frame (dict): Frame state from the detection stage, its candidates may be extended.
+
+    Returns:
+        tuple: (text, score) of every plate candidate, (None, None) while a track waits
+        for a better crop, and the indices of the candidates that were OCR'd.
+    """
+    plate_candidates = frame['plate_candidates']
+    plate_reads = []
+    selected = []
+    for i, (license_plate, veh_bbox, license_plate_crop, _) in enumerate(plate_candidates):
+        plate_read = cached_read(license_plate[4], license_plate_crop)
+        if plate_read is None and crop_selector is None:
+            selected.append(i)
+        elif plate_read is None:
+            # The vehicle is copied with the plate, the crop may be read frames later when the vehicle has moved
+            best = crop_selector.offer(license_plate[4], license_plate_crop, (license_plate, veh_bbox, vehicle_crop(frame['img'], veh_bbox).copy()),
+                                       more_reads=consensus is not None)
+            if best is not None:
+                plate_candidates[i] = (license_plate, veh_bbox, best[0], best[1][2])
+                selected.append(i)
+        plate_reads.append(plate_read)
+    if crop_selector is not None:
+        for license_plate_crop, (license_plate, veh_bbox, car_crop), _ in crop_selector.end_tracks(frame['plate_track_ids']):
+            plate_candidates.append((license_plate, veh_bbox, license_plate_crop, car_crop))
+            plate_reads.append(None)
+            selected.append(len(plate_candidates) - 1)
+
+    if selected:
+        start_time = time.perf_counter()
+        fresh_reads = read_license_plates(models.get('reader'), [plate_candidates[i][2] for i in selected])
+        ocr_cache.record_ocr_time(time.perf_counter() - start_time, len(selected))
+        for i, (text, score) in zip(selected, fresh_reads):
+            license_plate, _, license_plate_crop, _ = plate_candidates[i]
+            ocr_cache.update(license_plate[4], license_plate_crop, text, score)
+            plate_reads[i] = (text, score)
+    return [plate_read or (None, None) for plate_read in plate_reads], selected
+
+
+def read_plates_in_pool(frame):
+    """
+    Read a frame's plates with the OCR worker pool, without waiting for it.
+
+    Crops without a stable cached read are submitted to the pool, only the
+    ones the crop selector picks when it is enabled; a picked crop the pool
+    has no room for goes back to the selector for a later frame. Reads that
+    came back since the last frame update the cache and are used for their
+    track's plate in this frame, with the crop they were read from. Reads of
+    plates that are no longer in the frame, and earlier reads of a track that
+    had several come back, are added as extra candidates, so they are still
+    saved and voted.
+
+    Args:
+        frame (dict): Frame state from the detection stage, its candidates may be extended.
+
+    Returns:
+        tuple: (text, score) of every plate candidate, (None, None) while a read is pending,
+        and the indices of the candidates whose read just came back.
+    """
+    fresh_reads = {}
+    for result in ocr_pool.poll():
+        license_plate_crop = result['context'][2]
+        ocr_cache.update(result['lp_track_id'], license_plate_crop, result['text'], result['score'])
+        ocr_cache.record_ocr_time(result['ocr_time'], 1)
+        # A track can have more than one read back at once, every one of them is used
+        fresh_reads.setdefault(result['lp_track_id'], []).append(result)
+
+    plate_candidates = frame['plate_candidates']
+    plate_reads = []
+    ocr_indices = []
+    for i, (license_plate, veh_bbox, license_plate_crop, _) in enumerate(plate_candidates):
+        lp_track_id = int(license_plate[4])
+        results = fresh_reads.get(lp_track_id)
+        if results:
+            # The newest read stands for the plate in this frame, earlier ones are added as extra candidates below
+            result = results.pop()
+            plate_candidates[i] = (license_plate, veh_bbox, result['context'][2], result['context'][3])
+            plate_reads.append((result['text'], result['score']))
+            ocr_indices.append(i)
+            continue
+        plate_read = cached_read(lp_track_id, license_plate_crop)
+        if plate_read is None and frame['run_ocr'] and crop_selector is not None:
+            # A track with a crop in flight, or waiting for a free slot, still buffers its crops, the best one is
+            # sent once there is room
+            best = crop_selector.offer(lp_track_id, license_plate_crop, (license_plate, veh_bbox, vehicle_crop(frame['img'], veh_bbox).copy()),
+                                       ready=ocr_pool.has_room(lp_track_id), more_reads=consensus is not None)
+            if best is not None and not ocr_pool.submit(lp_track_id, frame.get('frame_number'), best[0],
+                                                        context=(license_plate, veh_bbox, best[0], best[1][2])):
+                crop_selector.unselect(lp_track_id, best)
+        elif plate_read is None and frame['run_ocr']:
+            # Refused when the pool is full or the track already has a crop in flight. The crops in the context
+            # come back with a later frame, after this frame's buffers are reused and the vehicle moved, so they are copied
+            ocr_pool.submit(lp_track_id, frame.get('frame_number'), license_plate_crop,
+                            context=(license_plate, veh_bbox, license_plate_crop.copy(), vehicle_crop(frame['img'], veh_bbox).copy()))
+        plate_reads.append(plate_read or (None, None))
+    if crop_selector is not None and frame['run_ocr']:
+        for selection in crop_selector.end_tracks(frame['plate_track_ids']):
+            license_plate_crop, (license_plate, veh_bbox, car_crop), _ = selection
+            if not ocr_pool.submit(license_plate[4], frame.get('frame_number'), license_plate_crop,
+                                   context=(license_plate, veh_bbox, license_plate_crop, car_crop)):
+                # Kept by the selector and handed back by end_tracks with the next frame
+                crop_selector.unselect(license_plate[4], selection)
+
+    for results in fresh_reads.values():
+        for result in results:
+            plate_candidates.append(result['context'])
+            plate_reads.append((result['text'], result['score']))
+            ocr_indices.append(len(plate_candidates) - 1)
+    return plate_reads, ocr_indices
+
+
+def vote_reads(frame, ocr_indices):
+    """
+    Let a frame's fresh OCR reads vote on their track's plate.
+
+    A track the tracker dropped only ends in the consensus once the OCR pool
+    has no reads of it left to hand out, and the crop selector no last crop
+    waiting for room in the pool, so its last read still votes.
+
+    Args:
+        frame (dict): Frame state with its plate reads.
+        ocr_indices (list): Indices of the candidates that were just OCR'd, cached reads do not vote again.
+
+    Returns:
+        tuple: The consensus (text, score) of every plate candidate, and the records
+        (see ``ConsensusReader.take_final``) of the tracks that became final or ended.
+    """
+    plate_candidates = frame['plate_candidates']
+    for i in ocr_indices:
+        license_plate, veh_bbox = plate_candidates[i][:2]
+        text, score = frame['plate_reads'][i]
+        consensus.add(license_plate[4], text, score, context=(license_plate, veh_bbox), vehicle_class=veh_bbox[6])
+    plate_reads = [consensus.current(candidate[0][4]) or (None, None) for candidate in plate_candidates]
+    active_track_ids = frame['plate_track_ids']
+    if ocr_pool is not None and active_track_ids is not None:
+        active_track_ids = active_track_ids | ocr_pool.pending_track_ids()
+        if crop_selector is not None:
+            active_track_ids |= crop_selector.track_ids()
+    return plate_reads, consensus.take_final() + consensus.end_tracks(active_track_ids)
+
+
+def accepted_plate_text(license_plate_text, license_plate_text_score, veh_class_name):
+    """
+    Check a plate read against the score limit and the plate formats of the vehicle class, and format it.
+
+    Returns:
+        str: Formatted plate text, None if the read is not accepted.
+    """
+    if license_plate_text is None or license_plate_text_score is None:
+        return None
+
+    # set the treshold for this
+    if license_plate_text_score < 0.7:
+        return None
+
+    # Cleaned, corrected and checked against the class's plate formats in one pass
+    license_plate_text, valid = plate_grammar.normalize(license_plate_text, veh_class_name)
+    return license_plate_text if valid else None
+
+
+def plate_result(license_plate, veh_bbox, license_plate_text, license_plate_text_score, inference_time):
+    """Build the results entry of an accepted read, in the format ``ResultsSink.write`` takes per key."""
+    lp_track_id = license_plate[4]
+    track_id, _, _, _, _, vehicle_score, veh_class_name = veh_bbox
+    # The files the image sink keeps the vehicle's best crops in
+    lp_img, vehicle_img = track_image_names(track_id)
+    return {
+        'Vehicle': {
+            'vehicle_id': track_id,
+            'vehicle_class': veh_class_name,
+            'vehicle_score': vehicle_score,
+            'vehicle_img': vehicle_img,  # Add the path to the vehicle image
+        },
+        'license_plate': {
+            'lp_id': lp_track_id,
+            'text': license_plate_text,
+            'inference_time': inference_time,
+            'lp_img': lp_img,
+            'text_score': license_plate_text_score,
+        }
+    }
+
+
+def match_watchlist(license_plate_text, lp_track_id):
+    """
+    Look a recorded plate up in the watch lists and alert on a match, once per plate track.
+
+    Args:
+        license_plate_text (str): Accepted plate text.
+        lp_track_id (int): Plate track the read belongs to.
+
+    Returns:
+        list: (cost, listed plate, list name) of the matches, best first, empty if there are none
+        or the track was already alerted on with this plate.
+    """
+    if watchlist is None or watchlist_alerted.get(lp_track_id) == license_plate_text:
+        return []
+    matches = watchlist.match(license_plate_text)
+    if matches:
+        watchlist_alerted[lp_track_id] = license_plate_text
+        cost, listed_plate, list_name = matches[0]
+        print(f"Watchlist alert: {license_plate_text} matches {listed_plate} on the {list_name} list (cost {cost:.2f})")
+        for list_name in {list_name for _, _, list_name in matches}:
+            metrics.inc('watchlist_hits', list=list_name)
+    return matches
+
+
+def save_reads(frame):
+    """
+    Persistence stage: format the plate reads and save the accepted ones.
+
+    Nothing is drawn here; the plates are added to the frame state as
+    structured annotations for whoever displays it (see ``annotate``).
+    Without consensus reading every accepted read is written to the results;
+    with it, only the one record of every plate track whose consensus became
+    final or that ended. Written plates are matched against the watch lists.
+    The stages' reference to the frame's pooled buffers is released at the end,
+    whoever displays the frame holds a reference of its own.
+
+    Args:
+        frame (dict): Frame state from the OCR stage.
+
+    Returns:
+        dict: The frame state with 'plates' annotations, 'licenses_texts',
+        accepted 'license_plate_crops', the 'results' dictionary and the
+        'watchlist_matches' (plate text, matches) of new alerts added.
+    """
     license_numbers = 0
     results = {}
     licenses_texts = []
+    license_plate_crops_total = []
+    plates = []
+    watchlist_matches = []
+    img = frame['img']
+    save_start = time.perf_counter()
+    # Detection and OCR time spent on this frame, without the time it waited in the stage queues
+    inference_time = frame['timings']['detect'] + frame['timings'].get('ocr', 0.0)
 
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    for (license_plate, veh_bbox, license_plate_crop, car_crop), (license_plate_text, license_plate_text_score) in zip(frame['plate_candidates'], frame['plate_reads']):
+        x1, y1, x2, y2, lp_track_id, lp_score, lp_class_id = license_plate
+        track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2, vehicle_score, veh_class_name = veh_bbox
 
-    object_detections = coco_model.track(img, persist=True, tracker="bytetrack.yaml")[0]
-    vehicle_detected = False
-    vehicle_bboxes = []
+        # This license plate is inside this vehicle bounding box
+        licenses_texts.append(license_plate_text)
 
-    if len(object_detections.boxes.cls.tolist()) != 0:
-        for detection in object_detections.boxes.data.tolist():
-            if len(detection) == 7:
-                xvehicle1, yvehicle1, xvehicle2, yvehicle2, track_id, vehicle_score, class_id = detection
-
-                if int(class_id) in vehicles:
-                    class_name = vehicles[int(class_id)]
-                    label = f"{class_name}-{int(track_id)} Score:{round(vehicle_score, 2)}"
-                    cv2.rectangle(img, (int(xvehicle1), int(yvehicle1)), (int(xvehicle2), int(yvehicle2)), (0, 0, 255), 3)
-                    cv2.putText(img, label, (int(xvehicle1), int(yvehicle1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    vehicle_detected = True
-                    start_time = time.time()
-                    vehicle_bboxes.append([track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2, vehicle_score, class_name])  # store class name instead of class id
-
-        if vehicle_detected:
-            license_detections = license_plate_detector.track(img, persist=True)[0]
-            
-            if len(license_detections.boxes.cls.tolist()) != 0:
-                license_plate_crops_total = []
-                for license_plate in license_detections.boxes.data.tolist():
-                    if len(license_plate) == 7:
-                        print(license_plate)
-                        x1, y1, x2, y2, lp_track_id, lp_score, class_name = license_plate
-
-                        for veh_bbox in vehicle_bboxes:
-                            track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2, vehicle_score, veh_class_name = veh_bbox
-                            # Check if this license plate is inside any vehicle bounding box
-                            if x1 > xvehicle1 and x2 < xvehicle2 and y1 > yvehicle1 and y2 < yvehicle2:
-                                # This license plate is inside this vehicle bounding box
-                                cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 3)
-
-                                license_plate_crop = img[int(y1):int(y2), int(x1): int(x2), :]
-                                license_plate_crop_gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)                         
-                                
-                                lp_height, lp_width = license_plate_crop_gray.shape
-                                license_plate_crop_gray = cv2.resize(license_plate_crop_gray, (lp_width*5, lp_height*5))
-                                # _, license_plate_crop_gray = cv2.threshold(license_plate_crop_gray, 150, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-                                # img_ff = license_plate_crop_gray.copy()
-                                # h, w = img_ff.shape[:2]
-                                # img_ff = cv2.rectangle(img_ff, (0,0), (w+1,h-1), 255, 2)
-                                # mask = np.zeros((h+2, w+2), np.uint8)
-                                # cv2.floodFill(img_ff, mask, (0,0), 0)
-                                # img_ff = cv2.bitwise_not(img_ff)
-                                # cv2.imshow('Cropped License Plate', img_ff)  
-                                license_plate_text, license_plate_text_score = read_license_plate(license_plate_crop_gray, img)
-                                print(license_plate_text)
-                                licenses_texts.append(license_plate_text)
-                                
-
-                                if license_plate_text is not None and license_plate_text_score is not None:
-                                    lp_length = len(license_plate_text)
-                                    
-                                    if lp_length <= 5:
-                                        break
-                                    
-                                    elif lp_length >= 8:
-                                        break
-                                    # set the treshold for this 
-                                    if license_plate_text_score >= 0.7:
-                                        license_plate_text = re.sub(r'[^A-Za-z0-9]', '', license_plate_text)
-                                        
-                                        #formatting
-                                        if lp_length >= 6 and lp_length <= 7:
-                                            if class_name in ["Car", "Bus", "Truck"]:
-                                                l = license_plate_text[:3]
-                                                n = license_plate_text[3:lp_length]
-                                                # Check if 'l' contains a number
-                                                if any(char.isdigit() for char in l):
-                                                    l = int2char(l)
-                                                # Check if 'n' contains a letter
-                                                if any(char.isalpha() for char in n):
-                                                    n = char2int(n)
-                                                license_plate_text = (l + "-" + n)
-                                            
-                                            elif class_name == "MC" and lp_length == 6:
-                                                n = license_plate_text[:3]
-                                                l = license_plate_text[3:6]
-                                                # Check if 'n' contains a number
-                                                if any(char.isalpha() for char in n):
-                                                    n = char2int(n)
-                                                # Check if 'l' contains a letter
-                                                if any(char.isdigit() for char in l):
-                                                    l = int2char(l)
-                                                license_plate_text = (n + "-" + l)
-                                        
-
-                                        end_time = time.time()
-                                        inference_time = end_time - start_time  # in seconds                                      
-                                        lp_crop_name = f'{license_plate_text}_{lp_track_id}.jpg'
-                                        cv2.imwrite(os.path.join(lp_folder_path, lp_crop_name), license_plate_crop_gray)
-
-                                        cv2.rectangle(img, (int(x1), int(y1) - 40), (int(x2)+20, int(y1)), (0, 0, 0), cv2.FILLED)
-                                        cv2.putText(img, str(license_plate_text), (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 3)
-                                        cv2.putText(img, f"LP Score: {round(license_plate_text_score, 2)}", (int(x1), int(y1) - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                                            
-                                        license_plate_crops_total.append(license_plate_crop)
-                                            
-                                        # Save a cropped image of the car
-                                        car_crop = img[int(yvehicle1):int(yvehicle2), int(xvehicle1):int(xvehicle2), :]
-                                        car_img_name = f'{veh_class_name}{track_id}_{license_plate_text}.jpg'
-                                        cv2.imwrite(os.path.join(vehicle_folder_path, car_img_name), car_crop)
-                                        results[license_numbers] = {
-                                                                    license_numbers: {
-                                                                        'Vehicle': {
-                                                                            'vehicle_id': track_id,
-                                                                            'vehicle_class': veh_class_name,
-                                                                            'vehicle_score': vehicle_score,
-                                                                            'vehicle_img': car_img_name,  # Add the path to the vehicle image
-                                                                        },
-                                                                        'license_plate': {
-                                                                            'lp_id': lp_track_id,
-                                                                            'text': license_plate_text, 
-                                                                            'inference_time': inference_time,
-                                                                            'lp_img': lp_crop_name, 
-                                                                            'text_score': license_plate_text_score,
-
-                                                                        }
-                                                                    }
-                                                                }
-                                        license_numbers += 1
-                                        write_csv(results, f"./results/LPR_results.csv")
-              
-                img_wth_box = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                return [img_wth_box, licenses_texts, license_plate_crops_total, results]
-    else:
-        xvehicle1, yvehicle1, xvehicle2, yvehicle2 = 0, 0, 0, 0
-        vehicle_score = 0
+        accepted_text = accepted_plate_text(license_plate_text, license_plate_text_score, veh_class_name)
+        if accepted_text is None:
+            plates.append((x1, y1, x2, y2, None, None))
+        else:
+            plates.append((x1, y1, x2, y2, accepted_text, license_plate_text_score))
+            license_plate_crops_total.append(license_plate_crop)
+
+        # With consensus reading a track's record is written later, with its final text, so the crops of every read
+        # are offered; without it only accepted reads get a row
+        if accepted_text is not None or (consensus is not None and license_plate_text is not None and license_plate_text_score is not None):
+            # Save a cropped image of the car
+            # Late reads carry the vehicle as it was when their plate crop was taken
+            if car_crop is None:
+                car_crop = vehicle_crop(img, veh_bbox)
+            lp_img, vehicle_img = track_image_names(track_id)
+            # Encoded and written in the background, only the best read of each vehicle is kept on disk
+            image_sink.submit(track_id, license_plate_text_score, {
+                os.path.join(lp_folder_path, lp_img): license_plate_crop,
+                os.path.join(vehicle_folder_path, vehicle_img): car_crop,
+            })
+        if accepted_text is None:
+            continue
+        license_plate_text = accepted_text
+        if consensus is None:
+            result = plate_result(license_plate, veh_bbox, license_plate_text, license_plate_text_score, inference_time)
+            results[license_numbers] = {license_numbers: result}
+            results_sink.write({license_numbers: results[license_numbers]})
+            license_numbers += 1
+            matches = match_watchlist(license_plate_text, lp_track_id)
+            if matches:
+                watchlist_matches.append((license_plate_text, matches))
+
+    # One record per plate track, once its consensus is final or the track ended. Its crops were offered with
+    # the track's reads, and plate_result names the files the image sink keeps them in
+    for record in frame.get('plate_records', ()):
+        license_plate, veh_bbox = record['context']
+        license_plate_text = accepted_plate_text(record['text'], record['score'], veh_bbox[6])
+        if license_plate_text is None:
+            continue
+        results[license_numbers] = {license_numbers: plate_result(license_plate, veh_bbox, license_plate_text, record['score'], inference_time)}
+        results_sink.write({license_numbers: results[license_numbers]})
+        license_numbers += 1
+        matches = match_watchlist(license_plate_text, license_plate[4])
+        if matches:
+            watchlist_matches.append((license_plate_text, matches))
+
+    if frame['plate_track_ids'] is not None:
+        for lp_track_id in [lp_track_id for lp_track_id in watchlist_alerted if lp_track_id not in frame['plate_track_ids']]:
+            del watchlist_alerted[lp_track_id]
+
+    # Vehicles the tracker dropped get their best pending crops written
+    image_sink.end_tracks(frame['vehicle_track_ids'])
+
+    latency = time.time() - frame['start_time']
+    scheduler.record(latency)
+    metrics.observe('save_stage', time.perf_counter() - save_start)
+    metrics.observe('frame_latency', latency)
+    metrics.inc('frames_out')
+    metrics.inc('reads_accepted', license_numbers)
+    frame['plates'] = plates
+    frame['licenses_texts'] = licenses_texts
+    frame['license_plate_crops'] = license_plate_crops_total
+    frame['results'] = results
+    frame['watchlist_matches'] = watchlist_matches
+    # The crops handed on were copied, nothing in the stages uses the frame's buffers anymore
+    release_frame(frame)
+    return frame
 
-    img_wth_box = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    return [img_wth_box, [], [], {}]  # Include an empty dictionary for results
+
+def model_prediction(img, frame_number):
+    """
+    Run one RGB frame through every stage, for callers that hand over and display RGB frames.
+
+    The frame is converted to BGR once on the way in; the annotated copy is
+    converted back while it is drawn, so no extra full-frame copy is made.
+
+    Args:
+        img (numpy.ndarray): RGB frame.
+        frame_number (int): Frame number.
+
+    Returns:
+        list: Annotated RGB frame, plate texts, accepted plate crops and the results dictionary.
+    """
+    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    plan = scheduler.plan()
+    if plan['detect']:
+        frame = detect_vehicles_and_plates(img, imgsz=plan['imgsz'], run_ocr=plan['ocr'])
+    else:
+        frame = track_only(img)
+    frame = save_reads(read_plates(frame))
+    img_wth_box = draw_annotations(frame['img'], frame['vehicles'], frame['plates'], cv2.COLOR_BGR2RGB)
+    return [img_wth_box, frame['licenses_texts'], frame['license_plate_crops'], frame['results']]
 
 
 def main():
-    cap = cv2.VideoCapture(2)
-    processor = VideoProcessor()
-    frame_number = 0
-            
+    global ocr_pool, watchlist
+    setup()
+    # Models load concurrently in the background while the camera opens
+    if OCR_WORKERS:
+        # The workers load their own readers, the reader in this process is not needed
+        ocr_pool = OCRPool(OCR_WORKERS, INFERENCE_BACKEND, int8=INT8)
+        models.preload('coco_model', 'license_plate_detector')
+    else:
+        models.preload()
+    with models.phase('camera'):
+        cap = cv2.VideoCapture(2)
+    if WATCHLIST_LISTS:
+        # Built while the models load, reloads after that happen in the background
+        with models.phase('watchlist'):
+            watchlist = Watchlist(WATCHLIST_LISTS).start()
+    with models.phase('models'):
+        models.wait()
+
     # Set the desired width and height for the resized frames
-    width = 1280
-    height = 720
+    width, height = WORKING_SIZE
+    # Frames stay BGR from capture to sink. Camera frames are decoded into, and working
+    # frames resized into, reused buffers instead of new arrays every frame
+    capture_pool = FramePool()
+    working_pool = FramePool((height, width, 3))
+
+    # Without a window nothing is drawn, converted or shown at all
+    headless = HEADLESS or (sys.platform.startswith('linux') and not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'))
+    # Draws on a copy of the newest saved frame, at DISPLAY_FPS at most, in this thread
+    viewer = None if headless else Viewer(max_fps=DISPLAY_FPS)
+    # Browser preview and recording draw and encode in their own threads and drop frames when behind
+    preview = MJPEGServer(PREVIEW_PORT).start() if PREVIEW_PORT is not None else None
+    recorder = Recorder(RECORDING_PATH, RECORDING_FPS).start() if RECORDING_PATH is not None else None
+    consumers = [consumer for consumer in (preview, recorder) if consumer is not None]
+    has_output = viewer is not None or len(consumers) != 0
+
+    def detect_stage(item):
+        frame_number, frame, capture_time = item
+        metrics.inc('frames_in')
+        if frame.shape[:2] != (height, width):
+            processed_frame = cv2.resize(frame, (width, height), dst=working_pool.acquire())
+            buffers = [(working_pool, processed_frame)]
+            if CROP_FROM_SOURCE:
+                # Plates are cropped from the camera frame, it stays in use until the frame is saved
+                buffers.append((capture_pool, frame))
+            else:
+                capture_pool.release(frame)
+        else:
+            processed_frame = frame
+            buffers = [(capture_pool, frame)]
+        if motion_gate is not None and not motion_gate.check(processed_frame):
+            metrics.inc('frames_skipped', reason='motion')
+            detections = track_only(processed_frame)
+        else:
+            plan = scheduler.plan()
+            if not plan['detect']:
+                metrics.inc('frames_skipped', reason='scheduler')
+                detections = track_only(processed_frame)
+            else:
+                detections = detect_vehicles_and_plates(
+                    processed_frame, imgsz=plan['imgsz'], run_ocr=plan['ocr'],
+                    source=frame if CROP_FROM_SOURCE and processed_frame is not frame else None,
+                )
+        # Latency the scheduler adapts to is measured from capture, the wait in the capture queue included
+        detections['start_time'] = capture_time
+        detections['frame_number'] = frame_number
+        detections['buffers'] = buffers
+        if has_output:
+            # One reference for the stages, released by save_reads, and one for whoever takes the frame from the output
+            retain_frame(detections)
+        return detections
+
+    # Capture, detection, OCR and persistence each run in their own thread.
+    # The detection inbox keeps only the newest frame, so the camera is never blocked
+    # and frames that arrive while detection is busy are dropped instead of queued.
+    # The output keeps only the newest frame too, so the viewer never holds up the stages.
+    # Frames either queue drops have their buffers released.
+    pipeline = Pipeline(cap, [
+        ('detect', detect_stage, 1, True),
+        ('ocr', read_plates, 2, False),
+        ('save', save_reads, 4, False),
+    ], output_size=1 if has_output else None, drop_output=True, capture_pool=capture_pool, release_output=release_frame).start()
+
+    # Queue depths, drops, cache hits and bytes written are read from the components' own counters when scraped
+    metrics.add_collector('pipeline', pipeline.stats)
+    metrics.add_collector('ocr_cache', ocr_cache.stats)
+    metrics.add_collector('image_sink', image_sink.stats)
+    metrics.add_collector('results_sink', results_sink.stats)
+    metrics.add_collector('scheduler', scheduler.stats)
+    metrics.add_collector('capture_pool', capture_pool.stats)
+    if ocr_pool is not None:
+        metrics.add_collector('ocr_pool', ocr_pool.stats)
+    if crop_selector is not None:
+        metrics.add_collector('crop_selector', crop_selector.stats)
+    if consensus is not None:
+        metrics.add_collector('consensus', consensus.stats)
+    if watchlist is not None:
+        metrics.add_collector('watchlist', watchlist.stats)
+    metrics.add_collector('working_pool', working_pool.stats)
+    if motion_gate is not None:
+        metrics.add_collector('motion_gate', motion_gate.stats)
+    if preview is not None:
+        metrics.add_collector('preview', preview.stats)
+    if recorder is not None:
+        metrics.add_collector('recorder', recorder.stats)
+    metrics_server = metrics.serve(METRICS_PORT) if METRICS_PORT is not None else None
+    metrics_dump = metrics.dump_json(METRICS_JSON, STATS_INTERVAL) if METRICS_JSON is not None else None
 
-    while True:
-        ret, frame = cap.read()
+    last_stats_time = time.time()
+    try:
+        while True:
+            if not has_output:
+                if not pipeline.is_alive():
+                    break
+                time.sleep(0.1)
+            else:
+                try:
+                    frame = pipeline.output.get(timeout=0.01)
+                except QueueClosed:
+                    break
+                if frame is not None:
+                    # Hand-offs only, the preview and the recorder drop frames they cannot keep up with.
+                    # Each holds a reference to the frame's buffers and releases it when done
+                    retain_frame(frame, len(consumers))
+                    for consumer in consumers:
+                        consumer.publish(frame)
+                    if viewer is not None:
+                        viewer.show(frame)
+                    release_frame(frame)
 
-        if not ret:
-            break
-        # Increment frame number
-        frame_number += 1
+            if 'first_frame' not in models.marks and pipeline.stages[-1].processed:
+                models.mark('first_frame')
+                print(f"Startup: {models.startup_report()}")
 
-        if frame_number % 2 == 0:
-            # Process the frame
-            processed_frame = processor.recv(frame)
-            processed_frame = cv2.resize(processed_frame, (width, height))
-            result = model_prediction(processed_frame, frame_number)
-            processed_frame = result[0]
-            cv2.imshow("Tech Titans Realtime License Plate Recognition", processed_frame)
+            if time.time() - last_stats_time >= STATS_INTERVAL:
+                print(f"Pipeline: {pipeline.stats()}")
+                if motion_gate is not None:
+                    print(f"Motion gate: {motion_gate.stats()}")
+                print(f"Scheduler: {scheduler.stats()}")
+                if crop_selector is not None:
+                    print(f"Crop selector: {crop_selector.stats()}")
+                if consensus is not None:
+                    print(f"Consensus: {consensus.stats()}")
+                if watchlist is not None:
+                    print(f"Watchlist: {watchlist.stats()}")
+                print(f"Frame pools: capture {capture_pool.stats()}, working {working_pool.stats()}")
+                if viewer is not None:
+                    print(f"Viewer: {viewer.stats()}")
+                if preview is not None:
+                    print(f"Preview: {preview.stats()}")
+                if recorder is not None:
+                    print(f"Recorder: {recorder.stats()}")
+                last_stats_time = time.time()
 
-        # Break the loop on pressing 'q'
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+            # Break the loop on pressing 'q'
+            if viewer is not None and viewer.poll() == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
 
     # Release the video capture object and close OpenCV windows
+    pipeline.stop()
+    if ocr_pool is not None:
+        ocr_pool.close()
+    if watchlist is not None:
+        watchlist.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    if metrics_dump is not None:
+        metrics_dump.set()
+    image_sink.close()
+    results_sink.close()
     cap.release()
-    cv2.destroyAllWindows()
+    if viewer is not None:
+        viewer.close()
+    if preview is not None:
+        preview.stop()
+    if recorder is not None:
+        recorder.stop()
+    models.close()
+    print(f"Pipeline: {pipeline.stats()}")
+    if motion_gate is not None:
+        print(f"Motion gate: {motion_gate.stats()}")
+    print(f"Scheduler: {scheduler.stats()}")
+    print(f"OCR cache: {ocr_cache.stats()}")
+    if crop_selector is not None:
+        print(f"Crop selector: {crop_selector.stats()}")
+    if consensus is not None:
+        print(f"Consensus: {consensus.stats()}")
+    if watchlist is not None:
+        print(f"Watchlist: {watchlist.stats()}")
+    if ocr_pool is not None:
+        print(f"OCR pool: {ocr_pool.stats()}")
+    print(f"Image sink: {image_sink.stats()}")
+    print(f"Results sink: {results_sink.stats()}")
+    for stage_name, error in pipeline.errors().items():
+        print(f"Stage {stage_name} failed: {error!r}")
 
 if __name__ == "__main__":
     main()
-app.py
-Ipinapakita ang app.py.
@@ -0,0 +1,69 @@
+import numpy as np
+
+# Fraction of a plate box that has to lie inside a vehicle box for the plate to belong to it
+MIN_PLATE_OVERLAP = 0.9
+
+
+def tracked_boxes(boxes):
+    """
+    Copy the tracked boxes of an ultralytics ``Boxes`` object to the CPU in one transfer.
+
+    Args:
+        boxes (ultralytics.engine.results.Boxes): Boxes returned by ``model.track``.
+
+    Returns:
+        numpy.ndarray: Nx7 array of x1, y1, x2, y2, track_id, score, class_id. Empty
+        when the tracker returned no tracked boxes.
+    """
+    data = boxes.data.cpu().numpy()
+    if data.ndim != 2 or data.shape[1] != 7:
+        return np.empty((0, 7), dtype=np.float32)
+    return data
+
+
+def plate_vehicle_overlap(plate_xyxy, vehicle_xyxy):
+    """
+    Compute the intersection of every plate with every vehicle over the plate area.
+
+    Args:
+        plate_xyxy (numpy.ndarray): Px4 plate boxes.
+        vehicle_xyxy (numpy.ndarray): Vx4 vehicle boxes.
+
+    Returns:
+        numpy.ndarray: PxV matrix, 1.0 where a plate lies fully inside a vehicle.
+    """
+    ix1 = np.maximum(plate_xyxy[:, None, 0], vehicle_xyxy[None, :, 0])
+    iy1 = np.maximum(plate_xyxy[:, None, 1], vehicle_xyxy[None, :, 1])
+    ix2 = np.minimum(plate_xyxy[:, None, 2], vehicle_xyxy[None, :, 2])
+    iy2 = np.minimum(plate_xyxy[:, None, 3], vehicle_xyxy[None, :, 3])
+    intersection = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    plate_area = (plate_xyxy[:, 2] - plate_xyxy[:, 0]) * (plate_xyxy[:, 3] - plate_xyxy[:, 1])
+    return intersection / np.maximum(plate_area, 1e-6)[:, None]
+
+
+def associate_plates(plate_xyxy, vehicle_xyxy, min_overlap=MIN_PLATE_OVERLAP):
+    """
+    Assign every plate to at most one vehicle.
+
+    Of the vehicles that hold at least ``min_overlap`` of a plate, the smallest
+    one wins, so a plate inside nested vehicle boxes is only assigned once.
+
+    Args:
+        plate_xyxy (numpy.ndarray): Px4 plate boxes.
+        vehicle_xyxy (numpy.ndarray): Vx4 vehicle boxes.
+        min_overlap (float): Minimum intersection over plate area.
+
+    Returns:
+        numpy.ndarray: Vehicle index for every plate, -1 for plates outside all vehicles.
+    """
+    if len(plate_xyxy) == 0 or len(vehicle_xyxy) == 0:
+        return np.full(len(plate_xyxy), -1, dtype=np.intp)
+
+    overlap = plate_vehicle_overlap(plate_xyxy, vehicle_xyxy)
+    vehicle_area = (vehicle_xyxy[:, 2] - vehicle_xyxy[:, 0]) * (vehicle_xyxy[:, 3] - vehicle_xyxy[:, 1])
+
+    cost = np.where(overlap >= min_overlap, vehicle_area[None, :], np.inf)
+    best = cost.argmin(axis=1)
+    best[np.isinf(cost[np.arange(len(plate_xyxy)), best])] = -1
+    return best
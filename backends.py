@@ -0,0 +1,422 @@
+import argparse
+import glob
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+from roi import letterbox
+
+# Inference backends, picked at startup
+BACKENDS = ('cuda', 'openvino', 'onnx', 'torch')
+
+# Frames INT8 quantization is calibrated on, collect them with `python backends.py collect`
+CALIBRATION_DIR = "./models/calibration"
+
+# Most calibration frames used for one quantization
+CALIBRATION_IMAGES = 200
+
+# Height EasyOCR feeds its recognizer
+OCR_RECOGNIZER_HEIGHT = 64
+
+
+def _installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def available_backends():
+    """
+    Get the backends that can run on this machine.
+
+    Returns:
+        list: Names from ``BACKENDS``, fastest first.
+    """
+    backends = []
+    if _installed('torch'):
+        import torch
+        if torch.cuda.is_available():
+            backends.append('cuda')
+    if _installed('openvino'):
+        backends.append('openvino')
+    if _installed('onnxruntime'):
+        backends.append('onnx')
+    if _installed('torch'):
+        backends.append('torch')
+    return backends
+
+
+def pick_backend(backend='auto'):
+    """
+    Resolve the inference backend to use.
+
+    Args:
+        backend (str): One of ``BACKENDS``, or 'auto' for the fastest available one.
+
+    Returns:
+        str: The backend.
+
+    Raises:
+        ValueError: If the requested backend is unknown or not available here.
+    """
+    available = available_backends()
+    if backend == 'auto':
+        if not available:
+            raise ValueError("No inference backend available, install torch, onnxruntime or openvino")
+        return available[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend not in available:
+        raise ValueError(f"Inference backend {backend} is not available on this machine")
+    return backend
+
+
+def _is_stale(artifact, source):
+    # Exports are redone when the weights they were made from changed
+    return not os.path.exists(artifact) or os.path.getmtime(artifact) < os.path.getmtime(source)
+
+
+def calibration_images(calibration_dir=CALIBRATION_DIR, limit=CALIBRATION_IMAGES):
+    """
+    Load the frames INT8 quantization is calibrated on.
+
+    Args:
+        calibration_dir (str): Directory with .jpg/.png frames from our own cameras.
+        limit (int): Most frames to load, spread evenly over the directory.
+
+    Returns:
+        list: BGR frames.
+
+    Raises:
+        FileNotFoundError: If the directory holds no frames.
+    """
+    paths = sorted(glob.glob(os.path.join(calibration_dir, '*.jpg')) + glob.glob(os.path.join(calibration_dir, '*.png')))
+    if len(paths) == 0:
+        raise FileNotFoundError(f"No calibration frames in {calibration_dir}, collect them with `python backends.py collect`")
+    paths = [paths[i] for i in np.linspace(0, len(paths) - 1, min(limit, len(paths))).astype(int)]
+    return [cv2.imread(path) for path in paths]
+
+
+def _calibration_tensors(images, imgsz):
+    # The same input YOLO builds: letterboxed, RGB, CHW, 0-1
+    for image in images:
+        canvas, _, _ = letterbox(image, imgsz)
+        yield np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def _quantize_onnx(onnx_path, int8_path, imgsz, calibration_dir):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnx.load(onnx_path, load_external_data=False).graph.input[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.tensors = _calibration_tensors(calibration_images(calibration_dir), imgsz)
+
+        def get_next(self):
+            tensor = next(self.tensors, None)
+            return None if tensor is None else {input_name: tensor}
+
+    quantize_static(onnx_path, int8_path, FrameReader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    # ultralytics reads class names and stride from the model metadata, keep it
+    source_model, quantized_model = onnx.load(onnx_path), onnx.load(int8_path)
+    del quantized_model.metadata_props[:]
+    quantized_model.metadata_props.extend(source_model.metadata_props)
+    onnx.save(quantized_model, int8_path)
+
+
+def _quantize_openvino(model_dir, int8_dir, imgsz, calibration_dir):
+    import nncf
+    import openvino.runtime as ov
+
+    xml_path = glob.glob(os.path.join(model_dir, '*.xml'))[0]
+    model = ov.Core().read_model(xml_path)
+    dataset = nncf.Dataset(list(_calibration_tensors(calibration_images(calibration_dir), imgsz)))
+    # Same operations ultralytics leaves in floating point for its own INT8 export
+    quantized_model = nncf.quantize(model, dataset, preset=nncf.QuantizationPreset.MIXED,
+                                    ignored_scope=nncf.IgnoredScope(types=['Multiply', 'Subtract', 'Sigmoid']))
+    os.makedirs(int8_dir, exist_ok=True)
+    ov.serialize(quantized_model, os.path.join(int8_dir, os.path.basename(xml_path)))
+    shutil.copy(os.path.join(model_dir, 'metadata.yaml'), int8_dir)
+
+
+def export_yolo(weights, backend, imgsz=640, int8=False, calibration_dir=CALIBRATION_DIR):
+    """
+    Export YOLO weights for a backend, once.
+
+    Exports are cached next to the weights (``best.onnx``, ``best_int8.onnx``,
+    ``best_openvino_model/``, ``best_int8_openvino_model/``) and redone when the
+    weights are newer. They have dynamic input shapes, so batches of ROIs and
+    the scheduler's smaller input sizes keep working.
+
+    Args:
+        weights (str): Path to the .pt weights.
+        backend (str): 'onnx' or 'openvino'.
+        imgsz (int): Input size the export and INT8 calibration use.
+        int8 (bool): Quantize to INT8 on the calibration frames.
+        calibration_dir (str): Directory with calibration frames.
+
+    Returns:
+        str: Path ultralytics.YOLO can load.
+    """
+    from ultralytics import YOLO
+
+    root = os.path.splitext(weights)[0]
+    if backend == 'onnx':
+        artifact = f"{root}.onnx"
+        if _is_stale(artifact, weights):
+            YOLO(weights).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            int8_artifact = f"{root}_int8.onnx"
+            if _is_stale(int8_artifact, artifact):
+                _quantize_onnx(artifact, int8_artifact, imgsz, calibration_dir)
+            artifact = int8_artifact
+        return artifact
+
+    if backend == 'openvino':
+        artifact = f"{root}_openvino_model"
+        if _is_stale(artifact, weights):
+            YOLO(weights).export(format='openvino', imgsz=imgsz, dynamic=True)
+        if int8:
+            int8_artifact = f"{root}_int8_openvino_model"
+            if _is_stale(int8_artifact, artifact):
+                _quantize_openvino(artifact, int8_artifact, imgsz, calibration_dir)
+            artifact = int8_artifact
+        return artifact
+
+    raise ValueError(f"Backend {backend} runs the .pt weights directly")
+
+
+def load_yolo(weights, backend='auto', imgsz=640, int8=False, calibration_dir=CALIBRATION_DIR):
+    """
+    Load a YOLO model on the chosen backend.
+
+    Args:
+        weights (str): Path to the .pt weights.
+        backend (str): One of ``BACKENDS``, or 'auto'.
+        imgsz (int): Input size exports and INT8 calibration use.
+        int8 (bool): Use an INT8 quantized export (onnx and openvino only).
+        calibration_dir (str): Directory with calibration frames.
+
+    Returns:
+        ultralytics.YOLO: The model, used the same way on every backend.
+    """
+    from ultralytics import YOLO
+
+    backend = pick_backend(backend)
+    if backend == 'cuda':
+        return YOLO(weights).to('cuda:0')
+    if backend == 'torch':
+        return YOLO(weights)
+    return YOLO(export_yolo(weights, backend, imgsz, int8, calibration_dir), task='detect')
+
+
+class ONNXRecognizer:
+    """
+    Stand-in for EasyOCR's torch recognizer that runs an ONNX export on ONNX Runtime.
+
+    EasyOCR calls its recognizer as ``model(image, text)`` and only uses the
+    returned scores, so any object with that call signature can replace it.
+
+    Args:
+        onnx_path (str): Exported recognizer.
+    """
+
+    def __init__(self, onnx_path):
+        import onnxruntime
+
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, image, text=None):
+        import torch
+
+        inputs = {'image': image.cpu().numpy(), 'text': None if text is None else text.cpu().numpy()}
+        outputs = self.session.run(None, {name: inputs[name] for name in self.input_names})
+        return torch.from_numpy(outputs[0])
+
+
+class ONNXDetector:
+    """
+    Stand-in for EasyOCR's torch CRAFT text detector that runs an ONNX export on ONNX Runtime.
+
+    EasyOCR calls its detector as ``y, feature = net(x)`` on a normalized
+    NCHW batch and reads the region and affinity maps from ``y``.
+
+    Args:
+        onnx_path (str): Exported detector.
+    """
+
+    def __init__(self, onnx_path):
+        import onnxruntime
+
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+
+    def eval(self):
+        return self
+
+    def __call__(self, x):
+        import torch
+
+        y, feature = self.session.run(None, {'image': x.cpu().numpy()})
+        return torch.from_numpy(y), torch.from_numpy(feature)
+
+
+def export_detector(reader, onnx_path):
+    """
+    Export EasyOCR's CRAFT text detector to ONNX, once.
+
+    The detector is all convolutions, which dynamic INT8 quantization leaves
+    alone on torch and slows down on ONNX Runtime, so it stays float32.
+
+    Args:
+        reader (easyocr.Reader): CPU reader whose detector is exported.
+        onnx_path (str): Where the export is cached.
+
+    Returns:
+        str: Path of the export to load.
+    """
+    import torch
+
+    if not os.path.exists(onnx_path):
+        os.makedirs(os.path.dirname(onnx_path) or '.', exist_ok=True)
+        image = torch.zeros((1, 3, 320, 320))
+        torch.onnx.export(reader.detector, image, onnx_path, input_names=['image'], output_names=['y', 'feature'],
+                          dynamic_axes={'image': {0: 'batch', 2: 'height', 3: 'width'},
+                                        'y': {0: 'batch', 1: 'height', 2: 'width'},
+                                        'feature': {0: 'batch', 2: 'height', 3: 'width'}},
+                          opset_version=12)
+    return onnx_path
+
+
+def export_recognizer(reader, onnx_path, int8=False):
+    """
+    Export EasyOCR's recognizer to ONNX, once.
+
+    The recognizer is a CNN + LSTM + CTC head; INT8 uses dynamic quantization,
+    which needs no calibration frames and suits its LSTM and linear layers.
+
+    Args:
+        reader (easyocr.Reader): CPU reader whose recognizer is exported.
+        onnx_path (str): Where the export is cached.
+        int8 (bool): Also quantize the weights to INT8, saved as ``<name>_int8.onnx``.
+
+    Returns:
+        str: Path of the export to load.
+    """
+    import torch
+
+    if not os.path.exists(onnx_path):
+        os.makedirs(os.path.dirname(onnx_path) or '.', exist_ok=True)
+        image = torch.zeros((1, 1, OCR_RECOGNIZER_HEIGHT, 256))
+        text = torch.zeros((1, 26), dtype=torch.long)
+        torch.onnx.export(reader.recognizer, (image, text), onnx_path, input_names=['image', 'text'], output_names=['preds'],
+                          dynamic_axes={'image': {0: 'batch', 3: 'width'}, 'text': {0: 'batch'}, 'preds': {0: 'batch', 1: 'length'}},
+                          opset_version=12)
+    if not int8:
+        return onnx_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = f"{os.path.splitext(onnx_path)[0]}_int8.onnx"
+    if _is_stale(int8_path, onnx_path):
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def load_reader(backend='auto', languages=('en',), int8=False, model_dir="./models/easyocr"):
+    """
+    Create an EasyOCR reader whose text detector and recognizer run on the chosen backend.
+
+    ``readtext`` and ``readtext_batched`` run CRAFT text detection on every
+    plate crop before recognizing it, so on 'onnx' and 'openvino' both models
+    are exported. Without ONNX Runtime the reader stays on torch.
+
+    Args:
+        backend (str): One of ``BACKENDS``, or 'auto'. OpenVINO readers use the ONNX export on ONNX Runtime.
+        languages (tuple): EasyOCR languages.
+        int8 (bool): Quantize the ONNX recognizer export to INT8. Torch readers are always
+            dynamically quantized, as EasyOCR does on CPU by default.
+        model_dir (str): Where the detector and recognizer exports are cached.
+
+    Returns:
+        easyocr.Reader: The reader.
+    """
+    import easyocr
+
+    backend = pick_backend(backend)
+    if backend == 'cuda':
+        return easyocr.Reader(list(languages), gpu=True)
+
+    # EasyOCR's own dynamic INT8 quantization (its CPU default) is kept unless the models are swapped:
+    # the ONNX exports need the float models and the recognizer export is quantized instead
+    swap = backend in ('onnx', 'openvino') and _installed('onnxruntime')
+    reader = easyocr.Reader(list(languages), gpu=False, quantize=not swap)
+    if swap:
+        name = '_'.join(languages)
+        reader.detector = ONNXDetector(export_detector(reader, os.path.join(model_dir, "craft_detector.onnx")))
+        reader.recognizer = ONNXRecognizer(export_recognizer(reader, os.path.join(model_dir, f"recognizer_{name}.onnx"), int8))
+    return reader
+
+
+def collect_calibration_frames(source, calibration_dir=CALIBRATION_DIR, every=30, limit=CALIBRATION_IMAGES):
+    """
+    Save every ``every``-th frame of a camera or video as a calibration frame.
+
+    Args:
+        source (int or str): Camera index, video file or stream URL.
+        calibration_dir (str): Where the frames are saved.
+        every (int): Frame interval.
+        limit (int): Frames to save.
+
+    Returns:
+        int: Number of saved frames.
+    """
+    os.makedirs(calibration_dir, exist_ok=True)
+    cap = cv2.VideoCapture(source)
+    frame_number, saved = 0, 0
+    while saved < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_number % every == 0:
+            cv2.imwrite(os.path.join(calibration_dir, f"frame_{frame_number:07d}.jpg"), frame)
+            saved += 1
+        frame_number += 1
+    cap.release()
+    return saved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect INT8 calibration frames or export models for a CPU backend.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    collect = subparsers.add_parser('collect', help="save calibration frames from a camera or video")
+    collect.add_argument("--source", required=True, help="camera index, video file or URL")
+    collect.add_argument("--every", type=int, default=30, help="save every N-th frame")
+    collect.add_argument("--limit", type=int, default=CALIBRATION_IMAGES, help="frames to save")
+    export = subparsers.add_parser('export', help="export YOLO weights for a backend")
+    export.add_argument("weights", nargs='+', help=".pt weights")
+    export.add_argument("--backend", choices=['onnx', 'openvino'], default='onnx')
+    export.add_argument("--imgsz", type=int, default=640)
+    export.add_argument("--int8", action="store_true", help="quantize to INT8 on the calibration frames")
+    # On the subcommands, so it goes after the subcommand and shows in its help
+    for subparser in (collect, export):
+        subparser.add_argument("--calibration-dir", default=CALIBRATION_DIR, help="directory of the calibration frames")
+    args = parser.parse_args()
+
+    if args.command == 'collect':
+        source = int(args.source) if args.source.isdigit() else args.source
+        print(f"Saved {collect_calibration_frames(source, args.calibration_dir, args.every, args.limit)} calibration frames")
+    else:
+        for weights in args.weights:
+            print(export_yolo(weights, args.backend, args.imgsz, args.int8, args.calibration_dir))
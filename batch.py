@@ -0,0 +1,398 @@
+import argparse
+import bisect
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from association import associate_plates
+from backends import BACKENDS
+from motion import MotionGate
+from ocr_cache import OCRCache
+from registry import ModelRegistry
+from results_sink import CSVBackend, ResultsSink
+from results_store import SQLiteBackend
+from roi import ROI_SIZE, detect_plates_in_rois
+from tracking import age_tracker, make_tracker, tracker_track_ids, update_tracker
+from plate_format import plate_grammar
+
+LICENSE_MODEL_DETECTION_DIR = './models/best.pt'
+COCO_MODEL_DIR = "./models/yolov8s.pt"
+VEHICLES = {2: "Car", 3: "MC", 5: "Bus", 6: "Truck"}
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.ts', '.m4v')
+
+# Length of the chunks long videos are split into, in seconds of video
+CHUNK_SECONDS = 300
+
+# Seconds decoded before each chunk's start so its trackers are warm when it starts recording
+OVERLAP_SECONDS = 3
+
+# Reads of the same plate this many seconds apart in neighbouring chunks are the same vehicle
+MERGE_SECONDS = 10
+
+# Minimum OCR score for a read to be recorded
+MIN_TEXT_SCORE = 0.7
+
+# Models of the worker process, loaded once per worker by init_worker
+worker_models = None
+
+
+def find_videos(inputs):
+    """
+    Expand files and directories into the video files to process.
+
+    Args:
+        inputs (list): Video files and directories, directories are searched recursively.
+
+    Returns:
+        list: Sorted video paths.
+    """
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(os.path.join(root, name) for name in files if name.lower().endswith(VIDEO_EXTENSIONS))
+        else:
+            videos.append(path)
+    return sorted(set(videos))
+
+
+def keyframe_numbers(path, fps):
+    """
+    Get the frame numbers of a video's keyframes with ffprobe.
+
+    Args:
+        path (str): Video file.
+        fps (float): Frame rate of the video.
+
+    Returns:
+        list: Sorted keyframe numbers, None if ffprobe is not installed or fails.
+    """
+    if shutil.which('ffprobe') is None:
+        return None
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+               '-show_entries', 'frame=pts_time', '-of', 'csv=p=0', path]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    times = [float(line.strip().rstrip(',')) for line in output.splitlines() if line.strip().rstrip(',')]
+    return sorted({int(round(t * fps)) for t in times}) or None
+
+
+def plan_chunks(path, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+    """
+    Split a video into chunks that can be processed independently.
+
+    Chunk starts and the points decoding starts at are moved back to the
+    nearest keyframe when ffprobe can list them, so seeking is cheap and
+    exact. Every chunk is decoded from ``overlap_seconds`` before its start to
+    warm up the trackers, but only records reads from its start on.
+
+    Args:
+        path (str): Video file.
+        chunk_seconds (float): Target chunk length.
+        overlap_seconds (float): Seconds decoded ahead of every chunk.
+
+    Returns:
+        list: Chunk dicts with 'id', 'path', 'fps', 'start', 'end' and 'decode_start' frame numbers.
+    """
+    cap = cv2.VideoCapture(path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    keyframes = keyframe_numbers(path, fps)
+
+    def snap(frame_number):
+        if not keyframes:
+            return frame_number
+        return keyframes[max(bisect.bisect_right(keyframes, frame_number) - 1, 0)]
+
+    chunk_frames = max(int(chunk_seconds * fps), 1)
+    starts = [0]
+    while starts[-1] + chunk_frames < frame_count:
+        start = snap(starts[-1] + chunk_frames)
+        # No keyframe inside this chunk's span, fall back to an exact frame boundary
+        starts.append(start if start > starts[-1] else starts[-1] + chunk_frames)
+
+    chunks = []
+    for start, end in zip(starts, starts[1:] + [frame_count]):
+        chunks.append({
+            'id': f"{path}:{start}",
+            'path': path,
+            'fps': fps,
+            'start': start,
+            'end': end,
+            'decode_start': snap(max(start - int(overlap_seconds * fps), 0)),
+        })
+    return chunks
+
+
+def init_worker(backend, int8):
+    """Load this worker process's models, once."""
+    global worker_models
+    worker_models = ModelRegistry(backend, int8=int8)
+    worker_models.register_yolo('coco_model', COCO_MODEL_DIR)
+    worker_models.register_yolo('license_plate_detector', LICENSE_MODEL_DETECTION_DIR, warmup_sizes=((ROI_SIZE, 4), (640, 1)))
+    worker_models.register_reader('reader')
+    worker_models.preload()
+
+
+def process_chunk(chunk, motion_gate=True):
+    """
+    Recognize the plates of one chunk.
+
+    Runs in a worker process with fresh trackers, so chunks are independent.
+    Every vehicle track keeps its best read.
+
+    Args:
+        chunk (dict): Chunk from ``plan_chunks``.
+        motion_gate (bool): Skip detection on frames without motion.
+
+    Returns:
+        dict: Chunk 'id', 'frames' recorded (overlap excluded), 'seconds' of
+        video they cover and the best 'reads' per vehicle track.
+    """
+    coco_model = worker_models.get('coco_model')
+    license_plate_detector = worker_models.get('license_plate_detector')
+    reader = worker_models.get('reader')
+
+    fps = chunk['fps']
+    vehicle_tracker, plate_tracker = make_tracker(frame_rate=round(fps)), make_tracker(frame_rate=round(fps))
+    ocr_cache = OCRCache()
+    gate = MotionGate() if motion_gate else None
+    best_reads = {}
+
+    cap = cv2.VideoCapture(chunk['path'])
+    cap.set(cv2.CAP_PROP_POS_FRAMES, chunk['decode_start'])
+    frame_number = chunk['decode_start']
+    while frame_number < chunk['end']:
+        ret, img = cap.read()
+        if not ret:
+            break
+        start_time = time.time()
+        recording = frame_number >= chunk['start']
+
+        if gate is not None and not gate.check(img):
+            age_tracker(vehicle_tracker, img)
+            age_tracker(plate_tracker, img)
+            frame_number += 1
+            continue
+
+        vehicle_detections = coco_model.predict(img, classes=list(VEHICLES), verbose=False)[0].boxes.data.cpu().numpy()
+        vehicle_data = update_tracker(vehicle_tracker, vehicle_detections, img)
+        if len(vehicle_data) != 0:
+            plate_detections, _ = detect_plates_in_rois(license_plate_detector, img, vehicle_data[:, :4])
+            plate_data = update_tracker(plate_tracker, plate_detections, img)
+            vehicle_indices = associate_plates(plate_data[:, :4], vehicle_data[:, :4])
+
+            candidates = []
+            for license_plate, vehicle_index in zip(plate_data.tolist(), vehicle_indices.tolist()):
+                x1, y1, x2, y2 = (int(value) for value in license_plate[:4])
+                license_plate_crop = img[y1:y2, x1:x2]
+                if vehicle_index >= 0 and license_plate_crop.size != 0:
+                    candidates.append((license_plate, vehicle_data[vehicle_index].tolist(), license_plate_crop))
+            plate_reads = ocr_cache.read_license_plates(reader, [c[0][4] for c in candidates], [c[2] for c in candidates])
+
+            for (license_plate, vehicle, _), (text, score) in zip(candidates, plate_reads):
+                if not recording or text is None or score is None or score < MIN_TEXT_SCORE:
+                    continue
+                _, _, _, _, track_id, vehicle_score, class_id = vehicle
+                veh_class_name = VEHICLES[int(class_id)]
+                # Accepted the way app.py accepts reads, only if it fits a plate format of the vehicle class
+                text, valid = plate_grammar.normalize(text, veh_class_name)
+                if not valid:
+                    continue
+                track_id = int(track_id)
+                seconds = frame_number / fps
+                best = best_reads.get(track_id)
+                if best is not None:
+                    best['last_seconds'] = seconds
+                    if score <= best['text_score']:
+                        continue
+                best_reads[track_id] = {
+                    'vehicle_id': track_id,
+                    'vehicle_class': veh_class_name,
+                    'vehicle_score': vehicle_score,
+                    'lp_id': int(license_plate[4]),
+                    'text': text,
+                    'text_score': float(score),
+                    'frame': frame_number,
+                    'first_seconds': best['first_seconds'] if best is not None else seconds,
+                    'last_seconds': seconds,
+                    'inference_time': time.time() - start_time,
+                }
+        else:
+            age_tracker(plate_tracker, img)
+        ocr_cache.evict(tracker_track_ids(plate_tracker))
+        frame_number += 1
+    cap.release()
+
+    recorded = max(frame_number - chunk['start'], 0)
+    return {'id': chunk['id'], 'frames': recorded, 'seconds': recorded / fps, 'reads': list(best_reads.values())}
+
+
+def merge_reads(reads, merge_seconds=MERGE_SECONDS):
+    """
+    Merge the per-track reads of a video's chunks.
+
+    A vehicle crossing a chunk boundary is tracked by both chunks under
+    different track IDs. Reads of the same plate whose sightings are less than
+    ``merge_seconds`` apart are merged, keeping the best-scoring one.
+
+    Args:
+        reads (list): Reads of all chunks of a video.
+        merge_seconds (float): Largest gap between sightings of the same vehicle.
+
+    Returns:
+        list: Merged reads, in order of first sighting.
+    """
+    merged = []
+    last_by_text = {}
+    for read in sorted(reads, key=lambda read: read['first_seconds']):
+        previous = last_by_text.get(read['text'])
+        if previous is not None and read['first_seconds'] - previous['last_seconds'] <= merge_seconds:
+            previous['last_seconds'] = max(previous['last_seconds'], read['last_seconds'])
+            if read['text_score'] > previous['text_score']:
+                previous.update({key: value for key, value in read.items() if key not in ('first_seconds', 'last_seconds')})
+            continue
+        read = dict(read)
+        last_by_text[read['text']] = read
+        merged.append(read)
+    return merged
+
+
+def recording_start(path, fps, frame_count):
+    """Estimate when a video started recording: its modification time minus its length."""
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path)) - datetime.timedelta(seconds=frame_count / fps)
+
+
+def write_video_results(sink, path, reads, start):
+    """
+    Hand the merged reads of a video to the results sink, stamped with the time they were recorded.
+
+    Args:
+        sink (ResultsSink): Results sink.
+        path (str): Video file, used as the image reference.
+        reads (list): Merged reads.
+        start (datetime.datetime): When the video started recording.
+    """
+    name = os.path.basename(path)
+    for read in merge_reads(reads):
+        frame_reference = f"{name}#frame={read['frame']}"
+        sink.write({0: {0: {
+            'Vehicle': {
+                'vehicle_id': read['vehicle_id'],
+                'vehicle_class': read['vehicle_class'],
+                'vehicle_score': read['vehicle_score'],
+                'vehicle_img': frame_reference,
+            },
+            'license_plate': {
+                'lp_id': read['lp_id'],
+                'text': read['text'],
+                'inference_time': read['inference_time'],
+                'lp_img': frame_reference,
+                'text_score': read['text_score'],
+                'timestamp': (start + datetime.timedelta(seconds=read['first_seconds'])).strftime("%Y-%m-%d %H:%M:%S"),
+            },
+        }}})
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {'chunks': {}, 'written': [], 'writing': None}
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path, checkpoint):
+    # Written to a temporary file and renamed, so an interruption never leaves a torn checkpoint
+    with open(f"{path}.tmp", 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(f"{path}.tmp", path)
+
+
+def make_sink(backend, path):
+    # One row per merged vehicle already; track IDs restart in every chunk, so deduplicating on them would drop real re-sightings
+    if backend == "sqlite":
+        return ResultsSink(SQLiteBackend("./results/LPR_results.db", camera=os.path.basename(path)), max_tracked_plates=None)
+    return ResultsSink(CSVBackend("./results/LPR_batch_results.csv"), max_tracked_plates=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognize license plates in recorded video files, headless and in parallel.")
+    parser.add_argument("inputs", nargs='+', help="video files or directories")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes, each loads its own models")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS, help="length of the chunks videos are split into")
+    parser.add_argument("--overlap-seconds", type=float, default=OVERLAP_SECONDS, help="tracker warm-up before every chunk")
+    parser.add_argument("--checkpoint", default="./results/batch_checkpoint.json", help="progress file, rerun with it to resume")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv", help="results backend")
+    parser.add_argument("--inference-backend", choices=["auto", *BACKENDS], default="auto", help="model backend")
+    parser.add_argument("--int8", action="store_true", help="INT8 models on the onnx/openvino backends")
+    parser.add_argument("--no-motion-gate", action="store_true", help="run detection on every frame")
+    args = parser.parse_args()
+
+    checkpoint = load_checkpoint(args.checkpoint)
+    videos = [video for video in find_videos(args.inputs) if video not in checkpoint['written']]
+    chunks = {video: plan_chunks(video, args.chunk_seconds, args.overlap_seconds) for video in videos}
+    pending = [chunk for video in videos for chunk in chunks[video] if chunk['id'] not in checkpoint['chunks']]
+    print(f"{len(videos)} videos, {sum(len(video_chunks) for video_chunks in chunks.values())} chunks, {len(pending)} to process")
+
+    def write_finished_videos():
+        for video in videos:
+            video_chunks = chunks[video]
+            if video in checkpoint['written'] or any(chunk['id'] not in checkpoint['chunks'] for chunk in video_chunks):
+                continue
+            reads = [read for chunk in video_chunks for read in checkpoint['chunks'][chunk['id']]['reads']]
+            sink = make_sink(args.backend, video)
+            writing = checkpoint.get('writing')
+            if writing is not None and writing['video'] == video:
+                # Interrupted between writing this video's rows and checkpointing them, they are removed and written again
+                sink.backend.rollback(writing['mark'])
+            # The position before the rows is checkpointed first, so the write and its checkpoint are all or nothing
+            checkpoint['writing'] = {'video': video, 'mark': sink.backend.mark()}
+            save_checkpoint(args.checkpoint, checkpoint)
+            write_video_results(sink, video, reads, recording_start(video, video_chunks[0]['fps'], video_chunks[-1]['end']))
+            sink.close()
+            checkpoint['written'].append(video)
+            checkpoint['writing'] = None
+            # The reads are in the results now, only the chunk ids are needed to resume
+            for chunk in video_chunks:
+                checkpoint['chunks'][chunk['id']]['reads'] = []
+            save_checkpoint(args.checkpoint, checkpoint)
+            print(f"{video}: {sink.stats()['rows_written']} plates written")
+
+    # Videos whose chunks all finished before an interruption
+    write_finished_videos()
+
+    start_time = time.time()
+    frames, video_seconds = 0, 0.0
+    # Spawned, not forked, so no worker inherits a CUDA context or a half-initialized model
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(args.workers, mp_context=context, initializer=init_worker, initargs=(args.inference_backend, args.int8)) as pool:
+        futures = [pool.submit(process_chunk, chunk, not args.no_motion_gate) for chunk in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            checkpoint['chunks'][result['id']] = result
+            save_checkpoint(args.checkpoint, checkpoint)
+            frames += result['frames']
+            video_seconds += result['seconds']
+            elapsed = time.time() - start_time
+            print(f"{len(checkpoint['chunks'])} chunks done, {frames / elapsed:.1f} frames/s, "
+                  f"{video_seconds / elapsed:.2f} video-hours per wall-hour")
+            write_finished_videos()
+
+    elapsed = time.time() - start_time
+    print(f"Processed {frames} frames ({video_seconds / 3600:.2f} video-hours) in {elapsed:.0f} s: "
+          f"{frames / max(elapsed, 1e-9):.1f} frames/s, {video_seconds / max(elapsed, 1e-9):.2f} video-hours per wall-hour")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+CPU latency of the inference backends: torch, ONNX Runtime and OpenVINO, FP32 and INT8.
+
+Prints a markdown table with per-frame vehicle detection, per-batch plate
+detection on vehicle ROIs and per-crop OCR latency. Backends that are not
+installed are skipped. INT8 rows need calibration frames in --calibration-dir
+(`python backends.py collect --source <video>`).
+
+Usage:
+    python -m benchmarks.backends --video traffic.mp4 --frames 100
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import backends
+from ocr import read_license_plates
+from roi import ROI_SIZE
+
+CONFIGS = [('torch', False), ('onnx', False), ('onnx', True), ('openvino', False), ('openvino', True)]
+
+
+def load_frames(video, count):
+    if video is None:
+        rng = np.random.default_rng(0)
+        return [cv2.GaussianBlur(rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8), (15, 15), 0) for _ in range(count)]
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def plate_crops(count):
+    crops = []
+    for i in range(count):
+        crop = np.full((40, 150, 3), 230, dtype=np.uint8)
+        cv2.putText(crop, f"ABC {1000 + i}", (8, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (20, 20, 20), 2)
+        crops.append(crop)
+    return crops
+
+
+def time_ms(fn, runs, warmup=3):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start_time) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coco-model", default="./models/yolov8s.pt")
+    parser.add_argument("--plate-model", default="./models/best.pt")
+    parser.add_argument("--video", help="video to take frames from, synthetic frames otherwise")
+    parser.add_argument("--frames", type=int, default=50, help="timed runs per model")
+    parser.add_argument("--rois", type=int, default=4, help="vehicle ROIs per plate detector batch")
+    parser.add_argument("--crops", type=int, default=4, help="plate crops per OCR batch")
+    parser.add_argument("--calibration-dir", default=backends.CALIBRATION_DIR)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    rois = [cv2.resize(frames[0], (ROI_SIZE, ROI_SIZE)) for _ in range(args.rois)]
+    crops = plate_crops(args.crops)
+    available = backends.available_backends()
+
+    print(f"| backend | int8 | vehicles p50/p95 (ms/frame) | plates p50/p95 (ms/{args.rois} ROIs) | OCR p50/p95 (ms/crop) |")
+    print("|---|---|---|---|---|")
+    for backend, int8 in CONFIGS:
+        if backend not in available:
+            continue
+        try:
+            coco_model = backends.load_yolo(args.coco_model, backend, int8=int8, calibration_dir=args.calibration_dir)
+            plate_model = backends.load_yolo(args.plate_model, backend, int8=int8, calibration_dir=args.calibration_dir)
+            reader = backends.load_reader(backend, int8=int8)
+        except (FileNotFoundError, ImportError) as error:
+            print(f"| {backend} | {int8} | skipped: {error} | | |")
+            continue
+
+        frame_iter = iter(frames * 2)
+        vehicles = time_ms(lambda: coco_model.predict(next(frame_iter), device='cpu', verbose=False), len(frames))
+        plates = time_ms(lambda: plate_model.predict(rois, imgsz=ROI_SIZE, device='cpu', verbose=False), len(frames))
+        ocr = time_ms(lambda: read_license_plates(reader, crops), len(frames))
+        print(f"| {backend} | {int8} | {vehicles[0]:.1f} / {vehicles[1]:.1f} | {plates[0]:.1f} / {plates[1]:.1f} "
+              f"| {ocr[0] / len(crops):.1f} / {ocr[1] / len(crops):.1f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Full-frame allocations and time per frame of the capture -> working frame path, before and after the buffer pools.
+
+The old path decoded every frame into a new array, resized it into another,
+swapped its channels into a third and, for display, swapped them back into a
+fourth. The new path decodes into and resizes into pooled buffers and keeps
+BGR throughout. A clip of synthetic frames is written at every resolution and
+decoded for real, with a few frames kept in flight like the pipeline's queues
+do.
+
+Usage:
+    python -m benchmarks.frame_path --frames 200
+"""
+import argparse
+import collections
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from buffers import FramePool
+
+RESOLUTIONS = {'1080p': (1920, 1080), '4K': (3840, 2160)}
+WORKING_SIZE = (1280, 720)
+
+
+def write_clip(path, size, count=30):
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, size)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8), (21, 21), 0)
+    for i in range(count):
+        writer.write(np.roll(base, i * 8, axis=1))
+    writer.release()
+
+
+def old_path(cap, in_flight, timings):
+    ret, frame = cap.read()
+    if not ret:
+        return None
+    timings.append(time.perf_counter())
+    resized = cv2.resize(frame, WORKING_SIZE)
+    working = cv2.cvtColor(resized, cv2.COLOR_RGB2BGR)
+    display = cv2.cvtColor(working, cv2.COLOR_BGR2RGB)
+    in_flight.append((frame, working, display))
+    return frame, resized, working, display
+
+
+def new_path(cap, in_flight, timings, capture_pool, working_pool):
+    buffer = capture_pool.acquire()
+    ret, frame = cap.read(buffer) if buffer is not None else cap.read()
+    if not ret or frame is not buffer:
+        capture_pool.release(buffer)
+    if not ret:
+        return None
+    timings.append(time.perf_counter())
+    if frame is not buffer:
+        capture_pool.adopt(frame)
+    working = cv2.resize(frame, WORKING_SIZE, dst=working_pool.acquire())
+    if len(in_flight) == in_flight.maxlen:
+        # The oldest frame leaves the pipeline, its buffers are free again
+        old_frame, old_working = in_flight[0]
+        capture_pool.release(old_frame)
+        working_pool.release(old_working)
+    in_flight.append((frame, working))
+    return frame, working
+
+
+def run(path, frames, fn, *pools):
+    cap = cv2.VideoCapture(path)
+    in_flight = collections.deque(maxlen=8)
+    seen = set()
+    allocations = 0
+    times, after_decode_times = [], []
+    for i in range(frames):
+        start_time = time.perf_counter()
+        timings = []
+        arrays = fn(cap, in_flight, timings, *pools)
+        if arrays is None:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            start_time = time.perf_counter()
+            arrays = fn(cap, in_flight, timings, *pools)
+        end_time = time.perf_counter()
+        times.append((end_time - start_time) * 1000)
+        after_decode_times.append((end_time - timings[-1]) * 1000)
+        # A result whose memory was not handed out before is a new allocation
+        for array in arrays:
+            pointer = array.ctypes.data
+            if pointer not in seen or not pools:
+                allocations += 1
+            seen.add(pointer)
+    cap.release()
+    return allocations / frames, float(np.median(times)), float(np.median(after_decode_times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200, help="frames per run")
+    args = parser.parse_args()
+
+    print("| input | path | frame allocations/frame | p50 ms/frame | p50 ms/frame after decode |")
+    print("|---|---|---|---|---|")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, size in RESOLUTIONS.items():
+            path = os.path.join(tmp, f"{name}.avi")
+            write_clip(path, size)
+            old = run(path, args.frames, old_path)
+            new = run(path, args.frames, new_path, FramePool(), FramePool((WORKING_SIZE[1], WORKING_SIZE[0], 3)))
+            print(f"| {name} | old | {old[0]:.2f} | {old[1]:.2f} | {old[2]:.2f} |")
+            print(f"| {name} | pooled | {new[0]:.2f} | {new[1]:.2f} | {new[2]:.2f} |")
+            print(f"| {name} | saved | {old[0] - new[0]:.2f} | {old[1] - new[1]:.2f} | {old[2] - new[2]:.2f} |")
+
+
+if __name__ == "__main__":
+    main()
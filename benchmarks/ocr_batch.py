@@ -0,0 +1,63 @@
+"""
+Per-frame OCR latency: one readtext call per plate crop vs one batched call per frame.
+
+Usage:
+    python -m benchmarks.ocr_batch --plates 1 4 8 10 --frames 20
+"""
+import argparse
+import random
+import string
+import time
+
+import cv2
+import easyocr
+import numpy as np
+
+from ocr import normalize_crop, read_license_plate, read_license_plates
+
+
+def synthetic_plate(rng):
+    """Render a random LLL-NNNN plate on a light background, sized like a crop from a 1280x720 frame."""
+    text = "".join(rng.choice(string.ascii_uppercase) for _ in range(3)) + "-" + "".join(rng.choice(string.digits) for _ in range(4))
+    width, height = rng.randint(90, 180), rng.randint(30, 60)
+    crop = np.full((height, width, 3), rng.randint(180, 240), dtype=np.uint8)
+    scale = height / 40
+    cv2.putText(crop, text, (4, int(height * 0.75)), cv2.FONT_HERSHEY_SIMPLEX, scale * 0.9 * width / 160, (20, 20, 20), max(1, int(scale * 2)))
+    return crop
+
+
+def time_frames(frames, read_frame):
+    latencies = []
+    for crops in frames:
+        start_time = time.perf_counter()
+        read_frame(crops)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--plates", type=int, nargs="+", default=[1, 4, 8, 10], help="plate crops per frame")
+    parser.add_argument("--frames", type=int, default=20, help="frames timed per configuration")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    reader = easyocr.Reader(['en'], gpu=False)
+
+    # Warm up both code paths so model initialisation is not timed
+    warmup = [synthetic_plate(rng) for _ in range(2)]
+    read_license_plates(reader, warmup)
+    read_license_plate(reader, normalize_crop(warmup[0]))
+
+    print(f"{'plates/frame':>12} {'per-crop ms':>12} {'batched ms':>12} {'speedup':>8}")
+    for plates in args.plates:
+        frames = [[synthetic_plate(rng) for _ in range(plates)] for _ in range(args.frames)]
+        per_crop = time_frames(frames, lambda crops: [read_license_plate(reader, normalize_crop(crop)) for crop in crops])
+        batched = time_frames(frames, lambda crops: read_license_plates(reader, crops))
+        per_crop_ms, batched_ms = np.median(per_crop), np.median(batched)
+        print(f"{plates:>12} {per_crop_ms:>12.1f} {batched_ms:>12.1f} {per_crop_ms / batched_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
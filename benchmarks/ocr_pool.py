@@ -0,0 +1,97 @@
+"""
+OCR throughput inline vs. in the OCR worker pool, and the cost of handing crops to workers.
+
+Inline OCR reads crops one frame batch at a time on one thread, the way the
+OCR stage does without workers. The pool runs ``--workers`` processes with
+their own readers. The hand-off rows compare copying a crop into a shared
+memory slot with pickling it, which is what a plain multiprocessing queue
+would do; they need no OCR models.
+
+Usage:
+    python -m benchmarks.ocr_pool --workers 4 --crops 400
+    python -m benchmarks.ocr_pool --handoff-only
+"""
+import argparse
+import pickle
+import time
+
+import cv2
+import numpy as np
+
+from ocr import OCR_HEIGHT, normalize_crop
+
+
+def plate_crops(count):
+    crops = []
+    for i in range(count):
+        crop = np.full((48, 180, 3), 230, dtype=np.uint8)
+        cv2.putText(crop, f"ABC {1000 + i % 9000}", (8, 34), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (20, 20, 20), 2)
+        crops.append(crop)
+    return crops
+
+
+def handoff(crops):
+    from ocr_pool import SLOT_WIDTH
+    # Both ways hand over the normalized crop, normalizing is not part of the hand-off
+    normalized = [normalize_crop(crop, OCR_HEIGHT) for crop in crops]
+    slots = np.zeros((4, OCR_HEIGHT, SLOT_WIDTH), dtype=np.uint8)
+    start_time = time.perf_counter()
+    for i, crop in enumerate(normalized):
+        slots[i % 4, :, :crop.shape[1]] = crop
+    shm_us = (time.perf_counter() - start_time) / len(crops) * 1e6
+
+    start_time = time.perf_counter()
+    for crop in normalized:
+        pickle.loads(pickle.dumps(crop, protocol=pickle.HIGHEST_PROTOCOL))
+    pickle_us = (time.perf_counter() - start_time) / len(crops) * 1e6
+    return shm_us, pickle_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="OCR worker processes")
+    parser.add_argument("--crops", type=int, default=400, help="crops read per run")
+    parser.add_argument("--batch", type=int, default=4, help="crops per frame")
+    parser.add_argument("--backend", default="torch", help="reader backend")
+    parser.add_argument("--handoff-only", action="store_true", help="only time the crop hand-off")
+    args = parser.parse_args()
+
+    crops = plate_crops(args.crops)
+    shm_us, pickle_us = handoff(crops)
+    print(f"hand-off per crop: shared memory {shm_us:.1f} us, pickle round trip {pickle_us:.1f} us")
+    if args.handoff_only:
+        return
+
+    from backends import load_reader
+    from ocr import read_license_plates
+    from ocr_pool import OCRPool
+
+    reader = load_reader(args.backend)
+    read_license_plates(reader, crops[:args.batch])
+    start_time = time.perf_counter()
+    for i in range(0, len(crops), args.batch):
+        read_license_plates(reader, crops[i:i + args.batch])
+    inline = len(crops) / (time.perf_counter() - start_time)
+
+    pool = OCRPool(args.workers, args.backend, slots=args.workers * 4, max_per_track=len(crops))
+    # Wait for every worker to load its reader and read a first crop
+    for i in range(args.workers):
+        pool.submit(i, 0, crops[i])
+    while pool.in_flight():
+        time.sleep(0.05)
+    pool.poll()
+
+    start_time = time.perf_counter()
+    submitted = finished = 0
+    while finished < len(crops):
+        while submitted < len(crops) and pool.submit(submitted, submitted, crops[submitted]):
+            submitted += 1
+        finished += len(pool.poll())
+        time.sleep(0.001)
+    pooled = len(crops) / (time.perf_counter() - start_time)
+    print(f"inline: {inline:.1f} crops/s, pool of {args.workers}: {pooled:.1f} crops/s ({pooled / inline:.2f}x), {pool.stats()}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
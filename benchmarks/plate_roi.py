@@ -0,0 +1,71 @@
+"""
+Per-frame plate detector latency: full-frame mode vs batched vehicle-ROI mode.
+
+Usage:
+    python -m benchmarks.plate_roi --source recording.mp4 --frames 300
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from association import tracked_boxes
+from roi import ROI_SIZE, detect_plates_in_rois
+
+
+def percentiles(latencies):
+    return np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", required=True, help="video file or camera index")
+    parser.add_argument("--frames", type=int, default=300, help="frames to time")
+    parser.add_argument("--coco-model", default="./models/yolov8s.pt")
+    parser.add_argument("--plate-model", default="./models/best.pt")
+    parser.add_argument("--roi-size", type=int, default=ROI_SIZE)
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    coco_model = YOLO(args.coco_model)
+    license_plate_detector = YOLO(args.plate_model)
+    cap = cv2.VideoCapture(int(args.source) if args.source.isdigit() else args.source)
+
+    full_frame_ms, roi_ms, roi_pixels, full_frame_pixels = [], [], [], []
+    while len(full_frame_ms) < args.frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        img = cv2.resize(frame, (1280, 720))
+
+        vehicle_data = tracked_boxes(coco_model.track(img, persist=True, verbose=False, device=args.device)[0].boxes)
+        vehicle_data = vehicle_data[np.isin(vehicle_data[:, 6].astype(int), [2, 3, 5, 6])]
+        if len(vehicle_data) == 0:
+            continue
+
+        start_time = time.perf_counter()
+        license_plate_detector.predict(img, verbose=False, device=args.device)
+        full_frame_ms.append((time.perf_counter() - start_time) * 1000)
+        full_frame_pixels.append(img.shape[0] * img.shape[1])
+
+        start_time = time.perf_counter()
+        _, pixels = detect_plates_in_rois(license_plate_detector, img, vehicle_data[:, :4], size=args.roi_size, device=args.device)
+        roi_ms.append((time.perf_counter() - start_time) * 1000)
+        roi_pixels.append(pixels)
+
+    cap.release()
+    if len(full_frame_ms) == 0:
+        print("No frames with vehicles in the source")
+        return
+
+    print(f"frames with vehicles: {len(full_frame_ms)}")
+    print(f"{'mode':>10} {'p50 ms':>8} {'p95 ms':>8} {'mean pixels':>12}")
+    for mode, latencies, pixels in (("full", full_frame_ms, full_frame_pixels), ("roi", roi_ms, roi_pixels)):
+        p50, p95 = percentiles(latencies)
+        print(f"{mode:>10} {p50:>8.1f} {p95:>8.1f} {np.mean(pixels):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Results persistence throughput: util.write_csv per read vs the buffered ResultsSink.
+
+Usage:
+    python -m benchmarks.results_sink --events 20000 --rate 1000 --seconds 10
+"""
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+
+import numpy as np
+
+import util
+from results_sink import CSVBackend, ResultsSink
+
+
+def make_event(rng, license_numbers):
+    text = "".join(rng.choice(string.ascii_uppercase) for _ in range(3)) + "-" + "".join(rng.choice(string.digits) for _ in range(4))
+    # Same nesting model_prediction builds its results with
+    return {
+        license_numbers: {
+            license_numbers: {
+                'Vehicle': {'vehicle_id': rng.randint(1, 500), 'vehicle_class': 'Car', 'vehicle_score': 0.9, 'vehicle_img': f'Car1_{text}.jpg'},
+                'license_plate': {'lp_id': rng.randint(1, 500), 'text': text, 'inference_time': 0.05, 'lp_img': f'{text}_1.jpg', 'text_score': rng.random()},
+            }
+        }
+    }
+
+
+def run_write_csv(events, output_path):
+    util.highest_lp_scores = util.HighestScores()
+    start_time = time.perf_counter()
+    for event in events:
+        util.write_csv(event, output_path)
+    return time.perf_counter() - start_time
+
+
+def run_sink(events, output_path):
+    sink = ResultsSink(CSVBackend(output_path))
+    start_time = time.perf_counter()
+    for event in events:
+        sink.write(event)
+    sink.close()
+    return time.perf_counter() - start_time
+
+
+def run_sustained(events, output_path, rate, seconds):
+    """Offer events at a fixed rate and measure how long producers spend in write()."""
+    sink = ResultsSink(CSVBackend(output_path))
+    interval = 1.0 / rate
+    latencies = []
+    start_time = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        due = start_time + i * interval
+        now = time.perf_counter()
+        if due > now:
+            time.sleep(due - now)
+        call_start = time.perf_counter()
+        sink.write(events[i % len(events)])
+        latencies.append((time.perf_counter() - call_start) * 1e6)
+    elapsed = time.perf_counter() - start_time
+    sink.close()
+    return elapsed, latencies, sink.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--rate", type=int, default=1000, help="events per second for the sustained run")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    events = [make_event(rng, 0) for _ in range(args.events)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_csv_time = run_write_csv(events, os.path.join(directory, "write_csv.csv"))
+        sink_time = run_sink(events, os.path.join(directory, "sink.csv"))
+        elapsed, latencies, stats = run_sustained(events, os.path.join(directory, "sustained.csv"), args.rate, args.seconds)
+
+    print(f"{'writer':>10} {'events/s':>12}")
+    print(f"{'write_csv':>10} {len(events) / write_csv_time:>12.0f}")
+    print(f"{'sink':>10} {len(events) / sink_time:>12.0f}")
+    print(f"sustained {args.rate} events/s for {args.seconds:.0f} s: achieved {len(latencies) / elapsed:.0f} events/s, "
+          f"write() p50 {np.percentile(latencies, 50):.1f} us, p99 {np.percentile(latencies, 99):.1f} us, "
+          f"{stats['rows_written']} rows in {stats['flushes']} flushes")
+
+
+if __name__ == "__main__":
+    main()
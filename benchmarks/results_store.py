@@ -0,0 +1,74 @@
+"""
+Plate lookup latency in the SQLite results store.
+
+Usage:
+    python -m benchmarks.results_store --rows 10000000 --queries 200
+"""
+import argparse
+import datetime
+import os
+import random
+import string
+import tempfile
+import time
+
+import numpy as np
+
+from results_store import COLUMNS, ResultsStore, TIMESTAMP_FORMAT, connect, plate_key
+
+
+def random_plate(rng):
+    return "".join(rng.choice(string.ascii_uppercase) for _ in range(3)) + "-" + "".join(rng.choice(string.digits) for _ in range(4))
+
+
+def populate(db_path, rows, days, cameras, rng, batch=100_000):
+    """Insert synthetic sightings spread evenly over the last ``days`` days."""
+    connection = connect(db_path)
+    now = datetime.datetime.now()
+    plates = [random_plate(rng) for _ in range(max(1, rows // 20))]
+    step = days * 86400 / rows
+    insert = f"INSERT INTO sightings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    for start in range(0, rows, batch):
+        values = []
+        for i in range(start, min(rows, start + batch)):
+            plate = rng.choice(plates)
+            timestamp = (now - datetime.timedelta(seconds=i * step)).strftime(TIMESTAMP_FORMAT)
+            values.append((timestamp, f"cam{i % cameras}", i % 1000, 'Car', 'car.jpg', i % 1000, 'lp.jpg', plate, plate_key(plate), 0.9, 0.05))
+        with connection:
+            connection.executemany(insert, values)
+    connection.close()
+    return plates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "results.db")
+        start_time = time.perf_counter()
+        plates = populate(db_path, args.rows, args.days, args.cameras, rng)
+        print(f"inserted {args.rows} rows in {time.perf_counter() - start_time:.1f} s")
+
+        store = ResultsStore(db_path)
+        since = datetime.datetime.now() - datetime.timedelta(hours=24)
+        latencies, hits = [], 0
+        for _ in range(args.queries):
+            plate = rng.choice(plates)
+            start_time = time.perf_counter()
+            hits += len(store.find_plate(plate, since=since))
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        store.close()
+
+    print(f"'plate, last 24h' over {args.rows} rows: p50 {np.percentile(latencies, 50):.2f} ms, "
+          f"p99 {np.percentile(latencies, 99):.2f} ms, {hits / args.queries:.1f} sightings per query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""
+End-to-end recognition benchmark, offline on CPU, with JSON results and baseline comparison.
+
+Replays a recorded video or synthetic frames with rendered plates through
+app.py's own stage functions, the way its detection stage calls them:
+motion gate and scheduler, ``detect_vehicles_and_plates`` or ``track_only``,
+``read_plates`` and ``save_reads``. Crop selection, consensus reading, the
+OCR cache and the ROI and motion toggles are measured as app.py is
+configured. Reports fps and p50/p95/p99 latency per stage (decode, the
+stage functions and the vehicle and plate detection inside them) and writes
+them as JSON.
+
+Without model weights synthetic runs use the generator's ground-truth boxes
+for the detectors ("oracle"); without EasyOCR an oracle reader returns a
+fixed plate for every crop, so the remaining stages are still timed. Like
+app.py the suite needs ultralytics for tracking.
+
+Usage:
+    python -m benchmarks.suite --frames 300 --output results/bench.json
+    python -m benchmarks.suite --video traffic.mp4 --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from roi import ROI_SIZE, vehicle_rois
+
+STAGES = ['decode', 'detect_stage', 'track_only_stage', 'vehicle_detection', 'plate_detection', 'ocr_stage', 'save_stage']
+
+# A stage is flagged when its p50 or p95 is this much slower than the baseline
+REGRESSION_TOLERANCE = 0.10
+
+
+class StageTimer:
+    """
+    Collects per-frame latencies of named stages.
+
+    Stands in for app.py's ``metrics`` while the benchmark runs, so the
+    stage timings app.py records itself are kept as raw samples.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.frame_latencies = []
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies.setdefault(name, []).append(time.perf_counter() - start_time)
+
+    def timer(self, name, **labels):
+        return self.stage(name)
+
+    def observe(self, name, seconds, **labels):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    def inc(self, name, value=1, **labels):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self, wall_time):
+        """
+        Summarize the measured latencies.
+
+        Args:
+            wall_time (float): Seconds the timed frames took in total.
+
+        Returns:
+            dict: 'fps', 'frames', the counters and per-stage 'count', 'mean_ms' and 'p50_ms'/'p95_ms'/'p99_ms'.
+        """
+        stages = {}
+        for name in STAGES + ['frame']:
+            latencies = self.frame_latencies if name == 'frame' else self.latencies.get(name)
+            if not latencies:
+                continue
+            latencies_ms = np.array(latencies) * 1000
+            stages[name] = {
+                'count': len(latencies_ms),
+                'mean_ms': float(latencies_ms.mean()),
+                'p50_ms': float(np.percentile(latencies_ms, 50)),
+                'p95_ms': float(np.percentile(latencies_ms, 95)),
+                'p99_ms': float(np.percentile(latencies_ms, 99)),
+            }
+        frames = len(self.frame_latencies)
+        return {'frames': frames, 'fps': frames / wall_time if wall_time else 0.0, 'stages': stages, 'counters': dict(self.counters)}
+
+
+def synthetic_frames(count, seed=0, size=(1280, 720), vehicles_per_frame=3):
+    """
+    Generate frames with vehicles carrying rendered plates driving across a road.
+
+    Args:
+        count (int): Number of frames.
+        seed (int): Random seed, the same seed gives the same frames.
+        size (tuple): Frame width and height.
+        vehicles_per_frame (int): Vehicles in view at a time.
+
+    Yields:
+        tuple: JPEG bytes of the frame, ground-truth vehicle boxes (Nx7: x1, y1, x2, y2,
+        track_id, score, class_id) and plate boxes (Nx6: x1, y1, x2, y2, score, class_id).
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = np.full((height, width, 3), 90, dtype=np.uint8)
+    background[:, :, 1] = 95
+    background = cv2.add(background, rng.integers(0, 12, background.shape, dtype=np.uint8))
+    lanes = np.linspace(height * 0.2, height * 0.65, vehicles_per_frame).astype(int)
+    span = width + 300
+
+    vehicles = []
+    for lane, y in enumerate(lanes):
+        text = "".join(rng.choice(list("ABCDEFGHJKLMNPRSTUVWXYZ"), 3)) + " " + "".join(rng.choice(list("0123456789"), 4))
+        color = tuple(int(c) for c in rng.integers(30, 220, 3))
+        vehicles.append({'track_id': lane + 1, 'y': int(y), 'offset': int(rng.integers(0, span)), 'text': text, 'color': color})
+
+    for i in range(count):
+        frame = background.copy()
+        vehicle_boxes, plate_boxes = [], []
+        for vehicle in vehicles:
+            x = (vehicle['offset'] + i * 12) % span - 300
+            x1, y1, x2, y2 = x, vehicle['y'], x + 280, vehicle['y'] + 170
+            cv2.rectangle(frame, (x1, y1), (x2, y2), vehicle['color'], -1)
+            px1, py1 = x1 + 85, y1 + 115
+            px2, py2 = px1 + 110, py1 + 32
+            cv2.rectangle(frame, (px1, py1), (px2, py2), (235, 235, 235), -1)
+            cv2.putText(frame, vehicle['text'], (px1 + 4, py1 + 23), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (15, 15, 15), 2)
+            if x1 >= 0 and x2 <= width:
+                vehicle_boxes.append([x1, y1, x2, y2, vehicle['track_id'], 0.9, 2])
+                plate_boxes.append([px1, py1, px2, py2, 0.9, 0])
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        yield (encoded.tobytes(), np.array(vehicle_boxes, dtype=np.float32).reshape(-1, 7),
+               np.array(plate_boxes, dtype=np.float32).reshape(-1, 6))
+
+
+class OracleBoxes:
+    """Just enough of an ultralytics ``Boxes`` for app.py: ``len`` and ``data.cpu().numpy()``."""
+
+    def __init__(self, data):
+        self.array = data
+
+    def __len__(self):
+        return len(self.array)
+
+    @property
+    def data(self):
+        return self
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class OracleResult:
+    def __init__(self, data):
+        self.boxes = OracleBoxes(data)
+
+
+class Oracle:
+    """
+    Ground-truth boxes of the current synthetic frame, served by ``OracleVehicleDetector`` and ``OraclePlateDetector``.
+    """
+
+    def __init__(self):
+        self.vehicle_boxes = np.empty((0, 7), dtype=np.float32)
+        self.plate_boxes = np.empty((0, 6), dtype=np.float32)
+        self.frame_shape = (0, 0)
+
+    def set_frame(self, vehicle_boxes, plate_boxes, frame_shape):
+        self.vehicle_boxes, self.plate_boxes, self.frame_shape = vehicle_boxes, plate_boxes, frame_shape
+
+
+class OracleVehicleDetector:
+    """Answers ``model.track`` with the frame's tracked vehicle boxes."""
+
+    def __init__(self, oracle):
+        self.oracle = oracle
+
+    def track(self, img, **kwargs):
+        return [OracleResult(self.oracle.vehicle_boxes)]
+
+
+class OraclePlateDetector:
+    """
+    Answers ``model.track`` (full-frame mode) with the frame's plates, tracked
+    under their vehicle's ID, and ``model.predict`` with the plates on the
+    frame or, in ROI mode, on every vehicle ROI canvas.
+    """
+
+    def __init__(self, oracle):
+        self.oracle = oracle
+
+    def track(self, img, **kwargs):
+        plates, vehicles = self.oracle.plate_boxes, self.oracle.vehicle_boxes
+        return [OracleResult(np.concatenate([plates[:, :4], vehicles[:, 4:5], plates[:, 4:6]], axis=1))]
+
+    def predict(self, source, imgsz=ROI_SIZE, **kwargs):
+        plates = self.oracle.plate_boxes
+        if not isinstance(source, list):
+            return [OracleResult(plates)]
+        # The canvases are the letterboxed vehicle ROIs, in the order and with the scale roi.prepare_rois gives them
+        results = []
+        for x1, y1, x2, y2 in vehicle_rois(self.oracle.vehicle_boxes[:, :4], self.oracle.frame_shape).tolist():
+            scale = min(imgsz / (x2 - x1), imgsz / (y2 - y1))
+            pad_x = (imgsz - max(1, int(round((x2 - x1) * scale)))) // 2
+            pad_y = (imgsz - max(1, int(round((y2 - y1) * scale)))) // 2
+            inside = (plates[:, 0] >= x1) & (plates[:, 1] >= y1) & (plates[:, 2] <= x2) & (plates[:, 3] <= y2)
+            canvas_boxes = plates[inside].copy()
+            canvas_boxes[:, [0, 2]] = (canvas_boxes[:, [0, 2]] - x1) * scale + pad_x
+            canvas_boxes[:, [1, 3]] = (canvas_boxes[:, [1, 3]] - y1) * scale + pad_y
+            results.append(OracleResult(canvas_boxes))
+        return results
+
+
+class OracleReader:
+    """Reads a fixed plate from every crop, for machines without EasyOCR; the rendered text is unknown to it."""
+
+    def readtext_batched(self, batch, **kwargs):
+        return [self.readtext(crop) for crop in batch]
+
+    def readtext(self, crop, **kwargs):
+        height, width = crop.shape[:2]
+        return [([[0, 0], [width, 0], [width, height], [0, height]], "ABC1234", 0.9)]
+
+
+def setup_app(args, output_dir):
+    """
+    Import app.py and point its models, metrics and output at the benchmark's.
+
+    Returns:
+        tuple: The app module, the oracle detectors (None with real detectors) and whether OCR is real.
+    """
+    import app
+    from registry import ModelRegistry
+    from results_sink import CSVBackend
+
+    have_weights = os.path.exists(args.coco_model) and os.path.exists(args.plate_model)
+    oracle = None if have_weights and not args.oracle else Oracle()
+    models = ModelRegistry(args.inference_backend)
+    if oracle is None:
+        models.register_yolo('coco_model', args.coco_model)
+        models.register_yolo('license_plate_detector', args.plate_model, warmup_sizes=((ROI_SIZE, 4), (640, 1)))
+    else:
+        models.register('coco_model', lambda: OracleVehicleDetector(oracle))
+        models.register('license_plate_detector', lambda: OraclePlateDetector(oracle))
+    real_ocr = importlib.util.find_spec('easyocr') is not None
+    if real_ocr:
+        models.register_reader('reader')
+    else:
+        models.register('reader', OracleReader)
+    models.preload()
+    models.wait()
+
+    # Crops and rows go to the output directory
+    app.setup(models, CSVBackend(os.path.join(output_dir, 'results.csv')))
+    app.lp_folder_path = os.path.join(output_dir, 'plates')
+    app.vehicle_folder_path = os.path.join(output_dir, 'vehicles')
+    os.makedirs(app.lp_folder_path)
+    os.makedirs(app.vehicle_folder_path)
+    return app, oracle, real_ocr
+
+
+def process_frame(app, img, timer):
+    """Run one frame through app.py's stage functions, as its detection, OCR and save stages do, in this thread."""
+    width, height = app.WORKING_SIZE
+    processed_frame = cv2.resize(img, (width, height)) if img.shape[:2] != (height, width) else img
+    if app.motion_gate is not None and not app.motion_gate.check(processed_frame):
+        timer.inc('frames_skipped_motion')
+        frame = app.track_only(processed_frame)
+    else:
+        plan = app.scheduler.plan()
+        if plan['detect']:
+            frame = app.detect_vehicles_and_plates(
+                processed_frame, imgsz=plan['imgsz'], run_ocr=plan['ocr'],
+                source=img if app.CROP_FROM_SOURCE and processed_frame is not img else None,
+            )
+        else:
+            timer.inc('frames_skipped_scheduler')
+            frame = app.track_only(processed_frame)
+    return app.save_reads(app.read_plates(frame))
+
+
+def run(args):
+    if args.video is not None:
+        cap = cv2.VideoCapture(args.video)
+        frames = (None for _ in range(args.warmup + args.frames))
+    else:
+        frames = synthetic_frames(args.warmup + args.frames, seed=args.seed)
+
+    output_dir = tempfile.mkdtemp(prefix='lpr-bench-')
+    try:
+        app, oracle, real_ocr = setup_app(args, output_dir)
+        if args.video is not None and oracle is not None:
+            raise SystemExit("Replaying a video needs the detector weights")
+        timer = app.metrics = StageTimer()
+        wall_time = 0.0
+
+        # Ultralytics logs every frame app.py's detectors run on, which would bury the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for i, item in enumerate(frames):
+                if i == args.warmup:
+                    timer = app.metrics = StageTimer()
+                frame_start = time.perf_counter()
+
+                with timer.stage('decode'):
+                    if args.video is not None:
+                        ret, img = cap.read()
+                        if not ret:
+                            break
+                    else:
+                        encoded, oracle_vehicles, oracle_plates = item
+                        img = cv2.imdecode(np.frombuffer(encoded, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if oracle is not None:
+                    oracle.set_frame(oracle_vehicles, oracle_plates, img.shape)
+
+                process_frame(app, img, timer)
+
+                frame_time = time.perf_counter() - frame_start
+                timer.frame_latencies.append(frame_time)
+                if i >= args.warmup:
+                    wall_time += frame_time
+
+        app.image_sink.close()
+        app.results_sink.close()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    report = timer.report(wall_time)
+    report['meta'] = {
+        'source': args.video or f"synthetic(seed={args.seed})",
+        'detectors': 'models' if oracle is None else 'oracle',
+        'ocr': real_ocr,
+        'inference_backend': args.inference_backend,
+        'toggles': {name: getattr(app, name) for name in ('PLATE_ROI_MODE', 'MOTION_GATE', 'CROP_SELECTION', 'CONSENSUS_READING', 'CROP_FROM_SOURCE')},
+        'git_commit': git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compare a run against a baseline run.
+
+    Args:
+        report (dict): This run.
+        baseline (dict): Stored baseline run.
+        tolerance (float): Allowed slowdown as a fraction of the baseline.
+
+    Returns:
+        list: (stage, metric, baseline ms, current ms) of every regression.
+    """
+    regressions = []
+    for name, stats in report['stages'].items():
+        baseline_stats = baseline['stages'].get(name)
+        if baseline_stats is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if stats[metric] > baseline_stats[metric] * (1 + tolerance):
+                regressions.append((name, metric, baseline_stats[metric], stats[metric]))
+    return regressions
+
+
+def print_report(report, baseline=None):
+    print(f"{report['meta']['source']}, detectors: {report['meta']['detectors']}, OCR: {report['meta']['ocr']}")
+    print(f"frames: {report['frames']}  fps: {report['fps']:.1f}")
+    print(f"{'stage':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'baseline p50':>14}")
+    for name, stats in report['stages'].items():
+        baseline_p50 = baseline['stages'].get(name, {}).get('p50_ms') if baseline else None
+        baseline_text = f"{baseline_p50:.2f}" if baseline_p50 is not None else "-"
+        print(f"{name:<18}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{baseline_text:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="recorded video to replay, synthetic frames otherwise")
+    parser.add_argument("--frames", type=int, default=300, help="timed frames")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed frames before timing starts")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic frames")
+    parser.add_argument("--coco-model", default="./models/yolov8s.pt")
+    parser.add_argument("--plate-model", default="./models/best.pt")
+    parser.add_argument("--inference-backend", default="torch", help="backend from backends.BACKENDS, CPU torch by default")
+    parser.add_argument("--oracle", action="store_true", help="use ground-truth boxes even when the detectors are available")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON and exit 1 on regressions")
+    parser.add_argument("--save-baseline", help="write the results JSON as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="allowed slowdown before a stage is flagged")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_report(report, baseline)
+
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+
+    if baseline is not None:
+        if any(baseline['meta'].get(key) != report['meta'][key] for key in ('detectors', 'ocr', 'toggles')):
+            print("Warning: baseline was measured with different detectors/OCR or app.py toggles, stages are not comparable")
+        regressions = compare(report, baseline, args.tolerance)
+        for name, metric, baseline_ms, current_ms in regressions:
+            print(f"REGRESSION {name} {metric}: {baseline_ms:.2f} ms -> {current_ms:.2f} ms (+{current_ms / baseline_ms - 1:.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
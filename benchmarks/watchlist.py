@@ -0,0 +1,141 @@
+"""
+Watchlist index build time, size and lookup latency on a synthetic list of millions of plates.
+
+A list of random LLL-NNNN / LLL-NNN / NNN-LLL plates is written to a temporary
+file and indexed. Reads are then looked up, for every ``--max-costs``
+limit, in four kinds: listed plates as is, listed plates with one or two
+confusable characters swapped (O/0, B/8, ...), listed plates with one real
+character error, and unlisted plates. A reload runs while a thread keeps
+looking reads up, to show lookups go on during it.
+
+Usage:
+    python -m benchmarks.watchlist --entries 5000000
+"""
+import argparse
+import os
+import random
+import string
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from plate_format import DIGIT_TO_LETTER, LETTER_TO_DIGIT
+from watchlist import Watchlist
+
+CONFUSIONS = {**{v: k for k, v in LETTER_TO_DIGIT.items()}, **{v: k for k, v in DIGIT_TO_LETTER.items()}}
+
+
+def write_list(path, entries, seed):
+    """Write random plates, vectorized so millions take seconds."""
+    rng = np.random.default_rng(seed)
+    letters = np.frombuffer(string.ascii_uppercase.encode(), dtype=np.uint8)
+    digits = np.frombuffer(string.digits.encode(), dtype=np.uint8)
+    chunk = 1_000_000
+    with open(path, 'wb') as list_file:
+        for start in range(0, entries, chunk):
+            count = min(chunk, entries - start)
+            plates = np.full((count, 9), ord('-'), dtype=np.uint8)
+            plates[:, :3] = letters[rng.integers(0, 26, (count, 3))]
+            plates[:, 4:8] = digits[rng.integers(0, 10, (count, 4))]
+            plates[:, 8] = ord('\n')
+            # A quarter is LLL-NNN, a quarter NNN-LLL
+            kind = rng.integers(0, 4, count)
+            plates[kind == 1, 7] = ord('\n')
+            motorcycles = kind == 2
+            plates[motorcycles, :3] = digits[rng.integers(0, 10, (int(motorcycles.sum()), 3))]
+            plates[motorcycles, 4:7] = letters[rng.integers(0, 26, (int(motorcycles.sum()), 3))]
+            plates[motorcycles, 7] = ord('\n')
+            lines = plates.tobytes().replace(b'\n\n', b'\n')
+            list_file.write(lines)
+
+
+def listed_sample(path, count, seed):
+    rng = random.Random(seed)
+    with open(path) as list_file:
+        plates = [line.strip() for line, _ in zip(list_file, range(count * 20))]
+    return rng.sample(plates, count)
+
+
+def confused(plate, rng, swaps):
+    chars = list(plate)
+    positions = [i for i, char in enumerate(chars) if char in CONFUSIONS]
+    for i in rng.sample(positions, min(swaps, len(positions))):
+        chars[i] = CONFUSIONS[chars[i]]
+    return ''.join(chars)
+
+
+def misread(plate, rng):
+    chars = list(plate)
+    i = rng.choice([i for i, char in enumerate(chars) if char != '-'])
+    chars[i] = rng.choice(string.ascii_uppercase if chars[i].isalpha() else string.digits)
+    return ''.join(chars)
+
+
+def latencies(watchlist, reads):
+    times, found = [], 0
+    for read in reads:
+        start_time = time.perf_counter()
+        matches = watchlist.match(read)
+        times.append((time.perf_counter() - start_time) * 1e6)
+        found += bool(matches)
+    return np.percentile(times, 50), np.percentile(times, 99), found / len(reads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=5_000_000, help="plates on the list")
+    parser.add_argument("--queries", type=int, default=5000, help="reads per kind")
+    parser.add_argument("--max-costs", type=float, nargs='+', default=[0.75, 1.0], help="match cost limits to compare")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stolen.txt')
+        write_list(path, args.entries, args.seed)
+        watchlist = Watchlist({'stolen': path})
+        stats = watchlist.stats()
+        print(f"{stats['entries']:,} entries, built in {stats['build_seconds']:.1f} s, index {stats['index_mb']:.0f} MB\n")
+
+        listed = listed_sample(path, args.queries, args.seed)
+        unlisted = [f"{''.join(rng.choice('QWXY') for _ in range(3))}-{rng.randrange(10000):04d}" for _ in range(args.queries)]
+        kinds = {
+            'listed, exact': listed,
+            'listed, 1-2 confusions': [confused(plate, rng, rng.choice((1, 2))) for plate in listed],
+            'listed, 1 misread character': [misread(plate, rng) for plate in listed],
+            'not listed': unlisted,
+        }
+        print("| max cost | reads | p50 µs | p99 µs | matched |")
+        print("|---|---|---|---|---|")
+        for max_cost in args.max_costs:
+            watchlist.max_cost = max_cost
+            for name, reads in kinds.items():
+                p50, p99, matched = latencies(watchlist, reads)
+                print(f"| {max_cost} | {name} | {p50:.1f} | {p99:.1f} | {matched:.1%} |")
+        watchlist.max_cost = args.max_costs[0]
+
+        # Lookups while the index is rebuilt and swapped
+        stop = threading.Event()
+        during = []
+
+        def keep_looking_up():
+            while not stop.is_set():
+                start_time = time.perf_counter()
+                watchlist.match(rng.choice(listed))
+                during.append((time.perf_counter() - start_time) * 1e6)
+
+        looker = threading.Thread(target=keep_looking_up)
+        looker.start()
+        start_time = time.perf_counter()
+        watchlist.reload()
+        reload_seconds = time.perf_counter() - start_time
+        stop.set()
+        looker.join()
+        print(f"\nReload took {reload_seconds:.1f} s; {len(during):,} lookups ran meanwhile, "
+              f"p50 {np.percentile(during, 50):.1f} µs, max {max(during) / 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
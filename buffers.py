@@ -0,0 +1,153 @@
+import threading
+
+import numpy as np
+
+# Most buffers a pool keeps, frames beyond this are allocated per frame and not reused
+POOL_SIZE = 16
+
+
+class FramePool:
+    """
+    Reusable frame buffers, so the frame path does not allocate a new full frame every frame.
+
+    Buffers are reference counted explicitly. ``acquire`` and ``adopt`` hand
+    out a buffer with one reference, every additional holder of it (a preview
+    or recorder the frame is published to) takes one with ``retain``, and every
+    holder calls ``release`` once it is done, or when a drop-oldest queue drops
+    the frame. The buffer is reused once the last reference is released, so no
+    holder may keep a view of it after releasing: crops that outlive the frame
+    are copied. Arrays the pool does not keep can be released too, that does
+    nothing.
+
+    The pool grows on demand up to ``size`` buffers; in steady state, with no
+    more frames in flight than that, no frames are allocated at all. When every
+    buffer is taken, a fresh array is returned and counted as a miss.
+
+    Args:
+        shape (tuple): Frame shape, None to take it from the first frame given to ``adopt``.
+        dtype (numpy.dtype): Frame dtype.
+        size (int): Most buffers kept.
+    """
+
+    def __init__(self, shape=None, dtype=np.uint8, size=POOL_SIZE):
+        self.shape = shape
+        self.dtype = dtype
+        self.size = size
+        self.lock = threading.Lock()
+        self.buffers = []
+        # Reference counts of the buffers in use, by id; buffers not in it are free
+        self.references = {}
+        self.acquired = 0
+        self.allocations = 0
+        self.misses = 0
+
+    def acquire(self):
+        """
+        Get a free buffer, holding one reference to it.
+
+        Returns:
+            numpy.ndarray: Uninitialized buffer of the pool's shape, None while the shape is unknown.
+        """
+        if self.shape is None:
+            return None
+        with self.lock:
+            self.acquired += 1
+            for buffer in self.buffers:
+                if id(buffer) not in self.references:
+                    self.references[id(buffer)] = 1
+                    return buffer
+            buffer = np.empty(self.shape, self.dtype)
+            self.allocations += 1
+            if len(self.buffers) < self.size:
+                self.buffers.append(buffer)
+                self.references[id(buffer)] = 1
+            else:
+                self.misses += 1
+            return buffer
+
+    def adopt(self, frame):
+        """
+        Take a frame something else allocated into the pool, setting the pool's shape if it has none.
+
+        The frame is in use, holding one reference, until it is released.
+
+        Args:
+            frame (numpy.ndarray): Frame to reuse once it is free.
+
+        Returns:
+            numpy.ndarray: The frame.
+        """
+        with self.lock:
+            if self.shape is None:
+                self.shape, self.dtype = frame.shape, frame.dtype
+            self.allocations += 1
+            if frame.shape == self.shape and frame.dtype == self.dtype and len(self.buffers) < self.size:
+                self.buffers.append(frame)
+                self.references[id(frame)] = 1
+            else:
+                self.misses += 1
+        return frame
+
+    def retain(self, buffer, count=1):
+        """
+        Take more references to a buffer in use, one for every additional holder.
+
+        Args:
+            buffer (numpy.ndarray): Buffer from ``acquire`` or ``adopt``.
+            count (int): References taken.
+        """
+        with self.lock:
+            if id(buffer) in self.references:
+                self.references[id(buffer)] += count
+
+    def release(self, buffer):
+        """
+        Drop one reference to a buffer, it is free again once none are left.
+
+        Args:
+            buffer (numpy.ndarray): Buffer from ``acquire`` or ``adopt``.
+        """
+        with self.lock:
+            references = self.references.get(id(buffer))
+            if references is None:
+                return
+            if references > 1:
+                self.references[id(buffer)] = references - 1
+            else:
+                del self.references[id(buffer)]
+
+    def stats(self):
+        """
+        Get the pool counters.
+
+        Returns:
+            dict: Buffers handed out, frames allocated in total, allocations beyond the pool, buffers kept and buffers in use.
+        """
+        with self.lock:
+            return {
+                'acquired': self.acquired, 'allocations': self.allocations, 'misses': self.misses,
+                'buffers': len(self.buffers), 'in_use': len(self.references),
+            }
+
+
+def retain_frame(frame, count=1):
+    """
+    Take references to the pooled buffers of a frame state for its additional holders.
+
+    Args:
+        frame (dict): Frame state, its pooled buffers are listed in 'buffers' as (pool, buffer).
+        count (int): References taken per buffer.
+    """
+    for pool, buffer in frame.get('buffers', ()):
+        pool.retain(buffer, count)
+
+
+def release_frame(frame):
+    """
+    Release one reference to every pooled buffer of a frame state, once its holder is done with it.
+
+    Args:
+        frame (dict): Frame state, its pooled buffers are listed in 'buffers' as (pool, buffer).
+    """
+    for pool, buffer in frame.get('buffers', ()):
+        pool.release(buffer)
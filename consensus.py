@@ -0,0 +1,273 @@
+import collections
+
+from plate_format import clean_plate, plate_grammar
+
+# Reads of a track needed before its plate can be final
+MIN_READS = 2
+
+# Weight (summed OCR confidence) by which every character's winner has to beat its runner-up for the plate to be final
+FINALIZE_MARGIN = 1.5
+
+# Reads after which a track's plate is made final even without a clear winner, bounding OCR per track
+MAX_READS = 12
+
+# Reads below this OCR confidence do not vote
+MIN_READ_SCORE = 0.3
+
+# Ended track IDs remembered, so a read that arrives after its track ended does not start a new record
+ENDED_TRACKS = 1000
+
+
+def align(reference, text):
+    """
+    Align a read to a reference read by edit distance.
+
+    Args:
+        reference (str): Reference text.
+        text (str): Read to align.
+
+    Returns:
+        list: (reference position, character) of every character of text that matches or
+        substitutes a reference character; inserted characters are left out.
+    """
+    rows, cols = len(reference) + 1, len(text) + 1
+    distance = [[0] * cols for _ in range(rows)]
+    for i in range(rows):
+        distance[i][0] = i
+    for j in range(cols):
+        distance[0][j] = j
+    for i in range(1, rows):
+        for j in range(1, cols):
+            distance[i][j] = min(
+                distance[i - 1][j - 1] + (reference[i - 1] != text[j - 1]),
+                distance[i - 1][j] + 1,
+                distance[i][j - 1] + 1,
+            )
+
+    pairs = []
+    i, j = len(reference), len(text)
+    while i > 0 and j > 0:
+        if distance[i][j] == distance[i - 1][j - 1] + (reference[i - 1] != text[j - 1]):
+            pairs.append((i - 1, text[j - 1]))
+            i, j = i - 1, j - 1
+        elif distance[i][j] == distance[i - 1][j] + 1:
+            i -= 1
+        else:
+            j -= 1
+    pairs.reverse()
+    return pairs
+
+
+def vote(reads):
+    """
+    Combine reads of one plate into a consensus by confidence-weighted voting per character.
+
+    The plate length is voted on first. The best read of the winning length is
+    the reference every read is aligned to, so a read that dropped or added a
+    character still votes on the other characters.
+
+    Args:
+        reads (list): (text, score) of the reads, texts normalized.
+
+    Returns:
+        dict: Consensus 'text', 'score' (the best read's confidence scaled by the mean
+        share of the vote each character won, 0-1) and 'margin', the smallest lead of a
+        winner over its runner-up, length included.
+    """
+    lengths = collections.Counter()
+    for text, score in reads:
+        lengths[len(text)] += score
+    (length, length_weight), *others = lengths.most_common(2)
+    margin = length_weight - (others[0][1] if others else 0.0)
+
+    reference, reference_score = max((read for read in reads if len(read[0]) == length), key=lambda read: read[1])
+    positions = [collections.Counter() for _ in reference]
+    for text, score in reads:
+        for position, char in align(reference, text):
+            positions[position][char] += score
+
+    chars, shares = [], []
+    for votes in positions:
+        (char, weight), *others = votes.most_common(2)
+        chars.append(char)
+        shares.append(weight / sum(votes.values()))
+        margin = min(margin, weight - (others[0][1] if others else 0.0))
+    return {'text': ''.join(chars), 'score': reference_score * sum(shares) / len(shares), 'margin': margin}
+
+
+class ConsensusReader:
+    """
+    One plate per track from many OCR reads, with a stopping rule.
+
+    Reads of a track are corrected for confusable characters against the
+    plate formats of its vehicle class first, then combined by ``vote``, so
+    misreads of single characters ("ABC1234", "A8C1234") are outvoted instead
+    of becoming plates of their own. Once every character's winner leads by ``margin`` (and at
+    least ``min_reads`` reads voted, or ``max_reads`` were reached) the plate
+    is final: ``lookup`` returns it and the track is not OCR'd again.
+
+    Every track yields exactly one record: from ``take_final`` when it becomes
+    final, or from ``end_tracks`` when it ends before that. Its state is freed
+    when the tracker drops it.
+
+    Args:
+        min_reads (int): Reads needed before a plate can be final.
+        margin (float): Lead, in summed OCR confidence, every character's winner needs.
+        max_reads (int): Reads after which a plate is made final regardless.
+        min_score (float): Reads below this confidence are ignored.
+    """
+
+    def __init__(self, min_reads=MIN_READS, margin=FINALIZE_MARGIN, max_reads=MAX_READS, min_score=MIN_READ_SCORE):
+        self.min_reads = min_reads
+        self.margin = margin
+        self.max_reads = max_reads
+        self.min_score = min_score
+        self.tracks = {}
+        self.ended = collections.OrderedDict()
+        self.finished = []
+        self.reads = 0
+        self.ignored = 0
+        self.finalized = 0
+        self.forced = 0
+        self.expired = 0
+        self.ocr_skipped = 0
+
+    def lookup(self, lp_track_id):
+        """
+        Get the final plate of a track.
+
+        Args:
+            lp_track_id (int): License plate track ID.
+
+        Returns:
+            tuple: (text, score) if the track's plate is final and it needs no more OCR, else None.
+        """
+        track = self.tracks.get(int(lp_track_id))
+        if track is None or not track['final']:
+            return None
+        self.ocr_skipped += 1
+        return track['text'], track['score']
+
+    def add(self, lp_track_id, text, score, context=None, vehicle_class=None):
+        """
+        Vote with a fresh OCR read of a track.
+
+        Args:
+            lp_track_id (int): License plate track ID.
+            text (str): Recognized text, None if nothing was read.
+            score (float): Confidence of the read.
+            context (object): Kept with the track's best read and returned in its record.
+            vehicle_class (str): Class of the vehicle, whose plate formats correct the read; None tries every format.
+
+        Reads of tracks that already ended are ignored.
+        """
+        if text:
+            # O/0, B/8, ... corrected where the format expects the other, so confusions add to a position's vote
+            text = clean_plate(plate_grammar.normalize(text, vehicle_class)[0])
+        if not text or score is None or score < self.min_score:
+            self.ignored += 1
+            return
+        lp_track_id = int(lp_track_id)
+        if lp_track_id in self.ended:
+            self.ignored += 1
+            return
+        track = self.tracks.get(lp_track_id)
+        if track is None:
+            track = self.tracks[lp_track_id] = {
+                'reads': [], 'text': None, 'score': 0.0, 'margin': 0.0, 'final': False, 'best_score': -1.0, 'context': None,
+            }
+        if track['final']:
+            return
+        self.reads += 1
+        track['reads'].append((text, float(score)))
+        if score > track['best_score']:
+            track['best_score'], track['context'] = score, context
+
+        track.update(vote(track['reads']))
+        if len(track['reads']) >= self.min_reads and track['margin'] >= self.margin:
+            self._finalize(lp_track_id, track)
+        elif len(track['reads']) >= self.max_reads:
+            self.forced += 1
+            self._finalize(lp_track_id, track)
+
+    def _finalize(self, lp_track_id, track):
+        track['final'] = True
+        self.finalized += 1
+        self.finished.append(self._record(lp_track_id, track))
+        # Only the consensus is needed from here on
+        track['reads'] = []
+
+    def _record(self, lp_track_id, track):
+        return {
+            'lp_track_id': lp_track_id,
+            'text': track['text'],
+            'score': track['score'],
+            'margin': track['margin'],
+            'reads': len(track['reads']),
+            'final': track['final'],
+            'context': track['context'],
+        }
+
+    def current(self, lp_track_id):
+        """
+        Get a track's consensus so far.
+
+        Returns:
+            tuple: (text, score), None while the track has no read.
+        """
+        track = self.tracks.get(int(lp_track_id))
+        if track is None or track['text'] is None:
+            return None
+        return track['text'], track['score']
+
+    def take_final(self):
+        """
+        Get the records of the tracks that became final since the last call.
+
+        Returns:
+            list: Dicts with 'lp_track_id', 'text', 'score', 'margin', 'reads', 'final' and 'context'.
+        """
+        finished, self.finished = self.finished, []
+        return finished
+
+    def end_tracks(self, active_track_ids):
+        """
+        Free the state of tracks that ended.
+
+        Args:
+            active_track_ids (set): Track IDs still kept by the tracker, None to end nothing.
+
+        Returns:
+            list: Records of the ended tracks that were read but never became final, as ``take_final``.
+        """
+        if active_track_ids is None:
+            return []
+        records = []
+        for lp_track_id in [lp_track_id for lp_track_id in self.tracks if lp_track_id not in active_track_ids]:
+            track = self.tracks.pop(lp_track_id)
+            self.ended[lp_track_id] = None
+            if len(self.ended) > ENDED_TRACKS:
+                self.ended.popitem(last=False)
+            if not track['final']:
+                self.expired += 1
+                records.append(self._record(lp_track_id, track))
+        return records
+
+    def stats(self):
+        """
+        Get the reader counters.
+
+        Returns:
+            dict: Reads voted and ignored, plates made final (and how many only by
+            reaching max_reads), tracks that ended unfinished, OCR calls skipped for
+            final plates, and tracks followed.
+        """
+        return {
+            'reads': self.reads,
+            'ignored': self.ignored,
+            'finalized': self.finalized,
+            'forced': self.forced,
+            'expired': self.expired,
+            'ocr_skipped': self.ocr_skipped,
+            'tracks': len(self.tracks),
+        }
@@ -13,5 +13,3 @@ if torch.cuda.is_available():
 else:
     print("CUDA is not available on this system.")
     
-cuda.py
-Ipinapakita ang cuda.py.
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+# JPEG quality used for saved crops, 0-100
+JPEG_QUALITY = 90
+
+# How much a read's score has to improve over the saved one before its crops are written again
+IMPROVE_MARGIN = 0.05
+
+# Start of this run, in the crop file names so track IDs starting again at 1 do not overwrite earlier runs' crops
+RUN_STAMP = time.strftime('%Y%m%d-%H%M%S')
+
+
+def track_image_names(track_id, prefix=''):
+    """
+    File names of a vehicle track's saved plate and vehicle crops.
+
+    The names only depend on the track, so every result row written for it
+    names the files that end up holding its best crops.
+
+    Args:
+        track_id (int): Vehicle track ID.
+        prefix (str): Prepended to both names, e.g. the camera name.
+
+    Returns:
+        tuple: (plate crop name, vehicle crop name).
+    """
+    track_id = int(track_id)
+    return f'{prefix}plate_{track_id}_{RUN_STAMP}.jpg', f'{prefix}vehicle_{track_id}_{RUN_STAMP}.jpg'
+
+
+class ImageSink:
+    """
+    Background writer that keeps only the best-scoring crops of every track on disk.
+
+    The first crops of a track are written right away. Later crops replace them
+    only when their score beats the saved one by ``improve_margin``; anything in
+    between is kept in memory and written when the track ends. JPEG encoding and
+    disk writes run in a thread pool, off the recognition loop.
+
+    Crops are overwritten in place and never deleted, as result rows name the
+    files: callers save every read of a track under the same paths (see
+    ``track_image_names``).
+
+    Args:
+        workers (int): Encoder/writer threads.
+        jpeg_quality (int): JPEG quality, 0-100.
+        improve_margin (float): Score gain needed to rewrite a track's crops before it ends.
+    """
+
+    def __init__(self, workers=2, jpeg_quality=JPEG_QUALITY, improve_margin=IMPROVE_MARGIN):
+        self.jpeg_quality = jpeg_quality
+        self.improve_margin = improve_margin
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-sink')
+        self.lock = threading.Lock()
+        self.tracks = {}
+        self.submitted = 0
+        self.skipped = 0
+        self.writes = 0
+        self.bytes_written = 0
+
+    def submit(self, track_id, score, images):
+        """
+        Offer the crops of one read of a track.
+
+        Args:
+            track_id (int): Track the crops belong to.
+            score (float): Score of the read, higher is better.
+            images (dict): Crops keyed by the path they are saved to.
+        """
+        track_id = int(track_id)
+        with self.lock:
+            self.submitted += 1
+            track = self.tracks.get(track_id)
+            if track is None:
+                track = self.tracks[track_id] = {
+                    'score': None, 'images': None, 'written_score': None, 'generation': 0, 'lock': threading.Lock(),
+                }
+
+            if track['score'] is not None and score <= track['score']:
+                self.skipped += 1
+                return
+
+            # Copy now, the crops are views of frame buffers that are reused for later frames
+            track['score'] = score
+            track['images'] = {path: image.copy() for path, image in images.items()}
+
+            if track['written_score'] is None or score >= track['written_score'] + self.improve_margin:
+                self._flush(track)
+
+    def end_tracks(self, active_track_ids):
+        """
+        Write the pending crops of tracks that ended and forget them.
+
+        Args:
+            active_track_ids (set): Track IDs still kept by the tracker, None to end nothing.
+        """
+        if active_track_ids is None:
+            return
+        with self.lock:
+            for track_id in [track_id for track_id in self.tracks if track_id not in active_track_ids]:
+                self._flush(self.tracks.pop(track_id))
+
+    def close(self):
+        """Write every pending crop and wait for the writes to finish."""
+        with self.lock:
+            for track in self.tracks.values():
+                self._flush(track)
+            self.tracks.clear()
+        self.executor.shutdown(wait=True)
+
+    def _flush(self, track):
+        if track['images'] is None:
+            return
+        track['generation'] += 1
+        self.executor.submit(self._write, track, track['generation'], track['images'])
+        track['written_score'] = track['score']
+        track['images'] = None
+
+    def _write(self, track, generation, images):
+        # Writes of one track run one at a time, and a write that a newer one replaced is skipped
+        with track['lock']:
+            if generation != track['generation']:
+                return
+            self._write_images(images)
+
+    def _write_images(self, images):
+        for path, image in images.items():
+            ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                continue
+            # Replaced in one rename, a reader never sees a half-written crop
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'wb') as image_file:
+                image_file.write(encoded.tobytes())
+            os.replace(temp_path, path)
+            with self.lock:
+                self.writes += 1
+                self.bytes_written += len(encoded)
+
+    def stats(self):
+        """
+        Get the sink counters.
+
+        Returns:
+            dict: Crops submitted, reads skipped as not better, files written, bytes written and open tracks.
+        """
+        with self.lock:
+            return {
+                'submitted': self.submitted,
+                'skipped': self.skipped,
+                'writes': self.writes,
+                'bytes_written': self.bytes_written,
+                'tracks': len(self.tracks),
+            }
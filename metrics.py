@@ -0,0 +1,254 @@
+import bisect
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "lpr"
+
+_DISABLED_TIMER = contextlib.nullcontext()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def _flatten(stats, prefix=""):
+    """Flatten a nested stats dict into (name, value) pairs of its numbers."""
+    for key, value in stats.items():
+        name = re.sub(r'[^A-Za-z0-9_]', '_', f"{prefix}_{key}" if prefix else str(key))
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        elif isinstance(value, (bool, int, float)):
+            yield name, float(value)
+
+
+class Metrics:
+    """
+    Counters, latency histograms and gauges of the hot path, exported in the Prometheus text format or as JSON.
+
+    Counters and histograms are updated where the work happens, e.g.
+    ``with metrics.timer('ocr', camera='gate'): ...`` or
+    ``metrics.inc('frames_in', camera='gate')``. Gauges are not updated on the
+    hot path at all: collectors registered with ``add_collector`` are called
+    when the metrics are read and turn the ``stats()`` dicts the components
+    already keep (queue depths, cache hits, bytes written, ...) into gauges.
+
+    A disabled instance returns from every update immediately and its timer is
+    a shared no-op context manager, so instrumented code costs a method call.
+
+    Args:
+        enabled (bool): Record metrics.
+        labels (dict): Labels added to every metric, e.g. {'camera': 'gate'}.
+        buckets (tuple): Upper bounds in seconds of the histogram buckets.
+    """
+
+    def __init__(self, enabled=True, labels=None, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.labels = dict(labels or {})
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self.created_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter."""
+        if not self.enabled:
+            return
+        key = _key(name, {**self.labels, **labels})
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Add a latency in seconds to a histogram."""
+        if not self.enabled:
+            return
+        key = _key(name, {**self.labels, **labels})
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            histogram['buckets'][index] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def timer(self, name, **labels):
+        """Context manager that observes the seconds its block took in the ``name`` histogram."""
+        if not self.enabled:
+            return _DISABLED_TIMER
+        return self._timer(name, labels)
+
+    @contextlib.contextmanager
+    def _timer(self, name, labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def add_collector(self, name, stats, **labels):
+        """
+        Export the numbers of a stats dict as gauges whenever the metrics are read.
+
+        Args:
+            name (str): Gauge name prefix, e.g. 'pipeline'.
+            stats (callable): Returns a (nested) dict of numbers, e.g. ``pipeline.stats``.
+            **labels: Labels of the gauges.
+        """
+        with self.lock:
+            self.collectors.append((name, stats, {**self.labels, **labels}))
+
+    def gauges(self):
+        """Call the collectors and return their numbers as {(name, labels): value}."""
+        with self.lock:
+            collectors = list(self.collectors)
+        gauges = {}
+        for prefix, stats, labels in collectors:
+            for name, value in _flatten(stats(), prefix):
+                gauges[_key(name, labels)] = value
+        return gauges
+
+    def snapshot(self):
+        """
+        Get every metric as a JSON-serializable dict.
+
+        Returns:
+            dict: 'counters', 'histograms' (with per-bucket counts, sum and count)
+            and 'gauges', each a list of {'name', 'labels', ...} entries.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: {**value, 'buckets': list(value['buckets'])} for key, value in self.histograms.items()}
+        return {
+            'time': time.time(),
+            'uptime': time.time() - self.created_at,
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in counters.items()],
+            'histograms': [
+                {'name': name, 'labels': dict(labels), 'buckets': dict(zip([*map(str, self.buckets), '+Inf'], value['buckets'])),
+                 'sum': value['sum'], 'count': value['count']}
+                for (name, labels), value in histograms.items()
+            ],
+            'gauges': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in self.gauges().items()],
+        }
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: Counters as ``lpr_<name>_total``, histograms as ``lpr_<name>_seconds``
+            and gauges as ``lpr_<name>``.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: {**value, 'buckets': list(value['buckets'])} for key, value in self.histograms.items()}
+        lines = []
+        typed = set()
+
+        def declare(metric, kind):
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            declare(metric, "counter")
+            lines.append(f"{metric}{_label_text(labels)} {value}")
+        for (name, labels), histogram in sorted(histograms.items()):
+            metric = f"{METRIC_PREFIX}_{name}_seconds"
+            declare(metric, "histogram")
+            cumulative = 0
+            for bound, count in zip([*map(str, self.buckets), '+Inf'], histogram['buckets']):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {histogram['sum']}")
+            lines.append(f"{metric}_count{_label_text(labels)} {histogram['count']}")
+        for (name, labels), value in sorted(self.gauges().items()):
+            metric = f"{METRIC_PREFIX}_{name}"
+            declare(metric, "gauge")
+            lines.append(f"{metric}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serve the metrics over HTTP from a daemon thread: Prometheus text on /metrics, JSON on /metrics.json.
+
+        Args:
+            port (int): Port to listen on.
+            host (str): Address to bind, local only by default.
+
+        Returns:
+            ThreadingHTTPServer: The running server, ``shutdown()`` stops it. None if the port
+            could not be bound, e.g. because it is taken; recognition carries on without the endpoint.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = metrics.render().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as exc:
+            print(f"Metrics not served, cannot listen on {host}:{port}: {exc}")
+            return None
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+    def dump_json(self, path, interval=10.0):
+        """
+        Write a JSON snapshot to path every interval seconds from a daemon thread.
+
+        The file is replaced atomically, so readers never see a partial snapshot.
+
+        Args:
+            path (str): Output file.
+            interval (float): Seconds between snapshots.
+
+        Returns:
+            threading.Event: Set it to stop dumping.
+        """
+        stopped = threading.Event()
+
+        def dump():
+            while not stopped.wait(interval):
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w') as dump_file:
+                    json.dump(self.snapshot(), dump_file)
+                os.replace(tmp_path, path)
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        threading.Thread(target=dump, name='metrics-json', daemon=True).start()
+        return stopped
@@ -0,0 +1,149 @@
+import cv2
+import numpy as np
+
+# Width frames are downscaled to before looking for motion
+MOTION_WIDTH = 160
+
+# Grey-level change (0-255) at which a downscaled pixel counts as moving
+MOTION_THRESHOLD = 25
+
+# Fraction of the lane area that has to move before detection runs
+MOTION_MIN_AREA = 0.002
+
+# Frames detection keeps running after the motion stopped, for vehicles that halt in view
+MOTION_HOLD_FRAMES = 15
+
+# Detection runs at least once every this many frames even without motion, 0 to never force it
+MOTION_MAX_GATED = 150
+
+
+class MotionGate:
+    """
+    Cheap check whether a frame is worth running the detectors on.
+
+    Frames are downscaled to ``width`` pixels wide, converted to grey and
+    blurred, then compared either to the previous frame ('diff') or to an
+    OpenCV MOG2 background model ('mog2'). Only pixels inside the lane regions
+    count. After motion, detection keeps running for ``hold_frames`` frames,
+    and it is forced every ``max_gated`` frames so nothing that crept in
+    unnoticed is missed for long.
+
+    Args:
+        regions (list): Lane polygons as lists of (x, y) points in 0-1 frame
+            coordinates, None to watch the whole frame.
+        method (str): 'diff' for frame differencing, 'mog2' for a background subtractor.
+        width (int): Width of the downscaled frames.
+        threshold (int): Grey-level change at which a pixel counts as moving ('diff' only).
+        min_area (float): Fraction of the lane area that has to move. Lower is more sensitive.
+        hold_frames (int): Frames detection keeps running after motion.
+        max_gated (int): Most frames in a row that are gated, 0 for no limit.
+    """
+
+    def __init__(self, regions=None, method='diff', width=MOTION_WIDTH, threshold=MOTION_THRESHOLD,
+                 min_area=MOTION_MIN_AREA, hold_frames=MOTION_HOLD_FRAMES, max_gated=MOTION_MAX_GATED):
+        if method not in ('diff', 'mog2'):
+            raise ValueError(f"Unknown motion method: {method}")
+        self.regions = regions
+        self.method = method
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.hold_frames = hold_frames
+        self.max_gated = max_gated
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=500, detectShadows=False) if method == 'mog2' else None
+        self.previous = None
+        self.mask = None
+        self.mask_shape = None
+        self.mask_pixels = 0
+        self.hold = 0
+        self.gated_in_row = 0
+        self.frames = 0
+        self.processed = 0
+        self.gated = 0
+        self.last_motion = 0.0
+
+    def _build_mask(self, shape):
+        height, width = shape
+        self.mask_shape = shape
+        if self.regions is None:
+            self.mask = None
+            self.mask_pixels = height * width
+            return
+        self.mask = np.zeros(shape, dtype=np.uint8)
+        for region in self.regions:
+            points = np.round(np.asarray(region, dtype=np.float32) * [width - 1, height - 1]).astype(np.int32)
+            cv2.fillPoly(self.mask, [points], 255)
+        self.mask_pixels = max(int(np.count_nonzero(self.mask)), 1)
+
+    def motion(self, img):
+        """
+        Measure the motion in the lane regions of a frame.
+
+        Args:
+            img (numpy.ndarray): BGR frame.
+
+        Returns:
+            float: Fraction of the lane area that moved since the previous frame.
+        """
+        height, width = img.shape[:2]
+        small = cv2.resize(img, (self.width, max(1, round(height * self.width / width))), interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        if self.mask_shape != small.shape:
+            self._build_mask(small.shape)
+
+        if self.subtractor is not None:
+            moving = self.subtractor.apply(small)
+        else:
+            if self.previous is None or self.previous.shape != small.shape:
+                self.previous = small
+                return 1.0
+            moving = cv2.threshold(cv2.absdiff(small, self.previous), self.threshold, 255, cv2.THRESH_BINARY)[1]
+            self.previous = small
+
+        if self.mask is not None:
+            moving = cv2.bitwise_and(moving, self.mask)
+        return cv2.countNonZero(moving) / self.mask_pixels
+
+    def check(self, img):
+        """
+        Decide whether to run detection on a frame.
+
+        Args:
+            img (numpy.ndarray): BGR frame.
+
+        Returns:
+            bool: True to run the detectors, False for the tracker-only path.
+        """
+        self.frames += 1
+        self.last_motion = self.motion(img)
+        if self.last_motion >= self.min_area:
+            self.hold = self.hold_frames
+            run = True
+        elif self.hold > 0:
+            self.hold -= 1
+            run = True
+        else:
+            run = self.max_gated > 0 and self.gated_in_row >= self.max_gated
+
+        if run:
+            self.processed += 1
+            self.gated_in_row = 0
+        else:
+            self.gated += 1
+            self.gated_in_row += 1
+        return run
+
+    def stats(self):
+        """
+        Get the gate counters.
+
+        Returns:
+            dict: Frames checked, frames processed and gated, gated ratio and the last motion measured.
+        """
+        return {
+            'frames': self.frames,
+            'processed': self.processed,
+            'gated': self.gated,
+            'gated_ratio': self.gated / self.frames if self.frames else 0.0,
+            'last_motion': self.last_motion,
+        }
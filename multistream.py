@@ -0,0 +1,358 @@
+import argparse
+import os
+import time
+
+import cv2
+
+from association import associate_plates
+from backends import BACKENDS
+from image_sink import ImageSink, track_image_names
+from metrics import Metrics
+from ocr import read_license_plates
+from ocr_cache import OCRCache
+from registry import ModelRegistry
+from pipeline import CaptureStage, QueueClosed, StageQueue
+from results_sink import CSVBackend, ResultsSink
+from results_store import SQLiteBackend
+from roi import ROI_SIZE, prepare_rois, roi_detections_to_frame
+from tracking import make_tracker, tracker_track_ids, update_tracker
+from plate_format import plate_grammar
+
+LP_FOLDER_PATH = "./licenses_plates_imgs_detected/"
+VEHICLE_FOLDER_PATH = "./vehicles/"
+LICENSE_MODEL_DETECTION_DIR = './models/best.pt'
+COCO_MODEL_DIR = "./models/yolov8s.pt"
+VEHICLES = {2: "Car", 3: "MC", 5: "Bus", 6: "Truck"}
+
+# Most streams whose frames go into one batched model call
+MAX_BATCH = 8
+
+# Minimum OCR score for a read to be recorded
+MIN_TEXT_SCORE = 0.7
+
+# Seconds between stats printouts
+STATS_INTERVAL = 10
+
+
+class Stream:
+    """
+    One camera of the engine.
+
+    A capture thread keeps only the newest frame of the camera, so a stream
+    the engine cannot keep up with drops frames instead of queueing them. The
+    stream also owns all per-camera state: its own ByteTrack trackers for
+    vehicles and plates, OCR cache and sinks.
+
+    Args:
+        name (str): Camera name, used in file names and stored with the results.
+        source (int or str): Camera index, video file or stream URL.
+        results_sink (ResultsSink): Where the camera's reads are recorded.
+    """
+
+    def __init__(self, name, source, results_sink):
+        self.name = name
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        self.frames = StageQueue(name, maxsize=1, drop_oldest=True)
+        self.capture = CaptureStage(self.cap, self.frames)
+        self.vehicle_tracker = make_tracker()
+        self.plate_tracker = make_tracker()
+        self.ocr_cache = OCRCache()
+        self.results_sink = results_sink
+        self.image_sink = ImageSink(workers=1)
+        self.ended = False
+        self.processed = 0
+        self.last_served = 0.0
+
+    def start(self):
+        self.capture.start()
+        return self
+
+    def has_frame(self):
+        return len(self.frames) > 0
+
+    def take(self):
+        """Take the newest frame as (frame_number, frame, capture_time), None if no new frame arrived."""
+        try:
+            return self.frames.get(timeout=0)
+        except QueueClosed:
+            self.ended = True
+            return None
+
+    def stop(self, timeout=5.0):
+        self.capture.stop()
+        self.capture.join(timeout)
+        self.cap.release()
+        self.image_sink.close()
+        self.results_sink.close()
+
+    def stats(self):
+        return {
+            'captured': self.capture.processed,
+            'processed': self.processed,
+            'dropped': self.frames.drops,
+            'queue_depth': len(self.frames),
+            'ocr_cache': self.ocr_cache.stats(),
+        }
+
+
+class MultiStreamEngine:
+    """
+    Run many cameras through one set of models.
+
+    Each step takes the newest frame of up to ``max_batch`` streams and runs
+    the vehicle detector, the plate detector (on the vehicle ROIs of all of
+    them) and OCR once each for the whole batch. Tracking stays per stream.
+
+    Streams are served least recently served first, and a stream contributes at
+    most one frame per batch, so a busy camera cannot starve the others: it only
+    drops more of its own frames.
+
+    Args:
+        streams (list): Streams to serve.
+        coco_model (ultralytics.YOLO): Vehicle detector.
+        license_plate_detector (ultralytics.YOLO): License plate detector.
+        reader (easyocr.Reader): EasyOCR reader.
+        max_batch (int): Most streams per batch.
+        imgsz (int): Vehicle detector input size.
+        metrics (Metrics): Where stage timings and per-camera counters go, None for no metrics.
+    """
+
+    def __init__(self, streams, coco_model, license_plate_detector, reader, max_batch=MAX_BATCH, imgsz=640, metrics=None):
+        self.streams = streams
+        self.coco_model = coco_model
+        self.license_plate_detector = license_plate_detector
+        self.reader = reader
+        self.max_batch = max_batch
+        self.imgsz = imgsz
+        self.batches = 0
+        self.batch_frames = 0
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+
+    def select_streams(self):
+        """Pick the streams with a new frame, least recently served first."""
+        ready = [stream for stream in self.streams if stream.has_frame()]
+        ready.sort(key=lambda stream: stream.last_served)
+        return ready[:self.max_batch]
+
+    def step(self):
+        """
+        Process one batch.
+
+        Returns:
+            int: Number of frames processed.
+        """
+        batch = []
+        for stream in self.select_streams():
+            item = stream.take()
+            if item is not None:
+                batch.append((stream, *item))
+        if len(batch) == 0:
+            return 0
+
+        served_at = time.monotonic()
+        start_time = time.time()
+        states = []
+
+        # Vehicles of every frame in one batched call, then each stream's own tracker
+        with self.metrics.timer('vehicle_detection'):
+            vehicle_results = self.coco_model.predict([img for _, _, img, _ in batch], imgsz=self.imgsz, classes=list(VEHICLES), verbose=False)
+        for (stream, frame_number, img, capture_time), result in zip(batch, vehicle_results):
+            stream.last_served = served_at
+            vehicle_data = update_tracker(stream.vehicle_tracker, result.boxes.data.cpu().numpy(), img)
+            states.append({'stream': stream, 'frame_number': frame_number, 'img': img, 'start_time': capture_time, 'vehicle_data': vehicle_data})
+
+        # Plates in the vehicle ROIs of every frame in one batched call
+        canvases = []
+        for state in states:
+            state_canvases, state['transforms'] = prepare_rois(state['img'], state['vehicle_data'][:, :4])
+            canvases.extend(state_canvases)
+        with self.metrics.timer('plate_detection'):
+            plate_results = self.license_plate_detector.predict(canvases, imgsz=ROI_SIZE, verbose=False) if canvases else []
+
+        offset = 0
+        for state in states:
+            stream, img, vehicle_data = state['stream'], state['img'], state['vehicle_data']
+            roi_count = len(state['transforms'])
+            plate_detections = roi_detections_to_frame(plate_results[offset:offset + roi_count], state['transforms'])
+            offset += roi_count
+
+            plate_data = update_tracker(stream.plate_tracker, plate_detections, img)
+            vehicle_indices = associate_plates(plate_data[:, :4], vehicle_data[:, :4])
+            state['plate_candidates'] = []
+            for license_plate, vehicle_index in zip(plate_data.tolist(), vehicle_indices.tolist()):
+                if vehicle_index < 0:
+                    continue
+                x1, y1, x2, y2 = (int(value) for value in license_plate[:4])
+                license_plate_crop = img[y1:y2, x1:x2]
+                if license_plate_crop.size != 0:
+                    state['plate_candidates'].append((license_plate, vehicle_data[vehicle_index].tolist(), license_plate_crop.copy()))
+
+        with self.metrics.timer('ocr'):
+            self.read_plates(states)
+        # Detection and OCR time of the batch, the same for every frame in it
+        inference_time = time.time() - start_time
+
+        for state in states:
+            state['inference_time'] = inference_time
+            with self.metrics.timer('record', camera=state['stream'].name):
+                self.record(state)
+            state['stream'].processed += 1
+            self.metrics.observe('frame_latency', time.time() - state['start_time'], camera=state['stream'].name)
+            self.metrics.inc('vehicles', len(state['vehicle_data']), camera=state['stream'].name)
+            self.metrics.inc('plate_candidates', len(state['plate_candidates']), camera=state['stream'].name)
+
+        self.metrics.observe('batch', time.time() - start_time)
+        self.metrics.inc('batch_frames', len(states))
+        self.batches += 1
+        self.batch_frames += len(states)
+        return len(states)
+
+    def read_plates(self, states):
+        """OCR the plate crops of all streams that have no stable cached read, in one batch."""
+        pending = []
+        for state in states:
+            ocr_cache = state['stream'].ocr_cache
+            state['plate_reads'] = [ocr_cache.lookup(candidate[0][4], candidate[2]) for candidate in state['plate_candidates']]
+            pending.extend((state, i) for i, plate_read in enumerate(state['plate_reads']) if plate_read is None)
+
+        if len(pending) != 0:
+            start_time = time.perf_counter()
+            plate_reads = read_license_plates(self.reader, [state['plate_candidates'][i][2] for state, i in pending])
+            ocr_time_per_crop = (time.perf_counter() - start_time) / len(pending)
+
+            for (state, i), (text, score) in zip(pending, plate_reads):
+                license_plate, _, license_plate_crop = state['plate_candidates'][i]
+                state['plate_reads'][i] = (text, score)
+                state['stream'].ocr_cache.update(license_plate[4], license_plate_crop, text, score)
+                state['stream'].ocr_cache.record_ocr_time(ocr_time_per_crop, 1)
+
+        for state in states:
+            state['stream'].ocr_cache.evict(tracker_track_ids(state['stream'].plate_tracker))
+
+    def record(self, state):
+        """Format the accepted reads of a frame and hand them to the stream's sinks."""
+        stream, img = state['stream'], state['img']
+
+        for (license_plate, vehicle, license_plate_crop), (license_plate_text, license_plate_text_score) in zip(state['plate_candidates'], state['plate_reads']):
+            if license_plate_text is None or license_plate_text_score is None or license_plate_text_score < MIN_TEXT_SCORE:
+                continue
+
+            lp_track_id = int(license_plate[4])
+            xvehicle1, yvehicle1, xvehicle2, yvehicle2, track_id, vehicle_score, class_id = vehicle
+            veh_class_name = VEHICLES[int(class_id)]
+            # Accepted the way app.py accepts reads, only if it fits a plate format of the vehicle class
+            license_plate_text, valid = plate_grammar.normalize(license_plate_text, veh_class_name)
+            if not valid:
+                continue
+
+            lp_crop_name, car_img_name = track_image_names(track_id, prefix=f'{stream.name}_')
+            car_crop = img[int(yvehicle1):int(yvehicle2), int(xvehicle1):int(xvehicle2)]
+            stream.image_sink.submit(track_id, license_plate_text_score, {
+                os.path.join(LP_FOLDER_PATH, lp_crop_name): license_plate_crop,
+                os.path.join(VEHICLE_FOLDER_PATH, car_img_name): car_crop,
+            })
+            stream.results_sink.write({0: {0: {
+                'Vehicle': {
+                    'vehicle_id': int(track_id),
+                    'vehicle_class': veh_class_name,
+                    'vehicle_score': vehicle_score,
+                    'vehicle_img': car_img_name,
+                },
+                'license_plate': {
+                    'lp_id': lp_track_id,
+                    'text': license_plate_text,
+                    'inference_time': state['inference_time'],
+                    'lp_img': lp_crop_name,
+                    'text_score': license_plate_text_score,
+                },
+            }}})
+
+        stream.image_sink.end_tracks(tracker_track_ids(stream.vehicle_tracker))
+
+    def run(self):
+        """Serve the streams until all of them have ended."""
+        last_stats_time = time.time()
+        while not all(stream.ended for stream in self.streams):
+            if self.step() == 0:
+                # Notice streams whose capture finished with nothing left to serve
+                for stream in self.streams:
+                    if not stream.ended and not stream.has_frame() and not stream.capture.is_alive():
+                        stream.take()
+                time.sleep(0.002)
+            if time.time() - last_stats_time >= STATS_INTERVAL:
+                print(f"Engine: {self.stats()}")
+                last_stats_time = time.time()
+
+    def stats(self):
+        """
+        Get per-stream counters and the mean batch size.
+
+        Returns:
+            dict: 'streams' stats keyed by name and 'mean_batch' frames per batch.
+        """
+        return {
+            'streams': {stream.name: stream.stats() for stream in self.streams},
+            'mean_batch': self.batch_frames / self.batches if self.batches else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognize license plates on several cameras with one set of models.")
+    parser.add_argument("--source", action="append", required=True, help="camera index, video file or URL; repeat per camera")
+    parser.add_argument("--name", action="append", help="camera name, repeat in --source order")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="most cameras per batched model call")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv", help="results backend")
+    parser.add_argument("--inference-backend", choices=["auto", *BACKENDS], default="auto", help="model backend")
+    parser.add_argument("--int8", action="store_true", help="INT8 models on the onnx/openvino backends")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on http://127.0.0.1:<port>/metrics")
+    args = parser.parse_args()
+
+    names = args.name or [f"camera-{i}" for i in range(len(args.source))]
+    if len(names) != len(args.source):
+        parser.error("give one --name per --source")
+
+    # Every model is loaded once and shared by all cameras
+    models = ModelRegistry(args.inference_backend, int8=args.int8)
+    models.register_yolo('coco_model', COCO_MODEL_DIR, warmup_sizes=((640, args.max_batch),))
+    models.register_yolo('license_plate_detector', LICENSE_MODEL_DETECTION_DIR, warmup_sizes=((ROI_SIZE, args.max_batch),))
+    models.register_reader('reader')
+    # Loaded concurrently while the cameras open
+    models.preload()
+
+    streams = []
+    with models.phase('cameras'):
+        for name, source in zip(names, args.source):
+            if args.backend == "sqlite":
+                backend = SQLiteBackend("./results/LPR_results.db", camera=name)
+            else:
+                backend = CSVBackend(f"./results/LPR_results_{name}.csv")
+            streams.append(Stream(name, int(source) if source.isdigit() else source, ResultsSink(backend)))
+    with models.phase('models'):
+        models.wait()
+    print(f"Startup: {models.startup_report()}")
+
+    for stream in streams:
+        stream.start()
+    metrics = Metrics(enabled=args.metrics_port is not None)
+    # Per-camera capture, drop, queue and cache counters, plus crop bytes written, read when scraped
+    for stream in streams:
+        metrics.add_collector('stream', stream.stats, camera=stream.name)
+        metrics.add_collector('image_sink', stream.image_sink.stats, camera=stream.name)
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    engine = MultiStreamEngine(streams, models.get('coco_model'), models.get('license_plate_detector'), models.get('reader'),
+                               max_batch=args.max_batch, metrics=metrics)
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for stream in streams:
+            stream.stop()
+        models.close()
+        print(f"Engine: {engine.stats()}")
+
+
+if __name__ == "__main__":
+    main()
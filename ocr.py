@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+
+# Characters EasyOCR is allowed to return for a license plate
+PLATE_ALLOWLIST = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Every crop is resized to this height before OCR so a frame's crops can be batched
+OCR_HEIGHT = 128
+
+# A text box has to cover at least this fraction of the crop to be part of the plate
+MIN_TEXT_AREA_RATIO = 0.17
+
+
+def normalize_crop(license_plate_crop, height=OCR_HEIGHT):
+    """
+    Convert a license plate crop to grayscale and resize it to a fixed height.
+
+    Args:
+        license_plate_crop (numpy.ndarray): BGR or grayscale license plate crop.
+        height (int): Target height in pixels, the aspect ratio is kept.
+
+    Returns:
+        numpy.ndarray: Grayscale crop of the given height.
+    """
+    if license_plate_crop.ndim == 3:
+        license_plate_crop = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
+
+    crop_height, crop_width = license_plate_crop.shape
+    width = max(1, int(round(crop_width * height / crop_height)))
+    interpolation = cv2.INTER_AREA if crop_height > height else cv2.INTER_CUBIC
+    return cv2.resize(license_plate_crop, (width, height), interpolation=interpolation)
+
+
+def plate_text(detections, rectangle_size):
+    """
+    Join the EasyOCR text boxes that cover enough of the crop into one plate string.
+
+    Args:
+        detections (list): EasyOCR results, (bbox, text, score) per text box.
+        rectangle_size (int): Area of the crop the detections were read from.
+
+    Returns:
+        tuple: License plate text and its mean confidence score, (None, None) if nothing was read.
+    """
+    if len(detections) == 0:
+        return None, None
+
+    scores = 0
+    plate = []
+
+    for bbox, text, score in detections:
+        length = np.sum(np.subtract(bbox[1], bbox[0]))
+        height = np.sum(np.subtract(bbox[2], bbox[1]))
+
+        if length*height / rectangle_size > MIN_TEXT_AREA_RATIO:
+            scores += score
+            plate.append(text.upper())
+
+    if len(plate) != 0:
+        return " ".join(plate), scores/len(plate)
+    else:
+        return " ".join(plate), 0
+
+
+def read_license_plate(reader, license_plate_crop):
+    """
+    Read the license plate text from a single crop.
+
+    Args:
+        reader (easyocr.Reader): EasyOCR reader.
+        license_plate_crop (numpy.ndarray): License plate crop.
+
+    Returns:
+        tuple: License plate text and its confidence score.
+    """
+    detections = reader.readtext(license_plate_crop, allowlist=PLATE_ALLOWLIST)
+    return plate_text(detections, license_plate_crop.shape[0]*license_plate_crop.shape[1])
+
+
+def read_license_plates(reader, license_plate_crops, height=OCR_HEIGHT):
+    """
+    Read all license plate crops of a frame with one batched EasyOCR call.
+
+    The crops are normalized to a common height and padded on the right to a
+    common width, so text detection runs once for the whole batch.
+
+    Args:
+        reader (easyocr.Reader): EasyOCR reader.
+        license_plate_crops (list): BGR or grayscale license plate crops.
+        height (int): Height every crop is normalized to.
+
+    Returns:
+        list: (text, score) tuples in the same order as license_plate_crops.
+    """
+    if len(license_plate_crops) == 0:
+        return []
+
+    crops = [normalize_crop(crop, height) for crop in license_plate_crops]
+    width = max(crop.shape[1] for crop in crops)
+
+    # Pad with the crop's own mean intensity so the padding holds no edges for the text detector
+    batch = [
+        cv2.copyMakeBorder(crop, 0, 0, 0, width - crop.shape[1], cv2.BORDER_CONSTANT, value=int(crop.mean()))
+        for crop in crops
+    ]
+    batch_detections = reader.readtext_batched(batch, batch_size=len(batch), allowlist=PLATE_ALLOWLIST)
+
+    return [plate_text(detections, crop.shape[0]*crop.shape[1]) for detections, crop in zip(batch_detections, crops)]
@@ -0,0 +1,178 @@
+import time
+
+import cv2
+
+from ocr import read_license_plates
+
+
+def crop_sharpness(license_plate_crop):
+    """
+    Measure how sharp a crop is as the variance of its Laplacian.
+
+    Args:
+        license_plate_crop (numpy.ndarray): BGR or grayscale crop.
+
+    Returns:
+        float: Sharpness, higher is sharper.
+    """
+    if license_plate_crop.ndim == 3:
+        license_plate_crop = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(license_plate_crop, cv2.CV_64F).var())
+
+
+class OCRCache:
+    """
+    OCR results keyed by license plate track ID.
+
+    Once a track has been read with the same text at a high confidence a few
+    times in a row, its read is served from the cache. The plate is only read
+    again when a crop comes in that is clearly bigger or sharper than the one
+    the cached read came from.
+
+    Args:
+        min_score (float): Confidence a read needs to count towards a stable read.
+        stable_reads (int): Consecutive identical high-confidence reads before OCR is skipped.
+        min_growth (float): Area ratio over the cached crop that triggers a new read.
+        min_sharpness_gain (float): Sharpness ratio over the cached crop that triggers a new read.
+        ttl (float): Seconds after which an entry that was not seen is evicted.
+    """
+
+    def __init__(self, min_score=0.9, stable_reads=2, min_growth=1.5, min_sharpness_gain=1.5, ttl=10.0):
+        self.min_score = min_score
+        self.stable_reads = stable_reads
+        self.min_growth = min_growth
+        self.min_sharpness_gain = min_sharpness_gain
+        self.ttl = ttl
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.ocr_time = 0.0
+        self.ocr_crops = 0
+
+    def lookup(self, lp_track_id, license_plate_crop):
+        """
+        Get the cached read of a track if the crop does not need to be OCR'd again.
+
+        Args:
+            lp_track_id (int): License plate track ID.
+            license_plate_crop (numpy.ndarray): Current crop of the plate.
+
+        Returns:
+            tuple: Cached (text, score), or None if the crop has to be OCR'd.
+        """
+        entry = self.entries.get(int(lp_track_id))
+        if entry is not None:
+            entry['last_seen'] = time.monotonic()
+
+        if entry is None or entry['streak'] < self.stable_reads:
+            self.misses += 1
+            return None
+
+        area = license_plate_crop.shape[0]*license_plate_crop.shape[1]
+        if area >= entry['area']*self.min_growth or crop_sharpness(license_plate_crop) >= entry['sharpness']*self.min_sharpness_gain:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry['text'], entry['score']
+
+    def update(self, lp_track_id, license_plate_crop, text, score):
+        """
+        Store a fresh OCR read of a track.
+
+        Args:
+            lp_track_id (int): License plate track ID.
+            license_plate_crop (numpy.ndarray): Crop the read came from.
+            text (str): Recognized text, None if nothing was read.
+            score (float): Confidence of the read.
+        """
+        lp_track_id = int(lp_track_id)
+        area = license_plate_crop.shape[0]*license_plate_crop.shape[1]
+        sharpness = crop_sharpness(license_plate_crop)
+        entry = self.entries.get(lp_track_id)
+
+        if entry is None:
+            entry = self.entries[lp_track_id] = {
+                'text': None, 'score': 0.0, 'streak': 0, 'area': 0, 'sharpness': 0.0, 'last_seen': 0.0,
+            }
+        entry['last_seen'] = time.monotonic()
+
+        # Remember the best crop seen, so a re-read is only triggered by a crop better than all earlier ones
+        entry['area'] = max(entry['area'], area)
+        entry['sharpness'] = max(entry['sharpness'], sharpness)
+
+        if not text or score is None:
+            return
+
+        if score >= self.min_score:
+            entry['streak'] = entry['streak'] + 1 if text == entry['text'] else 1
+            entry['text'], entry['score'] = text, score
+        elif entry['streak'] < self.stable_reads:
+            # A weak read breaks a streak that has not become stable yet, a stable read is kept
+            entry['streak'] = 0
+            if score >= entry['score']:
+                entry['text'], entry['score'] = text, score
+
+    def read_license_plates(self, reader, lp_track_ids, license_plate_crops):
+        """
+        Read a frame's license plate crops, OCR'ing only the ones without a stable cached read.
+
+        Args:
+            reader (easyocr.Reader): EasyOCR reader.
+            lp_track_ids (list): License plate track ID of every crop.
+            license_plate_crops (list): License plate crops.
+
+        Returns:
+            list: (text, score) tuples in the same order as license_plate_crops.
+        """
+        plate_reads = [self.lookup(lp_track_id, crop) for lp_track_id, crop in zip(lp_track_ids, license_plate_crops)]
+        ocr_indices = [i for i, plate_read in enumerate(plate_reads) if plate_read is None]
+        if len(ocr_indices) == 0:
+            return plate_reads
+
+        start_time = time.perf_counter()
+        fresh_reads = read_license_plates(reader, [license_plate_crops[i] for i in ocr_indices])
+        self.record_ocr_time(time.perf_counter() - start_time, len(ocr_indices))
+
+        for i, (text, score) in zip(ocr_indices, fresh_reads):
+            plate_reads[i] = (text, score)
+            self.update(lp_track_ids[i], license_plate_crops[i], text, score)
+        return plate_reads
+
+    def record_ocr_time(self, seconds, crops):
+        """Account OCR time so the time saved by cache hits can be estimated."""
+        self.ocr_time += seconds
+        self.ocr_crops += crops
+
+    def evict(self, active_track_ids=None):
+        """
+        Drop entries of tracks the tracker no longer keeps, and entries older than the TTL.
+
+        Args:
+            active_track_ids (set): Track IDs still known to ByteTrack, None to only apply the TTL.
+        """
+        now = time.monotonic()
+        for lp_track_id in list(self.entries):
+            entry = self.entries[lp_track_id]
+            if (active_track_ids is not None and lp_track_id not in active_track_ids) or now - entry['last_seen'] > self.ttl:
+                del self.entries[lp_track_id]
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: Hits, misses, evictions, hit rate, cached tracks and estimated OCR seconds saved.
+        """
+        lookups = self.hits + self.misses
+        ocr_time_per_crop = self.ocr_time / self.ocr_crops if self.ocr_crops else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+            'ocr_time_saved': self.hits * ocr_time_per_crop,
+        }
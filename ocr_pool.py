@@ -0,0 +1,272 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from backends import load_reader
+from ocr import OCR_HEIGHT, normalize_crop, read_license_plates
+
+# OCR worker processes, each with its own EasyOCR reader
+OCR_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Shared-memory crop slots per worker, the most crops in flight is workers * SLOTS_PER_WORKER
+SLOTS_PER_WORKER = 4
+
+# Widest crop a slot holds after normalizing to OCR_HEIGHT, wider crops are squeezed to fit
+SLOT_WIDTH = 1024
+
+# Most crops of one plate track in flight at a time
+MAX_PER_TRACK = 1
+
+# Most crops a worker reads in one batched EasyOCR call
+WORKER_BATCH = 4
+
+
+def _worker_loop(tasks, results, shm_name, slot_count, backend, languages, int8, threads, batch_size):
+    """Worker process: load the reader once, then OCR crops from the shared-memory slots until told to stop."""
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = np.ndarray((slot_count, OCR_HEIGHT, SLOT_WIDTH), dtype=np.uint8, buffer=shm.buf)
+    reader = load_reader(backend, languages, int8=int8)
+
+    stopping = False
+    while not stopping:
+        task = tasks.get()
+        if task is None:
+            break
+        # Read whatever else is already waiting along with it, in one batch
+        batch = [task]
+        while len(batch) < batch_size:
+            try:
+                task = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                stopping = True
+                break
+            batch.append(task)
+
+        start_time = time.perf_counter()
+        try:
+            plate_reads = read_license_plates(reader, [slots[slot, :, :width] for _, slot, width in batch])
+            error = None
+        except Exception as exc:
+            plate_reads, error = [(None, None)] * len(batch), repr(exc)
+        ocr_time = (time.perf_counter() - start_time) / len(batch)
+        for (request_id, _, _), (text, score) in zip(batch, plate_reads):
+            results.put((request_id, text, score, ocr_time, error))
+
+    del slots
+    shm.close()
+
+
+class OCRPool:
+    """
+    EasyOCR in worker processes, for CPU-only machines where OCR on one thread is the bottleneck.
+
+    Every worker process loads its reader once. Crops are normalized to
+    OCR_HEIGHT grayscale in the caller and copied into a slot of a shared
+    memory block; only the slot number goes through the task queue, so no
+    image is pickled. Results come back asynchronously: ``poll`` returns the
+    reads that finished since the last call, tagged with the track ID and frame
+    number they were submitted with.
+
+    ``submit`` never blocks. It refuses a crop when every slot is taken
+    (backpressure) or when the crop's track already has ``max_per_track`` crops
+    in flight, so one slow plate cannot fill the pool.
+
+    Args:
+        workers (int): Worker processes.
+        backend (str): Reader backend for ``backends.load_reader``.
+        languages (tuple): EasyOCR languages.
+        int8 (bool): INT8 recognizer on the onnx/openvino backends.
+        slots (int): Shared-memory crop slots, the most crops in flight. None for workers * SLOTS_PER_WORKER.
+        max_per_track (int): Most crops of one track in flight.
+        batch_size (int): Most crops a worker reads in one call.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, backend='auto', languages=('en',), int8=False, slots=None,
+                 max_per_track=MAX_PER_TRACK, batch_size=WORKER_BATCH):
+        slot_count = slots or workers * SLOTS_PER_WORKER
+        self.max_per_track = max_per_track
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_count * OCR_HEIGHT * SLOT_WIDTH)
+        self.slots = np.ndarray((slot_count, OCR_HEIGHT, SLOT_WIDTH), dtype=np.uint8, buffer=self.shm.buf)
+        self.free_slots = list(range(slot_count))
+        self.lock = threading.Lock()
+        self.request_ids = itertools.count()
+        self.pending = {}
+        self.track_in_flight = collections.Counter()
+        self.completed = collections.deque()
+        self.submitted = 0
+        self.rejected_full = 0
+        self.rejected_track = 0
+        self.finished = 0
+        self.errors = 0
+        self.ocr_time = 0.0
+        self.latency = 0.0
+        self.closed = False
+
+        context = multiprocessing.get_context('spawn')
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        # Split the cores between the workers instead of every worker using all of them
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        self.processes = [
+            context.Process(
+                target=_worker_loop, name=f'ocr-worker-{i}', daemon=True,
+                args=(self.tasks, self.results, self.shm.name, slot_count, backend, tuple(languages), int8, threads, batch_size),
+            )
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.collector = threading.Thread(target=self._collect, name='ocr-results', daemon=True)
+        self.collector.start()
+
+    def submit(self, lp_track_id, frame_number, license_plate_crop, context=None):
+        """
+        Queue a crop for OCR if there is room.
+
+        Args:
+            lp_track_id (int): License plate track ID.
+            frame_number (int): Frame the crop comes from.
+            license_plate_crop (numpy.ndarray): BGR or grayscale crop.
+            context (object): Returned with the result as is, stays in this process.
+
+        Returns:
+            bool: Whether the crop was accepted.
+        """
+        lp_track_id = int(lp_track_id)
+        with self.lock:
+            if self.closed:
+                return False
+            if self.track_in_flight[lp_track_id] >= self.max_per_track:
+                self.rejected_track += 1
+                return False
+            if len(self.free_slots) == 0:
+                self.rejected_full += 1
+                return False
+            slot = self.free_slots.pop()
+            self.track_in_flight[lp_track_id] += 1
+
+        crop = normalize_crop(license_plate_crop, OCR_HEIGHT)
+        if crop.shape[1] > SLOT_WIDTH:
+            crop = cv2.resize(crop, (SLOT_WIDTH, OCR_HEIGHT), interpolation=cv2.INTER_AREA)
+        width = crop.shape[1]
+        self.slots[slot, :, :width] = crop
+
+        request_id = next(self.request_ids)
+        with self.lock:
+            self.pending[request_id] = (slot, lp_track_id, frame_number, context, time.perf_counter())
+            self.submitted += 1
+        self.tasks.put((request_id, slot, width))
+        return True
+
+    def _collect(self):
+        while True:
+            item = self.results.get()
+            if item is None:
+                break
+            request_id, text, score, ocr_time, error = item
+            with self.lock:
+                slot, lp_track_id, frame_number, context, submitted_at = self.pending.pop(request_id)
+                self.free_slots.append(slot)
+                self.track_in_flight[lp_track_id] -= 1
+                if self.track_in_flight[lp_track_id] <= 0:
+                    del self.track_in_flight[lp_track_id]
+                self.finished += 1
+                self.errors += error is not None
+                self.ocr_time += ocr_time
+                self.latency += time.perf_counter() - submitted_at
+                self.completed.append({
+                    'lp_track_id': lp_track_id,
+                    'frame_number': frame_number,
+                    'text': text,
+                    'score': score,
+                    'ocr_time': ocr_time,
+                    'error': error,
+                    'context': context,
+                })
+
+    def poll(self):
+        """
+        Get the reads that finished since the last call.
+
+        Returns:
+            list: Dicts with 'lp_track_id', 'frame_number', 'text', 'score', 'ocr_time'
+            (seconds of OCR per crop), 'error' (None unless the worker failed) and 'context'.
+        """
+        with self.lock:
+            completed = list(self.completed)
+            self.completed.clear()
+        return completed
+
+    def has_room(self, lp_track_id):
+        """Whether a crop of the track would be accepted now: it is below its in-flight limit and a slot is free."""
+        with self.lock:
+            return not self.closed and self.track_in_flight[int(lp_track_id)] < self.max_per_track and len(self.free_slots) > 0
+
+    def pending_track_ids(self):
+        """
+        Get the tracks whose reads are not all handed out yet.
+
+        Returns:
+            set: Track IDs with crops in flight or reads that finished but were not polled yet.
+        """
+        with self.lock:
+            return set(self.track_in_flight) | {result['lp_track_id'] for result in self.completed}
+
+    def in_flight(self, lp_track_id=None):
+        """Number of crops in flight, of one track or in total."""
+        with self.lock:
+            return len(self.pending) if lp_track_id is None else self.track_in_flight[int(lp_track_id)]
+
+    def close(self, timeout=10.0):
+        """Stop the workers once they finished the crops in flight, and free the shared memory."""
+        with self.lock:
+            self.closed = True
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        self.collector.join(timeout)
+        del self.slots
+        self.shm.close()
+        self.shm.unlink()
+
+    def stats(self):
+        """
+        Get the pool counters.
+
+        Returns:
+            dict: Crops submitted, refused because the pool was full or the track had a
+            crop in flight, finished, failed, in flight, mean OCR and submit-to-result ms,
+            and live workers.
+        """
+        with self.lock:
+            return {
+                'submitted': self.submitted,
+                'rejected_full': self.rejected_full,
+                'rejected_track': self.rejected_track,
+                'finished': self.finished,
+                'errors': self.errors,
+                'in_flight': len(self.pending),
+                'ocr_ms': self.ocr_time / self.finished * 1000 if self.finished else 0.0,
+                'latency_ms': self.latency / self.finished * 1000 if self.finished else 0.0,
+                'workers_alive': sum(process.is_alive() for process in self.processes),
+            }
@@ -0,0 +1,269 @@
+import collections
+import threading
+import time
+
+
+class QueueClosed(Exception):
+    """Raised by StageQueue.get once the queue is closed and drained."""
+
+
+class StageQueue:
+    """
+    Bounded queue between two pipeline stages.
+
+    With ``drop_oldest`` the producer never blocks: when the queue is full the
+    oldest item is dropped to make room, so the consumer always gets the most
+    recent items ("latest frame wins"). Without it the producer blocks until
+    there is room, which pushes back on the stage in front of it.
+
+    Args:
+        name (str): Name shown in the stats.
+        maxsize (int): Maximum number of queued items.
+        drop_oldest (bool): Drop the oldest item instead of blocking when full.
+        on_drop (callable): Called with every dropped item, e.g. to release its frame buffers. None for nothing.
+    """
+
+    def __init__(self, name, maxsize=1, drop_oldest=False, on_drop=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.on_drop = on_drop
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.puts = 0
+        self.drops = 0
+
+    def put(self, item):
+        """
+        Add an item, dropping the oldest one or waiting for room when the queue is full.
+
+        Returns:
+            bool: False if the queue was closed and the item was discarded.
+        """
+        dropped = None
+        with self.condition:
+            while not self.drop_oldest and len(self.items) >= self.maxsize and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return False
+            if len(self.items) >= self.maxsize:
+                dropped = self.items.popleft()
+                self.drops += 1
+            self.items.append(item)
+            self.puts += 1
+            self.condition.notify_all()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+        return True
+
+    def get(self, timeout=None):
+        """
+        Take the oldest item, waiting for one to arrive.
+
+        Args:
+            timeout (float): Seconds to wait, None to wait until an item arrives or the queue closes.
+
+        Returns:
+            object: The item, or None if the timeout expired.
+
+        Raises:
+            QueueClosed: If the queue is closed and empty.
+        """
+        with self.condition:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while len(self.items) == 0:
+                if self.closed:
+                    raise QueueClosed(self.name)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        """Stop accepting items; consumers drain what is left and then get QueueClosed."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.items)
+
+    def stats(self):
+        return {'depth': len(self), 'puts': self.puts, 'drops': self.drops}
+
+
+class Stage(threading.Thread):
+    """
+    Pipeline stage that runs ``fn`` on every item of its inbox in its own thread.
+
+    Whatever ``fn`` returns is put in the outbox, None results are not passed on.
+    When the inbox is closed the stage finishes and closes its outbox; when the
+    outbox is closed it finishes and closes its inbox.
+
+    Args:
+        name (str): Stage name.
+        fn (callable): Function applied to every item.
+        inbox (StageQueue): Queue the stage reads from.
+        outbox (StageQueue): Queue the results go to, None for a sink stage.
+    """
+
+    def __init__(self, name, fn, inbox, outbox=None):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.processed = 0
+        self.busy_time = 0.0
+        self.error = None
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    item = self.inbox.get()
+                except QueueClosed:
+                    break
+                start_time = time.perf_counter()
+                result = self.fn(item)
+                self.busy_time += time.perf_counter() - start_time
+                self.processed += 1
+                if result is not None and self.outbox is not None and not self.outbox.put(result):
+                    # The stage after this one is gone, stop and let the stages in front of this one stop too
+                    self.inbox.close()
+                    break
+        except Exception as error:
+            self.error = error
+            # Unblock the stage in front of this one, nobody is reading its queue anymore
+            self.inbox.close()
+            raise
+        finally:
+            if self.outbox is not None:
+                self.outbox.close()
+
+    def stats(self):
+        return {'processed': self.processed, 'busy_time': self.busy_time}
+
+
+class CaptureStage(threading.Thread):
+    """
+    Source stage that reads frames from a ``cv2.VideoCapture`` as fast as the camera delivers them.
+
+    Frames are put in the outbox as (frame_number, frame, capture_time) tuples,
+    capture_time being the ``time.time()`` the frame was read at, so latency can
+    be measured end to end, queue waits included. The outbox should drop its
+    oldest items so the reader never waits on inference. With a pool, the
+    frame's buffer holds one reference for whoever takes the frame, and the
+    outbox should release it when it drops the frame.
+
+    Args:
+        cap (cv2.VideoCapture): Opened capture.
+        outbox (StageQueue): Queue the frames go to.
+        pool (FramePool): Buffers frames are decoded into, None for a new array every frame.
+    """
+
+    def __init__(self, cap, outbox, pool=None):
+        super().__init__(name='capture', daemon=True)
+        self.cap = cap
+        self.outbox = outbox
+        self.pool = pool
+        self.processed = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                buffer = self.pool.acquire() if self.pool is not None else None
+                ret, frame = self.cap.read(buffer) if buffer is not None else self.cap.read()
+                capture_time = time.time()
+                if self.pool is not None and (not ret or frame is not buffer):
+                    # The buffer was not read into
+                    self.pool.release(buffer)
+                if not ret:
+                    break
+                if self.pool is not None and frame is not buffer:
+                    # First frame, or the camera changed resolution: OpenCV allocated the frame itself
+                    self.pool.adopt(frame)
+                self.processed += 1
+                if not self.outbox.put((self.processed, frame, capture_time)):
+                    if self.pool is not None:
+                        self.pool.release(frame)
+                    break
+        finally:
+            self.outbox.close()
+
+    def stop(self):
+        self.stopped.set()
+
+    def stats(self):
+        return {'processed': self.processed}
+
+
+class Pipeline:
+    """
+    Chain of stages, each in its own thread, connected by bounded queues.
+
+    Args:
+        cap (cv2.VideoCapture): Frame source.
+        stages (list): (name, fn, queue_size, drop_oldest) for every stage. The
+            queue settings are those of the stage's inbox, the first stage's inbox
+            should drop its oldest frames so capture never blocks.
+        output_size (int): Size of the queue after the last stage, None for no output queue.
+        drop_output (bool): Drop the oldest output instead of blocking the last stage.
+        capture_pool (FramePool): Buffers camera frames are decoded into, None for a new array every frame.
+            Frames the first stage's inbox drops are released to it.
+        release_output (callable): Called with every output item that is dropped, to release its buffers.
+    """
+
+    def __init__(self, cap, stages, output_size=1, drop_output=True, capture_pool=None, release_output=None):
+        release_capture = None if capture_pool is None else lambda item: capture_pool.release(item[1])
+        inboxes = [
+            StageQueue(name, queue_size, drop_oldest, on_drop=release_capture if i == 0 else None)
+            for i, (name, _, queue_size, drop_oldest) in enumerate(stages)
+        ]
+        self.output = None if output_size is None else StageQueue('output', output_size, drop_output, on_drop=release_output)
+        self.queues = inboxes + ([self.output] if self.output is not None else [])
+
+        self.capture = CaptureStage(cap, inboxes[0], capture_pool)
+        self.stages = []
+        for i, (name, fn, _, _) in enumerate(stages):
+            outbox = inboxes[i + 1] if i + 1 < len(stages) else self.output
+            self.stages.append(Stage(name, fn, inboxes[i], outbox))
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        self.capture.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stop reading frames, let the stages drain their queues and wait for them to finish."""
+        self.capture.stop()
+        self.capture.join(timeout)
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def is_alive(self):
+        return any(stage.is_alive() for stage in self.stages)
+
+    def errors(self):
+        """Get the exceptions that stopped any of the stages."""
+        return {stage.name: stage.error for stage in self.stages if stage.error is not None}
+
+    def stats(self):
+        """
+        Get queue depths, drop counters and per-stage throughput.
+
+        Returns:
+            dict: 'queues' and 'stages' stats keyed by name.
+        """
+        stages = {'capture': self.capture.stats()}
+        stages.update({stage.name: stage.stats() for stage in self.stages})
+        return {
+            'queues': {queue.name: queue.stats() for queue in self.queues},
+            'stages': stages,
+        }
@@ -0,0 +1,182 @@
+import string
+
+# Plate formats per region and vehicle class: L is a letter, N a digit, anything else a separator written out as is
+PLATE_FORMATS = {
+    'default': {
+        'Car': ('LLL-NNN', 'LLL-NNNN'),
+        'Bus': ('LLL-NNN', 'LLL-NNNN'),
+        'Truck': ('LLL-NNN', 'LLL-NNNN'),
+        'MC': ('NNN-LLL',),
+        'Motorcycle': ('NNN-LLL',),
+    },
+}
+
+# Region whose formats plate_grammar uses
+PLATE_REGION = 'default'
+
+# Letters OCR confuses with digits, corrected in digit positions
+LETTER_TO_DIGIT = {
+    'O': '0', 'I': '1', 'Z': '2', 'J': '3',
+    'A': '4', 'S': '5', 'G': '6', 'T': '7',
+    'B': '8', 'Q': '0', 'D': '0',
+}
+
+# Digits OCR confuses with letters, corrected in letter positions
+DIGIT_TO_LETTER = {
+    '0': 'O', '1': 'I', '2': 'Z', '3': 'J',
+    '4': 'A', '5': 'S', '6': 'G', '7': 'T',
+    '8': 'B', '9': 'G',
+}
+
+
+# Upper-cases ASCII letters and deletes every other ASCII character but digits; clean_plate drops the rest
+CLEAN_TABLE = {code: (chr(code).upper() if chr(code) in string.ascii_letters + string.digits else None) for code in range(128)}
+TO_DIGIT_TABLE = str.maketrans(LETTER_TO_DIGIT)
+TO_LETTER_TABLE = str.maketrans(DIGIT_TO_LETTER)
+NO_FORMATS = {}
+
+
+def clean_plate(license_plate_text):
+    """
+    Upper-case a plate read and remove everything but letters and digits.
+
+    Args:
+        license_plate_text (str): Plate text.
+
+    Returns:
+        str: Cleaned text, ASCII only.
+    """
+    cleaned = license_plate_text.translate(CLEAN_TABLE)
+    if cleaned.isascii():
+        return cleaned
+    return ''.join(char for char in cleaned if char.isascii())
+
+
+def compile_format(pattern):
+    """
+    Compile a plate format into the runs ``PlateGrammar`` applies.
+
+    Args:
+        pattern (str): Format such as 'LLL-NNNN'.
+
+    Returns:
+        tuple: (length, runs), length being the number of plate characters and every run
+        (start, end, translate table, check, separator written after it) covering a
+        stretch of letters or digits of the cleaned text.
+    """
+    runs = []  # [kind, start, end, separator]
+    position = 0
+    for char in pattern:
+        if char in 'LN':
+            if runs and runs[-1][0] == char and not runs[-1][3]:
+                runs[-1][2] += 1
+            else:
+                runs.append([char, position, position + 1, ''])
+            position += 1
+        elif runs:
+            runs[-1][3] += char
+        else:
+            raise ValueError(f"Plate format {pattern!r} starts with a separator")
+    return position, tuple(
+        (start, end, TO_LETTER_TABLE, str.isalpha, separator) if kind == 'L' else (start, end, TO_DIGIT_TABLE, str.isdigit, separator)
+        for kind, start, end, separator in runs
+    )
+
+
+class PlateGrammar:
+    """
+    Plate formats compiled once into translate tables and per-position runs.
+
+    ``normalize`` cleans a read (upper case, letters and digits only), picks
+    the formats of its vehicle class with the read's length, corrects
+    confusable characters in every letter and digit run with one
+    ``str.translate`` each, checks the result and adds the separators, all in
+    one pass over the read.
+
+    Args:
+        formats (dict): Format patterns per vehicle class, e.g. ``PLATE_FORMATS['default']``.
+    """
+
+    def __init__(self, formats=PLATE_FORMATS[PLATE_REGION]):
+        self.formats = {}
+        any_class = {}
+        for vehicle_class, patterns in formats.items():
+            by_length = self.formats[vehicle_class] = {}
+            for pattern in patterns:
+                length, runs = compile_format(pattern)
+                by_length.setdefault(length, []).append(runs)
+                if runs not in any_class.setdefault(length, []):
+                    any_class[length].append(runs)
+        # Reads without a vehicle class are tried against the formats of every class
+        self.formats[None] = any_class
+
+    def normalize(self, license_plate_text, vehicle_class=None):
+        """
+        Clean, correct and validate a plate read.
+
+        Args:
+            license_plate_text (str): Plate text as read by OCR.
+            vehicle_class (str): Vehicle class the plate belongs to, None to try every format.
+
+        Returns:
+            tuple: (text, valid). text is formatted when a format of the class has the read's
+            length, else just cleaned; valid tells whether it fits a format after correction.
+        """
+        cleaned = clean_plate(license_plate_text)
+        candidates = self.formats.get(vehicle_class, NO_FORMATS).get(len(cleaned))
+        if not candidates:
+            return cleaned, False
+        first = None
+        for runs in candidates:
+            parts = []
+            valid = True
+            for start, end, table, check, separator in runs:
+                part = cleaned[start:end].translate(table)
+                valid = valid and check(part)
+                parts.append(part)
+                parts.append(separator)
+            text = ''.join(parts)
+            if valid:
+                return text, True
+            if first is None:
+                first = text
+        return first, False
+
+    def format(self, license_plate_text, vehicle_class=None):
+        """Normalized plate text, whether it is valid or not."""
+        return self.normalize(license_plate_text, vehicle_class)[0]
+
+    def normalize_many(self, license_plate_texts, vehicle_classes=None):
+        """
+        Normalize many reads, e.g. to re-normalize historical results.
+
+        Every distinct (text, class) pair is normalized once, reads of the same
+        plate repeat a lot.
+
+        Args:
+            license_plate_texts (iterable): Plate texts.
+            vehicle_classes (iterable): Vehicle class of every text, None for no classes.
+
+        Returns:
+            list: (text, valid) of every read, as ``normalize``.
+        """
+        normalize = self.normalize
+        seen = {}
+        results = []
+        append = results.append
+        if vehicle_classes is None:
+            for license_plate_text in license_plate_texts:
+                result = seen.get(license_plate_text)
+                if result is None:
+                    result = seen[license_plate_text] = normalize(license_plate_text)
+                append(result)
+            return results
+        for key in zip(license_plate_texts, vehicle_classes):
+            result = seen.get(key)
+            if result is None:
+                result = seen[key] = normalize(*key)
+            append(result)
+        return results
+
+
+plate_grammar = PlateGrammar()
@@ -0,0 +1,322 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from annotate import draw_annotations
+from buffers import release_frame
+from pipeline import QueueClosed, StageQueue
+
+# Most preview frames encoded per second
+PREVIEW_FPS = 15
+# JPEG quality of the preview, lowered towards PREVIEW_MIN_QUALITY while viewers fall behind
+PREVIEW_QUALITY = 80
+PREVIEW_MIN_QUALITY = 40
+# Lowest preview frame rate, reached when viewers still fall behind at the lowest quality
+PREVIEW_MIN_FPS = 2
+# Preview frames wider than this are scaled down before encoding
+PREVIEW_MAX_WIDTH = 1280
+
+PAGE = b"""<!doctype html>
+<html><head><title>License Plate Recognition</title></head>
+<body style="margin:0;background:#000"><img src="/stream.mjpg" style="width:100%"></body></html>
+"""
+
+
+class LatestFrame:
+    """
+    Single-slot mailbox between the recognition loop and a background consumer.
+
+    ``publish`` replaces whatever frame is waiting and never blocks, so a slow
+    consumer skips frames instead of queueing them.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.published = 0
+        self.closed = False
+
+    def publish(self, frame):
+        """Put a frame in the mailbox, returns the frame it replaced, None if it was empty."""
+        with self.condition:
+            replaced, self.frame = self.frame, frame
+            self.published += 1
+            self.condition.notify_all()
+            return replaced
+
+    def take(self, timeout=None):
+        """Take the waiting frame, None if none arrived within timeout or the mailbox is closed."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame is not None or self.closed, timeout)
+            frame, self.frame = self.frame, None
+            return frame
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class MJPEGServer:
+    """
+    Live preview of the annotated frames over HTTP as MJPEG, for any number of browsers.
+
+    A single encoder thread draws the annotations and encodes each preview
+    frame once; every viewer connection is sent the newest encoded frame.
+    Viewers that cannot keep up skip frames rather than queue them, and while
+    viewers are skipping, JPEG quality is lowered step by step, then the frame
+    rate; both are raised again once they keep up. The encoder only runs while
+    someone is watching, and at most ``max_fps`` times a second.
+
+    Pages: / (viewer page), /stream.mjpg (the stream), /snapshot.jpg (newest frame).
+
+    Args:
+        port (int): Port to listen on.
+        host (str): Address to bind.
+        max_fps (float): Most frames encoded per second.
+        quality (int): Starting and highest JPEG quality.
+        min_quality (int): Lowest JPEG quality.
+        max_width (int): Frames are scaled down to this width, None to keep their size.
+        conversion (int): cv2 color conversion from the pipeline's frames to BGR, None for none.
+    """
+
+    def __init__(self, port, host="0.0.0.0", max_fps=PREVIEW_FPS, quality=PREVIEW_QUALITY,
+                 min_quality=PREVIEW_MIN_QUALITY, max_width=PREVIEW_MAX_WIDTH, conversion=None):
+        self.max_fps = max_fps
+        self.fps = max_fps
+        self.max_quality = quality
+        self.quality = quality
+        self.min_quality = min_quality
+        self.max_width = max_width
+        self.conversion = conversion
+        self.frames = LatestFrame()
+        self.condition = threading.Condition()
+        self.jpeg = None
+        self.sequence = 0
+        self.viewers = 0
+        self.viewer_skips = 0
+        self.encoded = 0
+        self.encode_time = 0.0
+        self.stopped = threading.Event()
+
+        self.httpd = ThreadingHTTPServer((host, port), _PreviewHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.preview = self
+        self.threads = [
+            threading.Thread(target=self.httpd.serve_forever, name='preview-http', daemon=True),
+            threading.Thread(target=self._encode_loop, name='preview-encoder', daemon=True),
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def publish(self, frame):
+        """Offer a frame state from the pipeline, dropped at once if nobody is watching; its buffers are released when done."""
+        replaced = self.frames.publish(frame) if self.viewers else frame
+        if replaced is not None:
+            release_frame(replaced)
+
+    def _encode_loop(self):
+        last_encode = 0.0
+        while not self.stopped.is_set():
+            frame = self.frames.take(timeout=0.5)
+            if frame is None:
+                continue
+            # Frames arriving faster than the frame rate are left for the next round, only the newest is encoded
+            wait = last_encode + 1.0 / self.fps - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+                newer = self.frames.take(timeout=0)
+                if newer is not None:
+                    release_frame(frame)
+                    frame = newer
+            last_encode = time.monotonic()
+
+            img = draw_annotations(frame['img'], frame['vehicles'], frame['plates'], self.conversion)
+            release_frame(frame)
+            if self.max_width is not None and img.shape[1] > self.max_width:
+                scale = self.max_width / img.shape[1]
+                img = cv2.resize(img, (self.max_width, int(img.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            self.encode_time += time.monotonic() - last_encode
+            self.encoded += 1
+            with self.condition:
+                self.jpeg = encoded.tobytes()
+                self.sequence += 1
+                skips, self.viewer_skips = self.viewer_skips, 0
+                self.condition.notify_all()
+            self._adapt_quality(skips)
+
+    def _adapt_quality(self, skips):
+        if skips and self.quality > self.min_quality:
+            self.quality = max(self.min_quality, self.quality - 5)
+        elif skips:
+            self.fps = max(PREVIEW_MIN_FPS, self.fps * 0.8)
+        elif self.encoded % 30 == 0:
+            # Frame rate comes back first, then quality
+            if self.fps < self.max_fps:
+                self.fps = min(self.max_fps, self.fps * 1.25)
+            else:
+                self.quality = min(self.max_quality, self.quality + 5)
+
+    def next_jpeg(self, after, timeout=1.0):
+        """
+        Wait for an encoded frame newer than ``after``.
+
+        Returns:
+            tuple: (sequence, JPEG bytes), or (after, None) if none arrived within timeout.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.sequence > after or self.stopped.is_set(), timeout):
+                return after, None
+            if self.stopped.is_set():
+                return after, None
+            if after and self.sequence > after + 1:
+                self.viewer_skips += self.sequence - after - 1
+            return self.sequence, self.jpeg
+
+    def stop(self):
+        self.stopped.set()
+        self.frames.close()
+        with self.condition:
+            self.condition.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        return {
+            'viewers': self.viewers,
+            'encoded': self.encoded,
+            'quality': self.quality,
+            'fps': self.fps,
+            'encode_ms': self.encode_time / self.encoded * 1000 if self.encoded else 0.0,
+        }
+
+
+class _PreviewHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        preview = self.server.preview
+        if self.path == '/':
+            self._send(PAGE, 'text/html')
+        elif self.path == '/snapshot.jpg':
+            with preview.condition:
+                jpeg = preview.jpeg
+            if jpeg is None:
+                self.send_error(503, "No frame encoded yet")
+            else:
+                self._send(jpeg, 'image/jpeg')
+        elif self.path == '/stream.mjpg':
+            self._stream(preview)
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, preview):
+        self.send_response(200)
+        self.send_header('Cache-Control', 'no-cache, private')
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+        self.end_headers()
+        with preview.condition:
+            preview.viewers += 1
+        sequence = 0
+        try:
+            while not preview.stopped.is_set():
+                sequence, jpeg = preview.next_jpeg(sequence)
+                if jpeg is None:
+                    continue
+                self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(jpeg))
+                self.wfile.write(jpeg)
+                self.wfile.write(b'\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with preview.condition:
+                preview.viewers -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Recorder:
+    """
+    Annotated MP4 recording written by a background encoder thread.
+
+    Frames are handed over through a two-frame drop-oldest queue, so when the
+    encoder falls behind, frames are dropped from the recording instead of
+    slowing the recognition loop down.
+
+    Args:
+        path (str): Output .mp4 file.
+        fps (float): Frame rate written into the file.
+        conversion (int): cv2 color conversion from the pipeline's frames to BGR, None for none.
+        fourcc (str): Codec, 'mp4v' works with every OpenCV build.
+    """
+
+    def __init__(self, path, fps=PREVIEW_FPS, conversion=None, fourcc='mp4v'):
+        self.path = path
+        self.fps = fps
+        self.conversion = conversion
+        self.fourcc = fourcc
+        self.frames = StageQueue('recorder', maxsize=2, drop_oldest=True, on_drop=release_frame)
+        self.writer = None
+        self.frame_size = None
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, name='recorder', daemon=True)
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.thread.start()
+        return self
+
+    def publish(self, frame):
+        """Offer a frame state from the pipeline, its buffers are released when done."""
+        if not self.frames.put(frame):
+            release_frame(frame)
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        next_time = 0.0
+        while True:
+            try:
+                frame = self.frames.get()
+            except QueueClosed:
+                break
+            # Keep the file at about its nominal frame rate when frames come in faster
+            now = time.monotonic()
+            if now < next_time:
+                release_frame(frame)
+                continue
+            next_time = max(next_time + interval, now)
+
+            img = draw_annotations(frame['img'], frame['vehicles'], frame['plates'], self.conversion)
+            release_frame(frame)
+            if self.writer is None:
+                # The first frame fixes the video size
+                self.frame_size = (img.shape[1], img.shape[0])
+                self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.frame_size)
+            if (img.shape[1], img.shape[0]) != self.frame_size:
+                img = cv2.resize(img, self.frame_size)
+            self.writer.write(img)
+            self.written += 1
+        if self.writer is not None:
+            self.writer.release()
+
+    def stop(self, timeout=5.0):
+        self.frames.close()
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.frames.drops}
@@ -0,0 +1,237 @@
+import collections
+import itertools
+
+import cv2
+import numpy as np
+
+# Limits a crop has to pass to be OCR'd at all, and the values at which each quality component is perfect
+THRESHOLDS = {
+    'min_width': 40,  # pixels
+    'min_height': 12,  # pixels
+    'min_sharpness': 15.0,  # Laplacian variance at SHARPNESS_HEIGHT
+    'min_brightness': 35,  # mean gray level
+    'max_brightness': 225,
+    'min_contrast': 12.0,  # gray level standard deviation
+    'min_aspect': 1.2,  # width / height
+    'max_aspect': 7.0,
+    'good_width': 160,  # pixels
+    'good_sharpness': 250.0,
+    'good_contrast': 50.0,
+    'good_aspect': (2.0, 5.0),
+}
+
+# Crops are scaled to this height before measuring sharpness, so it does not depend on the plate's size
+SHARPNESS_HEIGHT = 48
+
+# Best crops kept per plate track
+TOP_K = 3
+
+# Crops of a new track collected before its best one is read first
+SELECT_WINDOW = 3
+
+# Quality gain over the last read crop of a track before a better crop is read again
+IMPROVE_MARGIN = 0.1
+
+
+def crop_quality(license_plate_crop, thresholds=THRESHOLDS):
+    """
+    Score how readable a license plate crop is likely to be, cheaply and without OCR.
+
+    Size, sharpness (Laplacian variance), exposure (brightness and contrast)
+    and aspect ratio are each scored 0-1 and combined by their geometric mean.
+
+    Args:
+        license_plate_crop (numpy.ndarray): BGR or grayscale crop.
+        thresholds (dict): Limits and reference values, see ``THRESHOLDS``.
+
+    Returns:
+        dict: 'score' 0-1, the measured 'width', 'height', 'sharpness', 'brightness',
+        'contrast' and 'aspect', and 'reject', the first limit the crop failed or None.
+    """
+    height, width = license_plate_crop.shape[:2]
+    quality = {'score': 0.0, 'width': width, 'height': height, 'reject': None}
+    if width < thresholds['min_width'] or height < thresholds['min_height']:
+        quality['reject'] = 'size'
+        return quality
+
+    aspect = width / height
+    quality['aspect'] = aspect
+    if not thresholds['min_aspect'] <= aspect <= thresholds['max_aspect']:
+        quality['reject'] = 'aspect'
+        return quality
+
+    gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY) if license_plate_crop.ndim == 3 else license_plate_crop
+    scaled = cv2.resize(gray, (max(1, int(round(aspect * SHARPNESS_HEIGHT))), SHARPNESS_HEIGHT), interpolation=cv2.INTER_AREA)
+    mean, std = cv2.meanStdDev(gray)
+    brightness, contrast = float(mean[0, 0]), float(std[0, 0])
+    sharpness = float(cv2.Laplacian(scaled, cv2.CV_32F).var())
+    quality.update(brightness=brightness, contrast=contrast, sharpness=sharpness)
+
+    if not thresholds['min_brightness'] <= brightness <= thresholds['max_brightness']:
+        quality['reject'] = 'exposure'
+        return quality
+    if contrast < thresholds['min_contrast']:
+        quality['reject'] = 'contrast'
+        return quality
+    if sharpness < thresholds['min_sharpness']:
+        quality['reject'] = 'sharpness'
+        return quality
+
+    low, high = thresholds['good_aspect']
+    components = (
+        min(1.0, width / thresholds['good_width']),
+        min(1.0, sharpness / thresholds['good_sharpness']),
+        min(1.0, contrast / thresholds['good_contrast']) * (1.0 - abs(brightness - 128.0) / 256.0),
+        1.0 if low <= aspect <= high else min(aspect / low, high / aspect),
+    )
+    quality['score'] = float(np.prod(components) ** (1.0 / len(components)))
+    return quality
+
+
+class CropSelector:
+    """
+    Keep the best few crops of every plate track and pick the ones worth OCR'ing.
+
+    Crops that fail a hard limit (too small, badly exposed, flat, blurred,
+    wrong shape) are never OCR'd. The others go into a small top-k buffer per
+    track. A new track's best crop is read once ``window`` crops were
+    collected; after that, a crop is only read again when the buffered best
+    beats the last read crop by ``improve_margin``. Tracks that end before
+    their first read are handed back by ``end_tracks`` for a last read. A
+    selected crop that could not be read is put back with ``unselect``.
+    Buffered crops are copies, the frames they were cut from are not kept.
+
+    Args:
+        top_k (int): Best crops kept per track.
+        window (int): Crops of a new track collected before its first read.
+        improve_margin (float): Quality gain needed to read a track again.
+        thresholds (dict): Overrides of ``THRESHOLDS``.
+    """
+
+    def __init__(self, top_k=TOP_K, window=SELECT_WINDOW, improve_margin=IMPROVE_MARGIN, thresholds=None):
+        self.top_k = top_k
+        self.window = window
+        self.improve_margin = improve_margin
+        self.thresholds = {**THRESHOLDS, **(thresholds or {})}
+        self.tracks = {}
+        self.order = itertools.count()
+        self.offered = 0
+        self.selected = 0
+        self.rejected = collections.Counter()
+
+    def offer(self, lp_track_id, license_plate_crop, candidate=None, ready=True, more_reads=False):
+        """
+        Offer a crop of a track.
+
+        Args:
+            lp_track_id (int): License plate track ID.
+            license_plate_crop (numpy.ndarray): The crop.
+            candidate (object): Returned with the crop when it is selected, e.g. the plate candidate.
+            ready (bool): Whether a crop may be selected now, False only buffers it.
+            more_reads (bool): The caller wants further reads of the track, e.g. to vote on
+                its plate: the best of every ``window`` crops is selected, better or not.
+
+        Returns:
+            tuple: (crop, candidate, quality) of the crop to OCR now, None if nothing should be read.
+        """
+        self.offered += 1
+        quality = crop_quality(license_plate_crop, self.thresholds)
+        if quality['reject'] is not None:
+            self.rejected[quality['reject']] += 1
+            return None
+
+        lp_track_id = int(lp_track_id)
+        track = self.tracks.get(lp_track_id)
+        if track is None:
+            track = self.tracks[lp_track_id] = {'buffer': [], 'offers': 0, 'read_score': None}
+        track['offers'] += 1
+        # Copied, so a buffered crop does not keep its whole frame alive; the counter breaks
+        # score ties, so crops and candidates are never compared
+        track['buffer'].append((quality['score'], next(self.order), license_plate_crop.copy(), candidate, quality))
+        track['buffer'].sort(key=lambda entry: entry[:2], reverse=True)
+        del track['buffer'][self.top_k:]
+
+        best_score = track['buffer'][0][0]
+        if not ready:
+            return None
+        if track['read_score'] is None or more_reads:
+            if track['offers'] < self.window:
+                return None
+        elif best_score < track['read_score'] + self.improve_margin:
+            return None
+        return self._select(track)
+
+    def _select(self, track):
+        score, _, license_plate_crop, candidate, quality = track['buffer'][0]
+        # Restored by unselect if the crop cannot be read
+        track['previous'] = (track['read_score'], track['offers'])
+        track['read_score'] = score
+        track['buffer'].clear()
+        track['offers'] = 0
+        self.selected += 1
+        return license_plate_crop, candidate, quality
+
+    def unselect(self, lp_track_id, selection):
+        """
+        Put back a selected crop that could not be read, e.g. because the OCR pool was full.
+
+        The track is as it was before the selection, so the crop is selected
+        again the next time; an ended track is kept until ``end_tracks`` hands
+        it back once more.
+
+        Args:
+            lp_track_id (int): License plate track ID.
+            selection (tuple): (crop, candidate, quality) as returned by ``offer`` or ``end_tracks``.
+        """
+        license_plate_crop, candidate, quality = selection
+        lp_track_id = int(lp_track_id)
+        track = self.tracks.get(lp_track_id)
+        if track is None:
+            track = self.tracks[lp_track_id] = {'buffer': [], 'offers': 0, 'read_score': None}
+        else:
+            track['read_score'], track['offers'] = track.pop('previous', (track['read_score'], track['offers']))
+        track['buffer'].append((quality['score'], next(self.order), license_plate_crop, candidate, quality))
+        track['buffer'].sort(key=lambda entry: entry[:2], reverse=True)
+        del track['buffer'][self.top_k:]
+        self.selected -= 1
+
+    def track_ids(self):
+        """Get the tracks the selector still buffers crops of, ended tracks waiting for their last read included."""
+        return set(self.tracks)
+
+    def end_tracks(self, active_track_ids):
+        """
+        Forget tracks that ended.
+
+        Args:
+            active_track_ids (set): Track IDs still kept by the tracker, None to end nothing.
+
+        Returns:
+            list: (crop, candidate, quality) of the best crop of every ended track that was never read.
+        """
+        if active_track_ids is None:
+            return []
+        last_reads = []
+        for lp_track_id in [lp_track_id for lp_track_id in self.tracks if lp_track_id not in active_track_ids]:
+            track = self.tracks.pop(lp_track_id)
+            if track['read_score'] is None and track['buffer']:
+                last_reads.append(self._select(track))
+        return last_reads
+
+    def stats(self):
+        """
+        Get the selector counters.
+
+        Returns:
+            dict: Crops offered, rejected per failed limit, selected for OCR, OCR calls
+            avoided and their share, and tracks followed.
+        """
+        avoided = self.offered - self.selected
+        return {
+            'offered': self.offered,
+            'rejected': dict(self.rejected),
+            'selected': self.selected,
+            'ocr_avoided': avoided,
+            'avoided_ratio': avoided / self.offered if self.offered else 0.0,
+            'tracks': len(self.tracks),
+        }
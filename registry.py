@@ -0,0 +1,162 @@
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backends import load_reader, load_yolo, pick_backend
+from ocr import read_license_plates
+
+
+class ModelRegistry:
+    """
+    Loads every model exactly once, on first use or ahead of time in the background.
+
+    Models are registered by name with a loader and a warm-up. ``preload``
+    starts loading them concurrently, so model loading overlaps with opening
+    the camera; ``get`` returns a model, loading it first if nobody asked for it
+    yet, and waits if it is still loading. Each model gets a warm-up inference
+    on a dummy input right after loading, so the first real frame does not pay
+    for lazy initialization.
+
+    Args:
+        backend (str): Inference backend for ``backends.load_yolo``/``load_reader``, or 'auto'.
+        int8 (bool): Use INT8 models on the onnx/openvino backends.
+        warmup (bool): Run the warm-up inferences.
+        workers (int): Models loaded at the same time.
+    """
+
+    def __init__(self, backend='auto', int8=False, warmup=True, workers=3):
+        self.backend = backend
+        self.int8 = int8
+        self.warmup = warmup
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='model-loader')
+        self.lock = threading.Lock()
+        self.specs = {}
+        self.futures = {}
+        self.timings = {}
+        self.phases = {}
+        self.marks = {}
+        self.created_at = time.perf_counter()
+
+    def register(self, name, loader, warmup=None):
+        """
+        Register a model.
+
+        Args:
+            name (str): Name the model is fetched by.
+            loader (callable): Returns the loaded model.
+            warmup (callable): Runs a dummy inference on the loaded model, None for no warm-up.
+        """
+        with self.lock:
+            if name in self.specs:
+                raise ValueError(f"Model {name} is already registered")
+            self.specs[name] = (loader, warmup)
+
+    def register_yolo(self, name, weights, warmup_sizes=((640, 1),)):
+        """
+        Register a YOLO model.
+
+        Args:
+            name (str): Name the model is fetched by.
+            weights (str): Path to the .pt weights.
+            warmup_sizes (tuple): (imgsz, batch size) of every warm-up inference, one per input shape the model will see.
+        """
+        def warmup(model):
+            for imgsz, batch in warmup_sizes:
+                model.predict([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)] * batch, imgsz=imgsz, verbose=False)
+
+        self.register(name, lambda: load_yolo(weights, self.backend, int8=self.int8), warmup)
+
+    def register_reader(self, name, languages=('en',)):
+        """
+        Register an EasyOCR reader.
+
+        Args:
+            name (str): Name the reader is fetched by.
+            languages (tuple): EasyOCR languages.
+        """
+        def warmup(reader):
+            read_license_plates(reader, [np.full((40, 150, 3), 255, dtype=np.uint8)])
+
+        self.register(name, lambda: load_reader(self.backend, languages, int8=self.int8), warmup)
+
+    def _load(self, name):
+        loader, warmup = self.specs[name]
+        start_time = time.perf_counter()
+        model = loader()
+        loaded_time = time.perf_counter()
+        if self.warmup and warmup is not None:
+            warmup(model)
+        self.timings[name] = {'load': loaded_time - start_time, 'warmup': time.perf_counter() - loaded_time}
+        return model
+
+    def _future(self, name):
+        with self.lock:
+            if name not in self.specs:
+                raise KeyError(f"Model {name} is not registered")
+            if name not in self.futures:
+                self.futures[name] = self.executor.submit(self._load, name)
+            return self.futures[name]
+
+    def preload(self, *names):
+        """
+        Start loading models in the background.
+
+        Args:
+            *names (str): Models to load, all registered models if none are given.
+        """
+        for name in names or list(self.specs):
+            self._future(name)
+
+    def get(self, name):
+        """
+        Get a model, loading it first if needed.
+
+        Args:
+            name (str): Registered model name.
+
+        Returns:
+            object: The loaded, warmed-up model.
+        """
+        return self._future(name).result()
+
+    def wait(self):
+        """Wait for every model that is loading, raising the first loading error."""
+        with self.lock:
+            futures = list(self.futures.values())
+        for future in futures:
+            future.result()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a startup phase, e.g. ``with registry.phase('camera'): ...``."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start_time
+
+    def mark(self, name):
+        """Record the seconds from creating the registry to now, e.g. for the first shown frame."""
+        self.marks.setdefault(name, time.perf_counter() - self.created_at)
+
+    def startup_report(self):
+        """
+        Get the startup timing breakdown.
+
+        Returns:
+            dict: Resolved backend, per-model load and warm-up seconds, timed phases,
+            marks and seconds since the registry was created.
+        """
+        return {
+            'backend': pick_backend(self.backend),
+            'models': dict(self.timings),
+            'phases': dict(self.phases),
+            'marks': dict(self.marks),
+            'total': time.perf_counter() - self.created_at,
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
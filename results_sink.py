@@ -0,0 +1,207 @@
+import csv
+import datetime
+import os
+import threading
+import time
+
+from util import RESULT_FIELDNAMES, HighestScores, result_rows
+
+# Rows buffered before they are written out
+FLUSH_ROWS = 256
+
+# Seconds buffered rows may wait before they are written out
+FLUSH_INTERVAL = 1.0
+
+# A results file is rotated once it grows past this size (bytes) or age (seconds)
+ROTATE_BYTES = 64 * 1024 * 1024
+ROTATE_AGE = 24 * 60 * 60
+
+
+class ResultsBackend:
+    """
+    Destination for result rows.
+
+    Rows are dicts keyed by util.RESULT_FIELDNAMES. ``write_rows`` is always
+    called from one thread at a time.
+    """
+
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def mark(self):
+        """
+        Get a position ``rollback`` can return to, saved before writing rows that may have to be written again.
+
+        Returns:
+            object: JSON-serializable position, None if the backend cannot roll back.
+        """
+        return None
+
+    def rollback(self, mark):
+        """Remove every row written after ``mark``, e.g. the rows of a write interrupted before it was checkpointed."""
+
+    def close(self):
+        self.flush()
+
+
+class CSVBackend(ResultsBackend):
+    """
+    Append rows to a CSV file through one long-lived file handle.
+
+    The file is rotated to ``<name>-<timestamp>.csv`` when it passes
+    ``max_bytes`` or has been open for ``max_age`` seconds, and a new file with
+    a header row is started.
+
+    Args:
+        output_path (str): Path to the CSV file.
+        max_bytes (int): Size at which the file is rotated, None to never rotate on size.
+        max_age (float): Age in seconds at which the file is rotated, None to never rotate on age.
+    """
+
+    def __init__(self, output_path, max_bytes=ROTATE_BYTES, max_age=ROTATE_AGE):
+        self.output_path = output_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.rotations = 0
+        self._open()
+
+    def _open(self):
+        is_existing_file = os.path.exists(self.output_path) and os.path.getsize(self.output_path) > 0
+        self.csvfile = open(self.output_path, mode='a', newline='')
+        self.writer = csv.DictWriter(self.csvfile, fieldnames=RESULT_FIELDNAMES)
+        if not is_existing_file:
+            self.writer.writeheader()
+        self.opened_at = time.monotonic()
+
+    def _rotate(self):
+        self.csvfile.close()
+        root, ext = os.path.splitext(self.output_path)
+        rotated_path = f"{root}-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}"
+        os.replace(self.output_path, rotated_path)
+        self.rotations += 1
+        self._open()
+
+    def _rotate_if_due(self):
+        too_big = self.max_bytes is not None and self.csvfile.tell() >= self.max_bytes
+        too_old = self.max_age is not None and time.monotonic() - self.opened_at >= self.max_age
+        if too_big or too_old:
+            self._rotate()
+
+    def write_rows(self, rows):
+        self._rotate_if_due()
+        self.writer.writerows(rows)
+
+    def flush(self):
+        self.csvfile.flush()
+
+    def mark(self):
+        # A rotation that is due happens now, so the rows after the mark stay in one file
+        self._rotate_if_due()
+        self.csvfile.flush()
+        return {'inode': os.fstat(self.csvfile.fileno()).st_ino, 'size': self.csvfile.tell()}
+
+    def rollback(self, mark):
+        self.csvfile.flush()
+        if os.fstat(self.csvfile.fileno()).st_ino != mark['inode']:
+            # Rotated since the mark, the rows went partly to the rotated file
+            print(f"Cannot roll {self.output_path} back, it was rotated since the mark")
+            return
+        self.csvfile.truncate(mark['size'])
+        self.csvfile.seek(0, os.SEEK_END)
+
+    def close(self):
+        self.csvfile.close()
+
+
+class ResultsSink:
+    """
+    Buffered, append-only writer for recognition results.
+
+    Rows are buffered and handed to the backend in batches, when
+    ``flush_rows`` rows are waiting or ``flush_interval`` seconds have passed,
+    whichever comes first. A read is only written if it beats earlier reads of
+    the same plate on the same vehicle track, so later sightings of a car are
+    kept; that check remembers a bounded number of plates and is turned off for
+    callers that already write one read per vehicle.
+
+    Args:
+        backend (ResultsBackend): Where the rows go.
+        flush_rows (int): Buffered rows that trigger a write.
+        flush_interval (float): Seconds after which buffered rows are written anyway.
+        max_tracked_plates (int): Plates the duplicate check remembers, None to write every read.
+    """
+
+    def __init__(self, backend, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL, max_tracked_plates=10000):
+        self.backend = backend
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.lp_scores = HighestScores(max_tracked_plates) if max_tracked_plates is not None else None
+        self.buffer = []
+        self.lock = threading.Lock()
+        # Backend writes happen under their own lock so producers only wait for the buffer swap
+        self.write_lock = threading.Lock()
+        self.received = 0
+        self.duplicates = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_periodically, name='results-sink', daemon=True)
+        self.flusher.start()
+
+    def write(self, results):
+        """
+        Queue the reads of a results dictionary, in the format ``util.write_csv`` takes.
+
+        Args:
+            results (dict): Dictionary containing the results.
+        """
+        with self.lock:
+            rows = list(result_rows(results, self.lp_scores))
+            self.received += len(results)
+            self.duplicates += len(results) - len(rows)
+            self.buffer.extend(rows)
+            full = len(self.buffer) >= self.flush_rows
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Hand every buffered row to the backend."""
+        with self.write_lock:
+            with self.lock:
+                rows, self.buffer = self.buffer, []
+            if len(rows) == 0:
+                return
+            self.backend.write_rows(rows)
+            self.backend.flush()
+            self.rows_written += len(rows)
+            self.flushes += 1
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Write what is buffered and close the backend."""
+        self.closed.set()
+        self.flusher.join()
+        self.flush()
+        self.backend.close()
+
+    def stats(self):
+        """
+        Get the sink counters.
+
+        Returns:
+            dict: Reads received, duplicates skipped, rows written, backend flushes and rows buffered.
+        """
+        with self.lock:
+            return {
+                'received': self.received,
+                'duplicates': self.duplicates,
+                'rows_written': self.rows_written,
+                'flushes': self.flushes,
+                'buffered': len(self.buffer),
+            }
@@ -0,0 +1,276 @@
+import argparse
+import datetime
+import os
+import sqlite3
+
+from plate_format import clean_plate
+from results_sink import ResultsBackend
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet archival is optional
+    pa = ds = pq = None
+
+# Format of the Timestamp column written by util.result_rows
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Columns of the sightings table, in the order they are inserted
+COLUMNS = [
+    'timestamp', 'camera', 'vehicle_id', 'vehicle_class', 'vehicle_img',
+    'lp_id', 'lp_img', 'plate', 'plate_key', 'lp_score', 'inference_time',
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sightings (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    vehicle_id INTEGER,
+    vehicle_class TEXT,
+    vehicle_img TEXT,
+    lp_id INTEGER,
+    lp_img TEXT,
+    plate TEXT,
+    plate_key TEXT,
+    lp_score REAL,
+    inference_time REAL
+);
+CREATE INDEX IF NOT EXISTS sightings_plate_key_timestamp ON sightings (plate_key, timestamp);
+CREATE INDEX IF NOT EXISTS sightings_timestamp ON sightings (timestamp);
+CREATE INDEX IF NOT EXISTS sightings_camera_timestamp ON sightings (camera, timestamp);
+"""
+
+ARCHIVE_SCHEMA = None if pa is None else pa.schema([
+    ('timestamp', pa.string()), ('camera', pa.string()), ('vehicle_id', pa.int64()),
+    ('vehicle_class', pa.string()), ('vehicle_img', pa.string()), ('lp_id', pa.int64()),
+    ('lp_img', pa.string()), ('plate', pa.string()), ('plate_key', pa.string()),
+    ('lp_score', pa.float64()), ('inference_time', pa.float64()),
+])
+
+
+def plate_key(plate):
+    """
+    Normalize plate text for lookups, so "abc 1234", "ABC1234" and "ABC-1234" are the same plate.
+
+    Args:
+        plate (str): License plate text.
+
+    Returns:
+        str: Upper-case plate text with everything but letters and digits removed.
+    """
+    return clean_plate(str(plate))
+
+
+def _number(value, cast):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def connect(db_path):
+    """
+    Open the results database in WAL mode, so readers never block the writer.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+
+    Returns:
+        sqlite3.Connection: Connection with the schema in place.
+    """
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+class SQLiteBackend(ResultsBackend):
+    """
+    Results backend that inserts rows into an indexed SQLite database.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        camera (str): Camera name stored with every row.
+    """
+
+    def __init__(self, db_path, camera='default'):
+        self.db_path = db_path
+        self.camera = camera
+        self.connection = connect(db_path)
+
+    def write_rows(self, rows):
+        values = [
+            (
+                row['Timestamp'],
+                self.camera,
+                _number(row['Vehicle ID'], int),
+                row['Vehicle Class'],
+                row['Vehicle Image'],
+                _number(row['License Plate ID'], int),
+                row['LP Image Path'],
+                row['License Plate Number'],
+                plate_key(row['License Plate Number']),
+                _number(row['LP Score'], float),
+                _number(row['Inference Time'], float),
+            )
+            for row in rows
+        ]
+        # One transaction per batch
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO sightings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", values
+            )
+
+    def mark(self):
+        return self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM sightings").fetchone()[0]
+
+    def rollback(self, mark):
+        # Only this camera's rows, other writers may share the database
+        with self.connection:
+            self.connection.execute("DELETE FROM sightings WHERE id > ? AND camera = ?", (mark, self.camera))
+
+    def close(self):
+        self.connection.close()
+
+
+class ResultsStore:
+    """
+    Query interface over the live SQLite store and its Parquet archive.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        archive_dir (str): Directory with archived Parquet segments, None to only query the live store.
+    """
+
+    def __init__(self, db_path, archive_dir=None):
+        self.connection = connect(db_path)
+        self.archive_dir = archive_dir
+
+    def find_plate(self, plate, since=None, until=None, camera=None, include_archive=False):
+        """
+        Find all sightings of a plate.
+
+        Args:
+            plate (str): License plate text, matched after normalizing with ``plate_key``.
+            since (datetime.datetime): Earliest sighting, None for no lower bound.
+            until (datetime.datetime): Latest sighting, None for no upper bound.
+            camera (str): Only sightings of this camera, None for all cameras.
+            include_archive (bool): Also search the Parquet archive.
+
+        Returns:
+            list: Sightings as dicts, oldest first.
+        """
+        conditions, params = ["plate_key = ?"], [plate_key(plate)]
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since.strftime(TIMESTAMP_FORMAT))
+        if until is not None:
+            conditions.append("timestamp <= ?")
+            params.append(until.strftime(TIMESTAMP_FORMAT))
+        if camera is not None:
+            conditions.append("camera = ?")
+            params.append(camera)
+
+        rows = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM sightings WHERE {' AND '.join(conditions)} ORDER BY timestamp", params
+        ).fetchall()
+        sightings = [dict(row) for row in rows]
+
+        if include_archive and self.archive_dir is not None:
+            sightings = self._find_archived(plate, since, until, camera) + sightings
+        return sightings
+
+    def _find_archived(self, plate, since, until, camera):
+        if pq is None:
+            raise ImportError("Searching the Parquet archive requires pyarrow: pip install pyarrow")
+        if not os.path.isdir(self.archive_dir) or not os.listdir(self.archive_dir):
+            return []
+
+        dataset = ds.dataset(self.archive_dir, format='parquet')
+        expression = ds.field('plate_key') == plate_key(plate)
+        if since is not None:
+            expression &= ds.field('timestamp') >= since.strftime(TIMESTAMP_FORMAT)
+        if until is not None:
+            expression &= ds.field('timestamp') <= until.strftime(TIMESTAMP_FORMAT)
+        if camera is not None:
+            expression &= ds.field('camera') == camera
+        sightings = dataset.to_table(columns=COLUMNS, filter=expression).to_pylist()
+        return sorted(sightings, key=lambda sighting: sighting['timestamp'])
+
+    def archive(self, archive_dir, older_than, batch_rows=1_000_000):
+        """
+        Move sightings older than a cutoff into a compressed Parquet segment.
+
+        Rows are sorted by plate_key inside the segment so plate lookups can
+        skip row groups using the Parquet statistics.
+
+        Args:
+            archive_dir (str): Directory the segment is written to.
+            older_than (datetime.datetime): Sightings before this time are archived.
+            batch_rows (int): Rows per Parquet row group.
+
+        Returns:
+            int: Number of archived sightings.
+        """
+        if pq is None:
+            raise ImportError("Archiving to Parquet requires pyarrow: pip install pyarrow")
+
+        cutoff = older_than.strftime(TIMESTAMP_FORMAT)
+        max_id = self.connection.execute("SELECT MAX(id) FROM sightings WHERE timestamp < ?", (cutoff,)).fetchone()[0]
+        if max_id is None:
+            return 0
+
+        os.makedirs(archive_dir, exist_ok=True)
+        # Named by time and last row id, and created exclusively, so no segment ever overwrites another
+        segment_path = os.path.join(
+            archive_dir, f"sightings-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{max_id}.parquet"
+        )
+        cursor = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM sightings WHERE timestamp < ? AND id <= ? ORDER BY plate_key, timestamp",
+            (cutoff, max_id),
+        )
+
+        # Streamed one row group at a time, so archiving tens of millions of rows stays within memory
+        archived = 0
+        with open(segment_path, 'xb') as segment_file, pq.ParquetWriter(segment_file, ARCHIVE_SCHEMA, compression='zstd') as writer:
+            while True:
+                rows = cursor.fetchmany(batch_rows)
+                if len(rows) == 0:
+                    break
+                columns = {column: [row[column] for row in rows] for column in COLUMNS}
+                writer.write_table(pa.Table.from_pydict(columns, schema=ARCHIVE_SCHEMA))
+                archived += len(rows)
+
+        # Only delete once the segment is safely on disk, and only the rows that went into it
+        with self.connection:
+            self.connection.execute("DELETE FROM sightings WHERE timestamp < ? AND id <= ?", (cutoff, max_id))
+        return archived
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search recognized plates or archive old sightings.")
+    parser.add_argument("--db", default="./results/LPR_results.db", help="SQLite results database")
+    parser.add_argument("--archive-dir", default="./results/archive", help="directory with Parquet segments")
+    parser.add_argument("--plate", help="plate to search for")
+    parser.add_argument("--hours", type=float, help="only sightings of the last N hours")
+    parser.add_argument("--camera", help="only sightings of this camera")
+    parser.add_argument("--include-archive", action="store_true", help="also search the Parquet archive")
+    parser.add_argument("--archive-days", type=float, help="move sightings older than N days to Parquet")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db, args.archive_dir)
+    if args.archive_days is not None:
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=args.archive_days)
+        print(f"Archived {store.archive(args.archive_dir, cutoff)} sightings")
+    if args.plate is not None:
+        since = None if args.hours is None else datetime.datetime.now() - datetime.timedelta(hours=args.hours)
+        for sighting in store.find_plate(args.plate, since=since, camera=args.camera, include_archive=args.include_archive):
+            print(sighting)
+    store.close()
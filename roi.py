@@ -0,0 +1,180 @@
+import cv2
+import numpy as np
+
+# Side of the square canvas every vehicle ROI is letterboxed into
+ROI_SIZE = 320
+
+# Padding added around each vehicle box, as a fraction of its width and height
+ROI_PADDING = 0.1
+
+# IoU above which plate boxes found in overlapping ROIs count as the same plate
+ROI_NMS_IOU = 0.5
+
+
+def vehicle_rois(vehicle_xyxy, frame_shape, padding=ROI_PADDING):
+    """
+    Pad vehicle boxes and clip them to the frame.
+
+    Args:
+        vehicle_xyxy (numpy.ndarray): Vx4 vehicle boxes.
+        frame_shape (tuple): Shape of the frame the boxes are in.
+        padding (float): Padding as a fraction of the box width and height.
+
+    Returns:
+        numpy.ndarray: Vx4 integer ROIs, empty ROIs removed.
+    """
+    height, width = frame_shape[:2]
+    box_size = vehicle_xyxy[:, 2:4] - vehicle_xyxy[:, 0:2]
+    rois = np.concatenate([vehicle_xyxy[:, 0:2] - box_size*padding, vehicle_xyxy[:, 2:4] + box_size*padding], axis=1)
+    rois = np.clip(np.round(rois), 0, [width, height, width, height]).astype(int)
+    return rois[(rois[:, 2] > rois[:, 0]) & (rois[:, 3] > rois[:, 1])]
+
+
+def letterbox(crop, size=ROI_SIZE):
+    """
+    Resize a crop into a square canvas, keeping its aspect ratio and padding the rest.
+
+    Args:
+        crop (numpy.ndarray): BGR crop.
+        size (int): Side of the canvas.
+
+    Returns:
+        tuple: Canvas, scale factor applied to the crop and (x, y) offset of the crop in the canvas.
+    """
+    crop_height, crop_width = crop.shape[:2]
+    scale = min(size / crop_width, size / crop_height)
+    resized_width, resized_height = max(1, int(round(crop_width*scale))), max(1, int(round(crop_height*scale)))
+
+    # Same grey padding YOLO uses for its own letterboxing
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    pad_x, pad_y = (size - resized_width) // 2, (size - resized_height) // 2
+    canvas[pad_y:pad_y + resized_height, pad_x:pad_x + resized_width] = cv2.resize(crop, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, (pad_x, pad_y)
+
+
+def nms(detections, iou_threshold=ROI_NMS_IOU):
+    """
+    Remove duplicate boxes, keeping the highest scoring one.
+
+    Args:
+        detections (numpy.ndarray): Nx6 array of x1, y1, x2, y2, score, class_id.
+        iou_threshold (float): IoU above which two boxes are duplicates.
+
+    Returns:
+        numpy.ndarray: Remaining detections.
+    """
+    if len(detections) < 2:
+        return detections
+
+    detections = detections[np.argsort(-detections[:, 4])]
+    x1, y1, x2, y2 = detections[:, 0], detections[:, 1], detections[:, 2], detections[:, 3]
+    ix1, iy1 = np.maximum(x1[:, None], x1[None, :]), np.maximum(y1[:, None], y1[None, :])
+    ix2, iy2 = np.minimum(x2[:, None], x2[None, :]), np.minimum(y2[:, None], y2[None, :])
+    intersection = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area = (x2 - x1) * (y2 - y1)
+    iou = intersection / np.maximum(area[:, None] + area[None, :] - intersection, 1e-6)
+
+    keep = np.ones(len(detections), dtype=bool)
+    for i in range(len(detections)):
+        if keep[i]:
+            keep[i + 1:] &= iou[i, i + 1:] <= iou_threshold
+    return detections[keep]
+
+
+def source_crop(source, xyxy, working_shape, conversion=None):
+    """
+    Crop a box found on a downscaled working frame from the full-resolution source frame.
+
+    Args:
+        source (numpy.ndarray): Full-resolution frame the working frame was resized from.
+        xyxy (list): x1, y1, x2, y2 in working frame coordinates.
+        working_shape (tuple): Shape of the working frame.
+        conversion (int): cv2 color conversion applied to the crop, so it matches
+            the working frame's channel order. None for no conversion.
+
+    Returns:
+        numpy.ndarray: Crop of the source frame, empty if the box is outside it.
+    """
+    height, width = source.shape[:2]
+    scale_x, scale_y = width / working_shape[1], height / working_shape[0]
+    x1, y1, x2, y2 = xyxy[:4]
+    x1, x2 = (int(np.clip(round(x * scale_x), 0, width)) for x in (x1, x2))
+    y1, y2 = (int(np.clip(round(y * scale_y), 0, height)) for y in (y1, y2))
+    crop = source[y1:y2, x1:x2]
+    if conversion is not None and crop.size != 0:
+        crop = cv2.cvtColor(crop, conversion)
+    return crop
+
+
+def prepare_rois(img, vehicle_xyxy, size=ROI_SIZE, padding=ROI_PADDING):
+    """
+    Crop and letterbox the padded vehicle ROIs of a frame.
+
+    Args:
+        img (numpy.ndarray): BGR frame.
+        vehicle_xyxy (numpy.ndarray): Vx4 vehicle boxes in frame coordinates.
+        size (int): Side of the square each ROI is letterboxed into.
+        padding (float): Padding around each vehicle box.
+
+    Returns:
+        tuple: List of canvases and, for each, the (scale, pad_x, pad_y, x1, y1) that maps it back to the frame.
+    """
+    canvases, transforms = [], []
+    for x1, y1, x2, y2 in vehicle_rois(vehicle_xyxy, img.shape, padding).tolist():
+        canvas, scale, (pad_x, pad_y) = letterbox(img[y1:y2, x1:x2], size)
+        canvases.append(canvas)
+        transforms.append((scale, pad_x, pad_y, x1, y1))
+    return canvases, transforms
+
+
+def roi_detections_to_frame(results, transforms):
+    """
+    Map the plate detector's results on ROI canvases back to frame coordinates and merge them.
+
+    Args:
+        results (list): ultralytics results, one per canvas.
+        transforms (list): (scale, pad_x, pad_y, x1, y1) of every canvas, from ``prepare_rois``.
+
+    Returns:
+        numpy.ndarray: Nx6 array of x1, y1, x2, y2, score, class_id in frame coordinates.
+    """
+    detections = [np.empty((0, 6), dtype=np.float32)]
+    for result, (scale, pad_x, pad_y, x1, y1) in zip(results, transforms):
+        roi_detections = result.boxes.data.cpu().numpy()[:, :6].astype(np.float32)
+        roi_detections[:, [0, 2]] = (roi_detections[:, [0, 2]] - pad_x) / scale + x1
+        roi_detections[:, [1, 3]] = (roi_detections[:, [1, 3]] - pad_y) / scale + y1
+        detections.append(roi_detections)
+    return nms(np.concatenate(detections, axis=0))
+
+
+def detect_plates_in_rois(model, img, vehicle_xyxy, size=ROI_SIZE, padding=ROI_PADDING, **predict_args):
+    """
+    Run the plate detector once on a batch of letterboxed vehicle ROIs.
+
+    When the ROIs together would hold more pixels than the full frame at the
+    same scale, the detector runs on the full frame instead.
+
+    Args:
+        model (ultralytics.YOLO): License plate detector.
+        img (numpy.ndarray): BGR frame.
+        vehicle_xyxy (numpy.ndarray): Vx4 vehicle boxes in frame coordinates.
+        size (int): Side of the square each ROI is letterboxed into.
+        padding (float): Padding around each vehicle box.
+        **predict_args: Extra arguments for ``model.predict``.
+
+    Returns:
+        tuple: Nx6 array of x1, y1, x2, y2, score, class_id in frame coordinates, and
+        the number of pixels the detector processed.
+    """
+    roi_count = len(vehicle_rois(vehicle_xyxy, img.shape, padding))
+    if roi_count == 0:
+        return np.empty((0, 6), dtype=np.float32), 0
+
+    frame_pixels = img.shape[0]*img.shape[1]
+    if roi_count*size*size >= frame_pixels:
+        detections = model.predict(img, verbose=False, **predict_args)[0].boxes.data.cpu().numpy()
+        return detections.astype(np.float32), frame_pixels
+
+    canvases, transforms = prepare_rois(img, vehicle_xyxy, size, padding)
+    batch_results = model.predict(canvases, imgsz=size, verbose=False, **predict_args)
+    return roi_detections_to_frame(batch_results, transforms), len(canvases)*size*size
@@ -0,0 +1,138 @@
+import collections
+import threading
+
+import numpy as np
+
+# End-to-end latency (seconds) the scheduler steers towards
+TARGET_LATENCY = 0.25
+
+# Degradation levels, cheapest last: (detection stride, detector input size, OCR stride)
+SCHEDULE_LEVELS = [
+    (1, 640, 1),
+    (2, 640, 1),
+    (2, 512, 1),
+    (3, 512, 2),
+    (3, 416, 2),
+    (4, 320, 3),
+    (6, 320, 4),
+]
+
+# Latencies kept for the percentiles
+LATENCY_WINDOW = 120
+
+# Frames measured before the level is reconsidered
+ADAPT_EVERY = 30
+
+# The level is only raised again when the p90 latency is below this fraction of the target
+UPGRADE_HEADROOM = 0.6
+
+
+class AdaptiveScheduler:
+    """
+    Decide per frame how much work to spend on it, so latency stays near a target.
+
+    The scheduler walks a ladder of levels, each a detection stride, a detector
+    input size and an OCR stride. After every ``adapt_every`` measured frames
+    it moves one level down the ladder when the p90 end-to-end latency is over
+    the target, and one level up when it is comfortably below it. Frames that
+    skip detection should still be shown to the tracker (``tracking.age_tracker``)
+    so lost tracks expire on time.
+
+    ``plan`` is called by the thread that reads frames and ``record`` by the
+    one that finishes them, so both are guarded by a lock.
+
+    Args:
+        target_latency (float): End-to-end latency to steer towards, in seconds.
+        levels (list): (detection stride, detector input size, OCR stride) per level, most expensive first.
+        window (int): Latencies kept for the percentiles.
+        adapt_every (int): Frames measured between level changes.
+        headroom (float): Fraction of the target the p90 has to be below to raise the level.
+    """
+
+    def __init__(self, target_latency=TARGET_LATENCY, levels=SCHEDULE_LEVELS, window=LATENCY_WINDOW,
+                 adapt_every=ADAPT_EVERY, headroom=UPGRADE_HEADROOM):
+        self.target_latency = target_latency
+        self.levels = levels
+        self.adapt_every = adapt_every
+        self.headroom = headroom
+        self.lock = threading.Lock()
+        self.level = 0
+        self.latencies = collections.deque(maxlen=window)
+        self.level_latencies = []
+        self.frames = 0
+        self.detected = 0
+        self.skipped = 0
+        self.ocr_skipped = 0
+        self.level_changes = 0
+
+    def plan(self):
+        """
+        Decide what to run on the next frame.
+
+        Returns:
+            dict: 'detect' whether to run the detectors, 'imgsz' the detector
+            input size, 'ocr' whether to OCR plates without a cached read, and
+            the 'level' the decision was made at.
+        """
+        with self.lock:
+            detection_stride, imgsz, ocr_stride = self.levels[self.level]
+            detect = self.frames % detection_stride == 0
+            # OCR runs on every ocr_stride-th detected frame
+            ocr = detect and self.detected % ocr_stride == 0
+            self.frames += 1
+            if detect:
+                self.detected += 1
+                if not ocr:
+                    self.ocr_skipped += 1
+            else:
+                self.skipped += 1
+            return {'detect': detect, 'imgsz': imgsz, 'ocr': ocr, 'level': self.level}
+
+    def record(self, latency):
+        """
+        Record the end-to-end latency of a finished frame and adapt the level.
+
+        Args:
+            latency (float): Seconds from reading the frame to finishing it.
+        """
+        with self.lock:
+            self.latencies.append(latency)
+            self.level_latencies.append(latency)
+            if len(self.level_latencies) < self.adapt_every:
+                return
+
+            p90 = float(np.percentile(self.level_latencies, 90))
+            if p90 > self.target_latency and self.level < len(self.levels) - 1:
+                self.level += 1
+                self.level_changes += 1
+            elif p90 < self.target_latency * self.headroom and self.level > 0:
+                self.level -= 1
+                self.level_changes += 1
+            # Only latencies measured at the current level decide the next change
+            self.level_latencies = []
+
+    def stats(self):
+        """
+        Get the current decisions and the measured latency percentiles.
+
+        Returns:
+            dict: Current level and its settings, frame counters and p50/p90/p99 latency in seconds.
+        """
+        with self.lock:
+            detection_stride, imgsz, ocr_stride = self.levels[self.level]
+            latencies = list(self.latencies)
+            stats = {
+                'level': self.level,
+                'detection_stride': detection_stride,
+                'imgsz': imgsz,
+                'ocr_stride': ocr_stride,
+                'frames': self.frames,
+                'detected': self.detected,
+                'skipped': self.skipped,
+                'ocr_skipped': self.ocr_skipped,
+                'level_changes': self.level_changes,
+                'target_latency': self.target_latency,
+            }
+        for percentile in (50, 90, 99):
+            stats[f'latency_p{percentile}'] = float(np.percentile(latencies, percentile)) if latencies else None
+        return stats
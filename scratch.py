@@ -1,13 +1,15 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
-import easyocr
-from util import write_csv, char2int, int2char
+from util import write_csv
+from plate_format import plate_grammar
+from ocr import read_license_plates
+from association import tracked_boxes, associate_plates
+from pipeline import Pipeline, QueueClosed
+from scheduler import AdaptiveScheduler
+from tracking import age_tracker, model_tracker
+from backends import load_reader, load_yolo
 import os
 import time
-import re
-import torch
-import asyncio
 
 # Constants
 LP_FOLDER_PATH = "./licenses_plates_imgs_detected/"
@@ -16,211 +18,146 @@ LICENSE_MODEL_DETECTION_DIR = './models/best.pt'
 COCO_MODEL_DIR = "./models/yolov8n.pt"
 THRESHOLD = 0.15
 VEHICLES = {2: "Car", 3: "MC", 5: "Bus", 6: "Truck"}
+INFERENCE_BACKEND = "auto"  # "cuda", "openvino", "onnx" or "torch"
+INT8 = False
 
-# Initialize models and devices
-reader = easyocr.Reader(['en'], gpu=True)
-coco_model = YOLO(COCO_MODEL_DIR).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-license_plate_detector = YOLO(LICENSE_MODEL_DETECTION_DIR).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-results_buffer = []
-
-class VideoProcessor:
-    async def recv(self, img):
-        return img
-
-def read_license_plate(license_plate_crop, img):
-    scores = 0
-    detections = reader.readtext(license_plate_crop, allowlist= '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-
-    width = img.shape[1]
-    height = img.shape[0]
-    
-    if detections == [] :
-        return None, None
-
-    rectangle_size = license_plate_crop.shape[0]*license_plate_crop.shape[1]
-
-    plate = [] 
-
-    for result in detections:
-        length = np.sum(np.subtract(result[0][1], result[0][0]))
-        height = np.sum(np.subtract(result[0][2], result[0][1]))
-        
-        if length*height / rectangle_size > 0.17:
-            bbox, text, score = result
-            text = result[1]
-            text = text.upper()
-            scores += score
-            plate.append(text)
-    
-    if len(plate) != 0 : 
-        return " ".join(plate), scores/len(plate)
-    else :
-        return " ".join(plate), 0
-
-def format_license_plate_text(license_plate_text, class_name):
-    """
-    Formats the license plate text based on vehicle class.
-    
-    Args:
-    - license_plate_text (str): The recognized license plate text.
-    - class_name (str): The class of the vehicle.
-
-    Returns:
-    - str: Formatted license plate text.
-    """
-    lp_length = len(license_plate_text)
-
-    if lp_length >= 6 and lp_length <= 7:
-        if class_name in ["Car", "Bus", "Truck"]:
-            l = license_plate_text[:3]
-            n = license_plate_text[3:lp_length]
-
-            # Check if 'l' contains a number
-            if any(char.isdigit() for char in l):
-                l = int2char(l)
-            
-            # Check if 'n' contains a letter
-            if any(char.isalpha() for char in n):
-                n = char2int(n)
-
-            license_plate_text = l + "-" + n
-
-        elif class_name == "MC" and lp_length == 6:
-            n = license_plate_text[:3]
-            l = license_plate_text[3:6]
-
-            # Check if 'n' contains a number
-            if any(char.isalpha() for char in n):
-                n = char2int(n)
-
-            # Check if 'l' contains a letter
-            if any(char.isdigit() for char in l):
-                l = int2char(l)
-
-            license_plate_text = n + "-" + l
-
-    return license_plate_text
-
-def detect_objects_and_license_plates(img, frame_number):
+# Initialize models on the fastest backend this machine has
+reader = load_reader(INFERENCE_BACKEND, int8=INT8)
+coco_model = load_yolo(COCO_MODEL_DIR, INFERENCE_BACKEND, int8=INT8)
+license_plate_detector = load_yolo(LICENSE_MODEL_DETECTION_DIR, INFERENCE_BACKEND, int8=INT8)
+
+def detect_objects_and_license_plates(img, frame_number, imgsz=640):
     license_numbers = 0
     results = {}
     licenses_texts = []
-    
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
 
-    object_detections = coco_model.track(img, persist=True)[0]
-    vehicle_detected = False
+    object_detections = coco_model.track(img, persist=True, imgsz=imgsz)[0]
+
+    # Tracked vehicle boxes as one array: x1, y1, x2, y2, track_id, score, class_id
+    vehicle_data = tracked_boxes(object_detections.boxes)
+    vehicle_data = vehicle_data[np.isin(vehicle_data[:, 6].astype(int), list(VEHICLES))]
     vehicle_bboxes = []
 
-    if len(object_detections.boxes.cls.tolist()) != 0:
-        for detection in object_detections.boxes.data.tolist():
-            if len(detection) == 7:
-                xvehicle1, yvehicle1, xvehicle2, yvehicle2, track_id, vehicle_score, class_id = detection
-
-                if int(class_id) in VEHICLES:
-                    class_name = VEHICLES[int(class_id)]
-                    label = f"{class_name}-{int(track_id)} Score:{round(vehicle_score, 2)}"
-                    cv2.rectangle(img, (int(xvehicle1), int(yvehicle1)), (int(xvehicle2), int(yvehicle2)), (0, 0, 255), 3)
-                    cv2.putText(img, label, (int(xvehicle1), int(yvehicle1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    vehicle_detected = True
-                    start_time = time.time()
-                    vehicle_bboxes.append([track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2, vehicle_score, class_name])
-
-        if vehicle_detected:
-            license_detections = license_plate_detector.track(img, persist=True)[0]
-            if len(license_detections.boxes.cls.tolist()) != 0:
-                for license_plate in license_detections.boxes.data.tolist():
-                    if len(license_plate) == 7:
-                        x1, y1, x2, y2, lp_track_id, lp_score, class_name = license_plate
-
-                        for veh_bbox in vehicle_bboxes:
-                            track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2, vehicle_score, veh_class_name = veh_bbox
-                            # Check if this license plate is inside any vehicle bounding box
-                            if x1 > xvehicle1 and x2 < xvehicle2 and y1 > yvehicle1 and y2 < yvehicle2:
-                                # This license plate is inside this vehicle bounding box
-                                cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 3)
-
-                                license_plate_crop = img[int(y1):int(y2), int(x1): int(x2), :]
-                                license_plate_crop_gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
-                            
-                                license_plate_text, license_plate_text_score = read_license_plate(license_plate_crop_gray, img)
-                                licenses_texts.append(license_plate_text)
-
-                                if license_plate_text and license_plate_text_score >= 0.3:
-                                    license_plate_text = re.sub(r'[^A-Za-z0-9]', '', license_plate_text)
-                                    license_plate_text = format_license_plate_text(license_plate_text, veh_class_name)
-
-                                    end_time = time.time()
-                                    inference_time = end_time - start_time
-
-                                    lp_crop_name = f'{license_plate_text}_{lp_track_id}.jpg'
-                                    cv2.imwrite(os.path.join(LP_FOLDER_PATH, lp_crop_name), license_plate_crop_gray)
-                                    
-                                    cv2.rectangle(img, (int(x1), int(y1) - 40), (int(x2)+20, int(y1)), (0, 0, 0), cv2.FILLED)
-                                    cv2.putText(img, str(license_plate_text), (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 3)
-                                    cv2.putText(img, f"LP Score: {round(license_plate_text_score, 2)}", (int(x1), int(y1) - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                                            
-                                    # Save a cropped image of the car
-                                    car_crop = img[int(yvehicle1):int(yvehicle2), int(xvehicle1):int(xvehicle2), :]
-                                    car_img_name = f'{veh_class_name}{track_id}_{license_plate_text}.jpg'
-                                    cv2.imwrite(os.path.join(VEHICLE_FOLDER_PATH, car_img_name), car_crop)
-                                    results[license_numbers] = {
-                                                                    license_numbers: {
-                                                                        'Vehicle': {
-                                                                            'vehicle_id': track_id,
-                                                                            'vehicle_class': veh_class_name,
-                                                                            'vehicle_score': vehicle_score,
-                                                                            'vehicle_img': car_img_name,  # Add the path to the vehicle image
-                                                                        },
-                                                                        'license_plate': {
-                                                                            'lp_id': lp_track_id,
-                                                                            'text': license_plate_text, 
-                                                                            'inference_time': inference_time,
-                                                                            'lp_img': lp_crop_name, 
-                                                                            'text_score': license_plate_text_score,
-
-                                                                        }
-                                                                    }
-                                                                }
-                                    license_numbers += 1
-                                    write_csv(results, f"./results/LPR_results.csv")
-
-    img_wth_box = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    return [img_wth_box, licenses_texts, results]
-
-async def process_frame(processor, frame, frame_number):
-    processed_frame = await processor.recv(frame)
-    img_with_box, licenses_texts, results = detect_objects_and_license_plates(processed_frame, frame_number)
-    results_buffer.extend(results)
-    return img_with_box
-
-async def main():
+    for xvehicle1, yvehicle1, xvehicle2, yvehicle2, track_id, vehicle_score, class_id in vehicle_data.tolist():
+        class_name = VEHICLES[int(class_id)]
+        label = f"{class_name}-{int(track_id)} Score:{round(vehicle_score, 2)}"
+        cv2.rectangle(img, (int(xvehicle1), int(yvehicle1)), (int(xvehicle2), int(yvehicle2)), (0, 0, 255), 3)
+        cv2.putText(img, label, (int(xvehicle1), int(yvehicle1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        start_time = time.time()
+        vehicle_bboxes.append([track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2, vehicle_score, class_name])
+
+    if len(vehicle_bboxes) != 0:
+        license_detections = license_plate_detector.track(img, persist=True, imgsz=imgsz)[0]
+        plate_data = tracked_boxes(license_detections.boxes)
+
+        # Assign every plate to the one vehicle box it lies in, -1 if it is outside all of them
+        vehicle_indices = associate_plates(plate_data[:, :4], vehicle_data[:, :4])
+
+        # Collect every plate crop that lies inside a vehicle, then OCR the whole frame in one batch
+        plate_candidates = []
+        for license_plate, vehicle_index in zip(plate_data.tolist(), vehicle_indices.tolist()):
+            if vehicle_index < 0:
+                continue
+            x1, y1, x2, y2, lp_track_id, lp_score, class_name = license_plate
+            license_plate_crop = img[int(y1):int(y2), int(x1): int(x2), :]
+            if license_plate_crop.size != 0:
+                license_plate_crop_gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
+                plate_candidates.append((license_plate, vehicle_bboxes[vehicle_index], license_plate_crop_gray))
+
+        plate_reads = read_license_plates(reader, [candidate[2] for candidate in plate_candidates])
+
+        for (license_plate, veh_bbox, license_plate_crop_gray), (license_plate_text, license_plate_text_score) in zip(plate_candidates, plate_reads):
+            x1, y1, x2, y2, lp_track_id, lp_score, class_name = license_plate
+            track_id, xvehicle1, yvehicle1, xvehicle2, yvehicle2, vehicle_score, veh_class_name = veh_bbox
+
+            # This license plate is inside this vehicle bounding box
+            cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 3)
+            licenses_texts.append(license_plate_text)
+
+            if license_plate_text and license_plate_text_score >= 0.3:
+                license_plate_text = plate_grammar.format(license_plate_text, veh_class_name)
+
+                end_time = time.time()
+                inference_time = end_time - start_time
+
+                lp_crop_name = f'{license_plate_text}_{lp_track_id}.jpg'
+                cv2.imwrite(os.path.join(LP_FOLDER_PATH, lp_crop_name), license_plate_crop_gray)
+                
+                cv2.rectangle(img, (int(x1), int(y1) - 40), (int(x2)+20, int(y1)), (0, 0, 0), cv2.FILLED)
+                cv2.putText(img, str(license_plate_text), (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 3)
+                cv2.putText(img, f"LP Score: {round(license_plate_text_score, 2)}", (int(x1), int(y1) - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                        
+                # Save a cropped image of the car
+                car_crop = img[int(yvehicle1):int(yvehicle2), int(xvehicle1):int(xvehicle2), :]
+                car_img_name = f'{veh_class_name}{track_id}_{license_plate_text}.jpg'
+                cv2.imwrite(os.path.join(VEHICLE_FOLDER_PATH, car_img_name), car_crop)
+                results[license_numbers] = {
+                                                license_numbers: {
+                                                    'Vehicle': {
+                                                        'vehicle_id': track_id,
+                                                        'vehicle_class': veh_class_name,
+                                                        'vehicle_score': vehicle_score,
+                                                        'vehicle_img': car_img_name,  # Add the path to the vehicle image
+                                                    },
+                                                    'license_plate': {
+                                                        'lp_id': lp_track_id,
+                                                        'text': license_plate_text, 
+                                                        'inference_time': inference_time,
+                                                        'lp_img': lp_crop_name, 
+                                                        'text_score': license_plate_text_score,
+
+                                                    }
+                                                }
+                                            }
+                license_numbers += 1
+                write_csv(results, f"./results/LPR_results.csv")
+
+    # Camera frames are BGR from capture to display, no channel swaps
+    return [img, licenses_texts, results]
+
+def main():
     cap = cv2.VideoCapture(0)
-    processor = VideoProcessor()
-    frame_number = 0
     width, height = 640, 360
+    # Skips detection on some frames and shrinks the detector input when inference falls behind
+    scheduler = AdaptiveScheduler()
+
+    def inference_stage(item):
+        frame_number, frame, start_time = item  # latency counts from capture
+        plan = scheduler.plan()
+        if plan['detect']:
+            img_with_box, licenses_texts, results = detect_objects_and_license_plates(frame, frame_number, imgsz=plan['imgsz'])
+        else:
+            # Skipped frames still advance the trackers, so lost tracks expire on time
+            for tracked_model in (coco_model, license_plate_detector):
+                tracker = model_tracker(tracked_model)
+                if tracker is not None:
+                    age_tracker(tracker, frame)
+            img_with_box = frame
+        output = cv2.resize(img_with_box, (width, height))
+        scheduler.record(time.time() - start_time)
+        return output
+
+    # Capture and inference overlap in their own threads, the camera reader never
+    # waits: a frame that arrives while inference is busy replaces the queued one.
+    pipeline = Pipeline(cap, [('inference', inference_stage, 1, True)], output_size=1, drop_output=True).start()
+
+    while True:
+        try:
+            processed_frame = pipeline.output.get(timeout=0.01)
+        except QueueClosed:
+            break
 
-    ret, frame = cap.read()
-    next_frame = asyncio.ensure_future(process_frame(processor, frame, frame_number))
-
-    while ret:
-        frame_number += 1
-        if frame_number % 1 == 0:
-            processed_frame = await next_frame
-            processed_frame = cv2.resize(processed_frame, (width, height))
+        if processed_frame is not None:
             cv2.imshow("Tech Titans Realtime License Plate Recognition", processed_frame)
 
-        ret, frame = cap.read()
-        if ret:
-            next_frame = asyncio.ensure_future(process_frame(processor, frame, frame_number))
-
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
-    # Write results to the CSV file after processing all frames
-    write_csv(results_buffer, f"./results/LPR_results.csv")
 
+    pipeline.stop()
     cap.release()
     cv2.destroyAllWindows()
+    print(f"Pipeline: {pipeline.stats()}")
+    print(f"Scheduler: {scheduler.stats()}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
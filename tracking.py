@@ -0,0 +1,111 @@
+import numpy as np
+from ultralytics.engine.results import Boxes
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+
+def make_tracker(tracker="bytetrack.yaml", frame_rate=30):
+    """
+    Create a standalone ByteTrack tracker, configured the way ``model.track`` configures its own.
+
+    Args:
+        tracker (str): Tracker config file.
+        frame_rate (int): Frame rate the track buffer is scaled by.
+
+    Returns:
+        BYTETracker: Tracker to feed with ``update_tracker``.
+    """
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker)))
+    return BYTETracker(args=cfg, frame_rate=frame_rate)
+
+
+def update_tracker(tracker, detections, img):
+    """
+    Feed one frame of detections to a standalone tracker.
+
+    A frame without detections still advances the tracker, so tracks that
+    left the scene are lost and removed on schedule.
+
+    Args:
+        tracker (BYTETracker): Tracker made with ``make_tracker``.
+        detections (numpy.ndarray): Nx6 array of x1, y1, x2, y2, score, class_id in frame coordinates.
+        img (numpy.ndarray): Frame the detections come from.
+
+    Returns:
+        numpy.ndarray: Nx7 array of x1, y1, x2, y2, track_id, score, class_id, the
+        same layout ``model.track`` returns.
+    """
+    if len(detections) == 0:
+        age_tracker(tracker, img)
+        return np.empty((0, 7), dtype=np.float32)
+
+    tracks = tracker.update(Boxes(detections, img.shape[:2]), img)
+    if len(tracks) == 0:
+        return np.empty((0, 7), dtype=np.float32)
+    return tracks[:, :7].astype(np.float32)
+
+
+def age_tracker(tracker, img):
+    """
+    Advance a tracker by one frame without detections.
+
+    Used for frames that skip detection, or that the detector found nothing
+    in, so lost tracks still expire after the tracker's usual number of frames.
+    Ultralytics' own tracking callback leaves the tracker alone when a frame
+    has no detections.
+
+    Args:
+        tracker (BYTETracker): Tracker.
+        img (numpy.ndarray): The frame.
+    """
+    tracker.update(Boxes(np.empty((0, 6), dtype=np.float32), img.shape[:2]), img)
+
+
+def tracker_track_ids(tracker):
+    """
+    Get the track IDs a ByteTrack tracker still keeps.
+
+    Tracks that are lost but still inside the tracker's buffer count as active,
+    only removed tracks are left out.
+
+    Args:
+        tracker (BYTETracker): Tracker.
+
+    Returns:
+        set: Active track IDs.
+    """
+    return {int(track.track_id) for track in tracker.tracked_stracks + tracker.lost_stracks}
+
+
+def model_tracker(model, stream=0):
+    """
+    Get the ByteTrack tracker of a model that was run with ``model.track``.
+
+    Args:
+        model (ultralytics.YOLO): Model that has been tracking with ``persist=True``.
+        stream (int): Index of the tracker for multi-source predictors.
+
+    Returns:
+        BYTETracker: The tracker, or None if the model has no tracker yet.
+    """
+    predictor = getattr(model, 'predictor', None)
+    trackers = getattr(predictor, 'trackers', None)
+    if not trackers:
+        return None
+    return trackers[stream]
+
+
+def active_track_ids(model, stream=0):
+    """
+    Get the track IDs ByteTrack still keeps for a model that was run with ``model.track``.
+
+    Args:
+        model (ultralytics.YOLO): Model that has been tracking with ``persist=True``.
+        stream (int): Index of the tracker for multi-source predictors.
+
+    Returns:
+        set: Active track IDs, or None if the model has no tracker yet.
+    """
+    tracker = model_tracker(model, stream)
+    return None if tracker is None else tracker_track_ids(tracker)
@@ -2,37 +2,88 @@
 import os, csv
 # import xlwings as xw
 import datetime
+from collections import OrderedDict
 
+from plate_format import DIGIT_TO_LETTER, LETTER_TO_DIGIT, TO_DIGIT_TABLE, TO_LETTER_TABLE, plate_grammar
 
-highest_lp_scores = {}
+
+# Columns of the results CSV
+RESULT_FIELDNAMES = [
+    'Timestamp', 'Vehicle ID', 'Vehicle Class', 'Vehicle Image',
+    'License Plate ID', 'LP Image Path', 'License Plate Number', 'LP Score', 'Inference Time'
+]
+
+# Number of plates the duplicate check remembers before the least recently seen is forgotten
+MAX_TRACKED_PLATES = 10000
+
+class HighestScores:
+    """
+    Highest LP score seen per key, e.g. (plate number, vehicle track), bounded to the most recently seen keys.
+
+    Args:
+        maxsize (int): Number of keys to remember.
+    """
+
+    def __init__(self, maxsize=MAX_TRACKED_PLATES):
+        self.maxsize = maxsize
+        self.scores = OrderedDict()
+
+    def is_new_best(self, license_plate_number, lp_score):
+        """
+        Record a read and tell whether it beats every earlier read with the same key.
+
+        Args:
+            license_plate_number (hashable): License plate text, or a (text, track) key.
+            lp_score (float): Score of the read.
+
+        Returns:
+            bool: True if the key is new or the score is higher than before.
+        """
+        best_score = self.scores.get(license_plate_number)
+        if best_score is not None and lp_score <= best_score:
+            self.scores.move_to_end(license_plate_number)
+            return False
+
+        self.scores[license_plate_number] = lp_score
+        self.scores.move_to_end(license_plate_number)
+        if len(self.scores) > self.maxsize:
+            self.scores.popitem(last=False)
+        return True
+
+    def __len__(self):
+        return len(self.scores)
+
+
+highest_lp_scores = HighestScores()
 timestamp = datetime.datetime.now()
 
 # Format the timestamp as a string (if needed)
 timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
 
-# Mapping dictionaries for character conversion
-dict_char_to_int = {
-        'O': '0', 'I': '1', 'Z': '2', 'J': '3', 
-        'A': '4', 'S': '5', 'G': '6', 'T': '7', 
-        'B': '8', 'Q': '0', 'D': '0'
-    }
-
-dict_int_to_char = {
-        '0': 'O', '1': 'I', '2': 'Z', '3': 'J', 
-        '4': 'A', '5': 'S', '6': 'G', '7': 'T', 
-        '8': 'B', '9': 'g',  # or 'q' depending on the common misreadings
-    }
+# Mapping dictionaries for character conversion, kept by plate_format with its compiled tables
+dict_char_to_int = LETTER_TO_DIGIT
+dict_int_to_char = DIGIT_TO_LETTER
 
 def char2int(l):
-        for char, replacement in dict_char_to_int.items():
-            l = l.replace(char, replacement)
-        return l
+    """Correct letters OCR confuses with digits into those digits."""
+    return l.translate(TO_DIGIT_TABLE)
 
-    # Correct integers to characters
 def int2char(n):
-        for char, replacement in dict_int_to_char.items():
-            n = n.replace(char, replacement)
-        return n
+    """Correct digits OCR confuses with letters into those letters."""
+    return n.translate(TO_LETTER_TABLE)
+
+def format_license_plate_text(license_plate_text, class_name):
+    """
+    Formats the license plate text based on vehicle class.
+
+    Args:
+        license_plate_text (str): The recognized license plate text.
+        class_name (str): The class of the vehicle.
+
+    Returns:
+        str: Formatted license plate text, see ``plate_format.PlateGrammar.normalize``.
+    """
+    return plate_grammar.format(license_plate_text, class_name)
 
 #def write_excel(results, output_path):
 #     """
@@ -100,10 +151,52 @@ def int2char(n):
 #     wb.save(output_path)
 #     wb.close()
 
+def result_rows(results, lp_scores=highest_lp_scores):
+    """
+    Turn a results dictionary into CSV rows, skipping reads that do not beat an earlier read of the same plate on the same vehicle.
+
+    A plate seen again on another vehicle track, a later sighting of the car,
+    is always kept.
+
+    Args:
+        results (dict): Dictionary containing the results.
+        lp_scores (HighestScores): Highest score seen per (plate, vehicle track), None to keep every read.
+
+    Yields:
+        dict: Row keyed by RESULT_FIELDNAMES.
+    """
+    for license_numbers, data in results.items():
+        vehicle_details = data.get(license_numbers, {}).get('Vehicle', {})
+        lp_details = data.get(license_numbers, {}).get('license_plate', {})
+
+        # Offline runs pass the time the frame was recorded, live reads are stamped now
+        timestamp_str = lp_details.get('timestamp') or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        license_plate_number = lp_details.get('text', 'N/A')
+        lp_score = lp_details.get('text_score', 0.0)
+
+        # Check if this license plate has been processed before on this vehicle and if the new score is higher
+        if lp_scores is not None and not lp_scores.is_new_best((license_plate_number, vehicle_details.get('vehicle_id')), lp_score):
+            continue  # Skip adding this entry
+
+        yield {
+            'Timestamp': timestamp_str,
+            'Vehicle ID': vehicle_details.get('vehicle_id', 'N/A'),
+            'Vehicle Class': vehicle_details.get('vehicle_class', 'N/A'),
+            'Vehicle Image': vehicle_details.get('vehicle_img', 'N/A'),
+            'License Plate ID': lp_details.get('lp_id', 'N/A'),
+            'LP Image Path': lp_details.get('lp_img', 'N/A'),  # Image path for LP Image
+            'License Plate Number': license_plate_number,
+            'LP Score': lp_score,
+            'Inference Time': lp_details.get('inference_time', 'N/A')
+        }
+
 def write_csv(results, output_path):
     """
     Append the results to an existing CSV file or create a new one if it doesn't exist.
 
+    Opens the file on every call; for a continuous stream of results use
+    results_sink.ResultsSink, which keeps one handle open and batches writes.
+
     Args:
         results (dict): Dictionary containing the results.
         output_path (str): Path to the output CSV file.
@@ -112,45 +205,14 @@ def write_csv(results, output_path):
     is_existing_file = os.path.exists(output_path)
 
     with open(output_path, mode='a', newline='') as csvfile:
-        fieldnames = [
-            'Timestamp', 'Vehicle ID', 'Vehicle Class', 'Vehicle Image',
-            'License Plate ID', 'LP Image Path', 'License Plate Number', 'LP Score', 'Inference Time'
-        ]
-
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=RESULT_FIELDNAMES)
 
         # If it's a new file, write the header row
         if not is_existing_file:
             writer.writeheader()
 
         # Insert data into CSV (including image paths)
-        for license_numbers, data in results.items():
-            vehicle_details = data.get(license_numbers, {}).get('Vehicle', {})
-            lp_details = data.get(license_numbers, {}).get('license_plate', {})
-
-            timestamp_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            license_plate_number = lp_details.get('text', 'N/A')
-            lp_score = lp_details.get('text_score', 0.0)
-
-            # Check if this license plate has been processed before and if the new score is higher
-            if license_plate_number in highest_lp_scores and lp_score <= highest_lp_scores[license_plate_number]:
-                continue  # Skip adding this entry
-
-            # Update the highest LP score for this license plate
-            highest_lp_scores[license_plate_number] = lp_score
-
-            row_data = {
-                'Timestamp': timestamp_str,
-                'Vehicle ID': vehicle_details.get('vehicle_id', 'N/A'),
-                'Vehicle Class': vehicle_details.get('vehicle_class', 'N/A'),
-                'Vehicle Image': vehicle_details.get('vehicle_img', 'N/A'),
-                'License Plate ID': lp_details.get('lp_id', 'N/A'),
-                'LP Image Path': lp_details.get('lp_img', 'N/A'),  # Image path for LP Image
-                'License Plate Number': license_plate_number,
-                'LP Score': lp_score,
-                'Inference Time': lp_details.get('inference_time', 'N/A')
-            }
-
+        for row_data in result_rows(results):
             writer.writerow(row_data)
 
 # def read_license_plate(license_plate_crop):
@@ -183,5 +245,3 @@ def write_csv(results, output_path):
 #             return text, score
 
 #     return None, None
-util.py
-Ipinapakita ang util.py.
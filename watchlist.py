@@ -0,0 +1,332 @@
+import os
+import string
+import threading
+import time
+
+import numpy as np
+
+from plate_format import DIGIT_TO_LETTER, LETTER_TO_DIGIT, clean_plate
+
+# Longest plate indexed, in letters and digits; longer list entries are skipped
+MAX_PLATE_LENGTH = 10
+
+# Cost of a substitution between characters OCR confuses (O/0, B/8, ...); any other edit costs 1
+CONFUSION_COST = 0.25
+
+# Highest weighted edit cost of a match. Below 1 only confusions match (here up to three); 1 or more also
+# allows one real edit (2 or more, two), which on lists of millions also matches many unlisted plates
+MAX_COST = 0.75
+
+# List lines encoded per batch while building, bounding the memory and the time lookups wait for the GIL
+BUILD_BATCH = 100_000
+
+# Seconds between checks of the list files for changes
+RELOAD_INTERVAL = 30
+
+
+def _confusion_groups():
+    """Map every letter and digit to a representative of the characters OCR confuses it with."""
+    groups = {char: char for char in string.ascii_uppercase + string.digits}
+
+    def find(char):
+        while groups[char] != char:
+            char = groups[char]
+        return char
+
+    for mapping in (LETTER_TO_DIGIT, DIGIT_TO_LETTER):
+        for char, replacement in mapping.items():
+            groups[find(char)] = find(replacement)
+    return {char: find(char) for char in groups}
+
+
+# Characters OCR confuses share a symbol, so plates that only differ in confusions share a key
+CANONICAL = _confusion_groups()
+SYMBOLS = sorted(set(CANONICAL.values()))
+BASE = len(SYMBOLS) + 1  # symbol 0 pads the key after the plate
+KEY_WIDTH = MAX_PLATE_LENGTH + 2  # room for the character an insertion adds
+SYMBOL_CODES = np.zeros(256, dtype=np.int64)
+for _char, _group in CANONICAL.items():
+    SYMBOL_CODES[ord(_char)] = SYMBOLS.index(_group) + 1
+POWERS = BASE ** np.arange(KEY_WIDTH - 1, -1, -1, dtype=np.int64)
+EDIT_SYMBOLS = np.arange(1, BASE, dtype=np.int64)
+
+
+def plate_keys(plates):
+    """
+    Encode cleaned plates as integer keys, one base-BASE digit per canonical symbol.
+
+    Args:
+        plates (numpy.ndarray): Cleaned plates as a bytes array of dtype S{KEY_WIDTH}.
+
+    Returns:
+        numpy.ndarray: int64 keys.
+    """
+    codes = SYMBOL_CODES[plates.view(np.uint8).reshape(len(plates), KEY_WIDTH)]
+    return codes @ POWERS
+
+
+def key_edits(keys, positions):
+    """
+    Every key one edit away: each symbol substituted at, inserted at or deleted from each position.
+
+    Args:
+        keys (numpy.ndarray): int64 keys.
+        positions (numpy.ndarray): Positions to edit.
+
+    Returns:
+        numpy.ndarray: The keys themselves and their edits, with duplicates.
+    """
+    keys = keys[:, None]
+    power = POWERS[positions][None, :]
+    digit = keys // power % BASE
+    # Symbols before the position, and after it
+    head = keys // (power * BASE) * (power * BASE)
+    tail = keys % power
+    substitutions = (keys - digit * power)[:, :, None] + EDIT_SYMBOLS * power[:, :, None]
+    deletions = head + tail * BASE
+    insertions = (head + keys % (power * BASE) // BASE)[:, :, None] + EDIT_SYMBOLS * power[:, :, None]
+    return np.concatenate([keys.ravel(), substitutions.ravel(), deletions.ravel(), insertions.ravel()])
+
+
+def substitution_cost(text, plate):
+    """Weighted cost of turning a plate into another of the same length by substitutions only."""
+    cost = 0.0
+    for char, other in zip(text, plate):
+        if char != other:
+            cost += CONFUSION_COST if CANONICAL.get(char) == CANONICAL.get(other) else 1.0
+    return cost
+
+
+def weighted_distance(text, plate):
+    """
+    Edit distance between two cleaned plates, substitutions of confusable characters costing CONFUSION_COST.
+
+    Args:
+        text (str): Read plate.
+        plate (str): Listed plate.
+
+    Returns:
+        float: Weighted edit cost.
+    """
+    previous = [float(j) for j in range(len(plate) + 1)]
+    for i, char in enumerate(text, 1):
+        current = [float(i)]
+        group = CANONICAL.get(char)
+        for j, other in enumerate(plate, 1):
+            if char == other:
+                substitution = 0.0
+            elif group is not None and group == CANONICAL.get(other):
+                substitution = CONFUSION_COST
+            else:
+                substitution = 1.0
+            current.append(min(previous[j - 1] + substitution, previous[j] + 1.0, current[j - 1] + 1.0))
+        previous = current
+    return previous[-1]
+
+
+class WatchlistIndex:
+    """
+    Immutable index of one load of the watch lists.
+
+    Plates are kept as sorted int64 keys of their canonical symbols (8 bytes
+    per entry) next to the plates themselves and their list, so millions of
+    entries take tens of megabytes and a lookup is a binary search. A read is
+    looked up by its key and, for fuzzy matches, by the keys of its one-edit
+    neighbourhood, all in one vectorized ``searchsorted``; the few entries
+    found are scored by ``weighted_distance``.
+
+    Args:
+        lists (dict): Paths of the list files by list name. Files have one plate per
+            line, anything after a comma is ignored, lines starting with # are skipped.
+    """
+
+    def __init__(self, lists):
+        self.names = list(lists)
+        self.skipped = 0
+        self.mtimes = {path: os.path.getmtime(path) for path in lists.values()}
+        label_type = np.uint8 if len(self.names) <= 256 else np.uint32
+        key_batches, plate_batches, label_batches = [], [], []
+        for label, path in enumerate(lists.values()):
+            for batch in self._read_batches(path):
+                plates = np.array(batch, dtype=f'S{KEY_WIDTH}')
+                key_batches.append(plate_keys(plates))
+                plate_batches.append(plates)
+                label_batches.append(np.full(len(plates), label, dtype=label_type))
+
+        keys = np.concatenate(key_batches) if key_batches else np.zeros(0, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.plates = np.concatenate(plate_batches)[order] if plate_batches else np.zeros(0, dtype=f'S{KEY_WIDTH}')
+        self.labels = np.concatenate(label_batches)[order] if label_batches else np.zeros(0, dtype=label_type)
+
+    def _read_batches(self, path):
+        batch = []
+        with open(path, encoding='utf-8', errors='replace') as list_file:
+            for line in list_file:
+                if line.startswith('#'):
+                    continue
+                plate = clean_plate(line.split(',', 1)[0])
+                if 0 < len(plate) <= MAX_PLATE_LENGTH:
+                    batch.append(plate)
+                elif plate:
+                    self.skipped += 1
+                if len(batch) == BUILD_BATCH:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def __len__(self):
+        return len(self.keys)
+
+    def nbytes(self):
+        """Memory the index arrays take."""
+        return self.keys.nbytes + self.plates.nbytes + self.labels.nbytes
+
+    def lookup(self, license_plate_text, max_cost=MAX_COST):
+        """
+        Find the listed plates within max_cost of a read.
+
+        An exact match is returned on its own, without searching for fuzzy ones.
+        Confusions alone need one key lookup; every real edit allowed by max_cost
+        widens the search to the keys one more edit away (two edits take
+        milliseconds rather than microseconds).
+
+        Args:
+            license_plate_text (str): Plate as read, it is cleaned first.
+            max_cost (float): Highest weighted edit cost of a match, below 1 for confusions only, below 3.
+
+        Returns:
+            list: (cost, plate, list name) of the matches, best first.
+        """
+        text = clean_plate(license_plate_text)
+        if not text or len(text) > MAX_PLATE_LENGTH or len(self.keys) == 0:
+            return []
+        plate = np.array([text], dtype=f'S{KEY_WIDTH}')
+        key = plate_keys(plate)
+        start, end = np.searchsorted(self.keys, key[0], side='left'), np.searchsorted(self.keys, key[0], side='right')
+        # Plates differing only in confusions share the key, an exact match is among them
+        exact = np.flatnonzero(self.plates[start:end] == plate[0])
+        if len(exact):
+            return [(0.0, text, self.names[self.labels[start + exact[0]]])]
+
+        # Real edits are found through the canonical keys one edit away per edit allowed, confusions need none
+        for edits in range(1, min(int(max_cost), 2) + 1):
+            key = np.unique(key_edits(key, np.arange(len(text) + edits)))
+        starts = np.searchsorted(self.keys, key, side='left')
+        ends = np.searchsorted(self.keys, key, side='right')
+
+        matches = []
+        for start, end in zip(starts[starts < ends].tolist(), ends[starts < ends].tolist()):
+            for i in range(start, end):
+                listed = self.plates[i].decode()
+                if len(listed) == len(text) and max_cost < 2:
+                    # Any indel would need two, so substitutions alone give the cost
+                    cost = substitution_cost(text, listed)
+                else:
+                    cost = weighted_distance(text, listed)
+                if cost <= max_cost:
+                    matches.append((cost, listed, self.names[self.labels[i]]))
+        matches.sort()
+        return matches
+
+
+class Watchlist:
+    """
+    Stolen-vehicle, permit or other watch lists, matched against every read.
+
+    Lookups always go to the current ``WatchlistIndex``. A reload builds a new
+    index in the background and swaps it in with one assignment, so
+    recognition never waits for it; ``start`` reloads whenever a list file
+    changes.
+
+    Args:
+        lists (dict): Paths of the list files by list name, see ``WatchlistIndex``.
+        max_cost (float): Highest weighted edit cost of a match.
+        reload_interval (float): Seconds between checks of the list files for changes.
+    """
+
+    def __init__(self, lists, max_cost=MAX_COST, reload_interval=RELOAD_INTERVAL):
+        self.lists = dict(lists)
+        self.max_cost = max_cost
+        self.reload_interval = reload_interval
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_time = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.reload_time = 0.0
+        self.stopped = threading.Event()
+        self.thread = None
+        start_time = time.perf_counter()
+        self.index = WatchlistIndex(self.lists)
+        self.reload_time = time.perf_counter() - start_time
+
+    def start(self):
+        self.thread = threading.Thread(target=self._watch, name='watchlist', daemon=True)
+        self.thread.start()
+        return self
+
+    def _watch(self):
+        while not self.stopped.wait(self.reload_interval):
+            try:
+                changed = any(os.path.getmtime(path) != mtime for path, mtime in self.index.mtimes.items())
+            except OSError:
+                # A list being replaced is picked up at the next check
+                continue
+            if changed:
+                self.reload()
+
+    def reload(self):
+        """Rebuild the index from the list files and swap it in, keeping the old one if that fails."""
+        start_time = time.perf_counter()
+        try:
+            index = WatchlistIndex(self.lists)
+        except (OSError, ValueError) as exc:
+            self.reload_errors += 1
+            print(f"Watchlist reload failed, keeping {len(self.index)} entries: {exc!r}")
+            return
+        self.index = index
+        self.reloads += 1
+        self.reload_time = time.perf_counter() - start_time
+
+    def match(self, license_plate_text):
+        """
+        Look a read up in the watch lists.
+
+        Args:
+            license_plate_text (str): Plate as read or formatted.
+
+        Returns:
+            list: (cost, plate, list name) of the matches, best first, empty if none.
+        """
+        start_time = time.perf_counter()
+        matches = self.index.lookup(license_plate_text, self.max_cost)
+        self.lookup_time += time.perf_counter() - start_time
+        self.lookups += 1
+        self.hits += bool(matches)
+        return matches
+
+    def stop(self):
+        self.stopped.set()
+
+    def stats(self):
+        """
+        Get the watchlist counters.
+
+        Returns:
+            dict: Entries indexed and skipped, index MB, lookups, reads that matched,
+            mean µs per lookup, reloads, failed reloads and seconds the last build took.
+        """
+        index = self.index
+        return {
+            'entries': len(index),
+            'skipped': index.skipped,
+            'index_mb': index.nbytes() / 1e6,
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'lookup_us': self.lookup_time / self.lookups * 1e6 if self.lookups else 0.0,
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors,
+            'build_seconds': self.reload_time,
+        }